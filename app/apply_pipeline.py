@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Apply pipeline module for KDE Theme Auto-Changer
+
+Runs the commands that apply a theme on a bounded worker pool. Steps run in
+parallel unless they depend on each other, each with its own timeout, and
+fire-and-forget work such as notifications never holds up the switch.
+"""
+
+import logging
+import subprocess
+import time
+
+from .config import Config
+from .metrics import metrics
+
+
+class ApplyStep:
+    """A command to run as part of applying a theme"""
+
+    def __init__(self, name, command, timeout=None, after=(), env=None, user=None):
+        self.name = name
+        self.command = command
+        self.timeout = timeout or Config.APPLY_STEP_TIMEOUT
+        self.after = tuple(after)
+        # Environment and (uid, gid) to run as, for other users' sessions
+        self.env = env
+        self.user = user
+
+
+class StepResult:
+    """Outcome and latency of one apply step"""
+
+    def __init__(self, name, returncode=None, duration=0.0, error=None):
+        self.name = name
+        self.returncode = returncode
+        self.duration = duration
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.returncode == 0
+
+    def __repr__(self):
+        status = "ok" if self.ok else self.error or f"exit {self.returncode}"
+        return f"StepResult({self.name!r}, {status}, {self.duration * 1000:.1f} ms)"
+
+
+class ApplyResult:
+    """Per-step results of one pipeline run"""
+
+    def __init__(self, steps, duration):
+        self.steps = steps
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return all(step.ok for step in self.steps)
+
+    @property
+    def failed(self):
+        return [step for step in self.steps if not step.ok]
+
+    def latencies(self):
+        """Get {step name: seconds}"""
+        return {step.name: step.duration for step in self.steps}
+
+
+class ApplyPipeline:
+    """Runs apply steps and background tasks on a bounded worker pool"""
+
+    def __init__(self, max_workers=None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers or Config.APPLY_MAX_WORKERS
+        self._pool = None
+
+    @property
+    def _executor(self):
+        """Worker pool, created on first use to keep startup light"""
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="apply"
+            )
+        return self._pool
+
+    def run(self, steps):
+        """Run steps, respecting their dependencies, and wait for the results
+
+        Steps must be listed after the steps they depend on. A step whose
+        dependency failed is skipped.
+        """
+        start = time.monotonic()
+        futures = {}
+        for step in steps:
+            dependencies = [futures[name] for name in step.after]
+            futures[step.name] = self._executor.submit(
+                self._run_step, step, dependencies
+            )
+
+        results = [futures[step.name].result() for step in steps]
+        for result in results:
+            metrics.observe("apply_step_seconds", result.duration, step=result.name)
+            if not result.ok:
+                metrics.inc("apply_step_failures_total", step=result.name)
+        return ApplyResult(results, time.monotonic() - start)
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn in the background without waiting for it"""
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._log_background_error)
+        return future
+
+    def _log_background_error(self, future):
+        """Report exceptions from background tasks"""
+        if not future.cancelled() and future.exception():
+            self.logger.debug("Background task failed: %s", future.exception())
+
+    def _run_step(self, step, dependencies):
+        """Run one step once its dependencies have succeeded"""
+        # Dependencies are submitted first, so they are already running or done
+        for dependency in dependencies:
+            if not dependency.result().ok:
+                return StepResult(step.name, error="skipped")
+
+        credentials = {}
+        if step.user is not None:
+            credentials = {"user": step.user[0], "group": step.user[1]}
+
+        start = time.monotonic()
+        try:
+            completed = subprocess.run(
+                step.command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=step.timeout,
+                env=step.env,
+                **credentials,
+            )
+        except subprocess.TimeoutExpired:
+            error = f"timed out after {step.timeout}s"
+            return StepResult(step.name, None, time.monotonic() - start, error)
+        except FileNotFoundError:
+            error = f"{step.command[0]} not found"
+            return StepResult(step.name, None, time.monotonic() - start, error)
+        except OSError as e:
+            # e.g. not permitted to switch to the step's user
+            return StepResult(step.name, None, time.monotonic() - start, str(e))
+
+        duration = time.monotonic() - start
+        result = StepResult(step.name, completed.returncode, duration)
+        if completed.returncode != 0 and completed.stderr:
+            result.error = completed.stderr.strip()
+        return result
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
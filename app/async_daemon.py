@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Asynchronous daemon module for KDE Theme Auto-Changer
+
+Drives daemon mode from an asyncio event loop. Sunrise/sunset timers,
+periodic location refreshes and signal handling run as independent tasks,
+so a slow HTTP request or a hanging KDE tool never holds up the others.
+Blocking work (theme checks, applies, HTTP) runs in worker threads under a
+timeout.
+
+SIGTERM and SIGINT stop the daemon, SIGHUP reloads the settings file and
+re-checks the theme right away. With a control socket the command line can
+query and steer the daemon (see app.control). On the real wall clock the daemon waits on a
+timerfd (see app.wall_timer), so resuming from suspend or a clock change
+re-checks the theme immediately.
+An ambient light sensor (see app.light_sensor) is sampled periodically and
+the theme re-checked whenever it turns bright or dark. In --profile mode the
+memory and CPU time of the idle daemon are sampled too (see app.profiling).
+"""
+
+import asyncio
+import functools
+import logging
+import signal
+import time
+
+from .config import Config
+from .metrics import metrics
+from .scheduler import TransitionScheduler
+from .wall_timer import CLOCK_CHANGED, open_wall_timer
+
+
+class AsyncDaemon:
+    """Event loop running a KDEThemeChanger as a daemon"""
+
+    def __init__(
+        self,
+        changer,
+        check_interval=Config.SAFETY_CHECK_INTERVAL,
+        clock=time.time,
+        wall_timer=None,
+        control_socket=None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.changer = changer
+        self.check_interval = check_interval
+        self.clock = clock
+        # A WallClockTimer, opened in run() when clock is the real wall clock
+        self.wall_timer = wall_timer
+        # Path of the control socket to serve, None for no socket
+        self.control_socket = control_socket
+        self.paused = False
+        self.next_check = None  # (timestamp, reason)
+        self._check_lock = None
+        self._stopping = None
+        self._wakeup = None
+        self._reload_task = None
+        # Worker thread of a check or reload that timed out but still runs
+        self._timed_out = None
+
+    async def run(self):
+        """Run until stop() is called or a stop signal arrives"""
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._check_lock = asyncio.Lock()
+
+        handlers = {
+            signal.SIGTERM: self.stop,
+            signal.SIGINT: self.stop,
+            signal.SIGHUP: self.request_reload,
+        }
+        installed = []
+        for signum, handler in handlers.items():
+            try:
+                loop.add_signal_handler(signum, handler)
+                installed.append(signum)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not the main thread or no signal support on this platform
+                pass
+
+        own_timer = self.wall_timer is None and self.clock is time.time
+        if own_timer:
+            self.wall_timer = open_wall_timer()
+        if self.wall_timer is not None:
+            loop.add_reader(self.wall_timer.fileno(), self._on_wall_timer)
+
+        control = None
+        if self.control_socket is not None:
+            from .control_server import ControlServer
+
+            control = ControlServer(self, self.control_socket)
+            if not await control.start():
+                control = None
+
+        tasks = [
+            asyncio.create_task(self._transition_loop(), name="transitions"),
+            asyncio.create_task(self._location_refresh_loop(), name="location-refresh"),
+            asyncio.create_task(self._stopping.wait(), name="stopping"),
+        ]
+        if self.changer.profiler is not None:
+            tasks.append(
+                asyncio.create_task(
+                    self._profile_loop(self.changer.profiler), name="profile"
+                )
+            )
+        if self.changer.light_sensor is not None:
+            tasks.append(
+                asyncio.create_task(
+                    self._light_sensor_loop(self.changer.light_sensor),
+                    name="light-sensor",
+                )
+            )
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            # The loops only end by raising
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+        finally:
+            if self._reload_task is not None:
+                tasks.append(self._reload_task)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for signum in installed:
+                loop.remove_signal_handler(signum)
+            if control is not None:
+                await control.close()
+            if self.wall_timer is not None:
+                loop.remove_reader(self.wall_timer.fileno())
+                if own_timer:
+                    self.wall_timer.close()
+                    self.wall_timer = None
+            self.logger.info("Daemon stopped")
+
+    def stop(self):
+        """Stop the daemon"""
+        self.logger.info("Stopping daemon")
+        self._stopping.set()
+
+    def request_reload(self):
+        """Reload the settings in the background and re-check the theme"""
+        if self._reload_task and not self._reload_task.done():
+            return
+        self._reload_task = asyncio.create_task(self.reload_now(), name="reload")
+
+    async def reload_now(self):
+        """Run KDEThemeChanger.reload() in a worker thread, then wake the timers
+
+        Returns False if the reload failed.
+        """
+        try:
+            async with self._check_lock:
+                await self._in_thread(self.changer.reload)
+        except asyncio.TimeoutError:
+            self.logger.error("Reload timed out after %ss", Config.UPDATE_TIMEOUT)
+            return False
+        except Exception as e:
+            self.logger.error("Reload failed: %s", e)
+            return False
+        self._wakeup.set()
+        return True
+
+    async def check_now(self):
+        """Check the theme right away, also while paused; False on failure"""
+        async with self._check_lock:
+            return await self._check()
+
+    async def force_now(self, theme):
+        """Force theme (see KDEThemeChanger.force_theme) and apply it right away
+
+        The theme is forced under the check lock, so a check that is already
+        running finishes on the schedule it started with. Returns False if the
+        check failed.
+        """
+        async with self._check_lock:
+            self.changer.force_theme(theme)
+            return await self._check()
+
+    def pause(self):
+        """Stop switching the theme until resume()"""
+        self.logger.info("Pausing theme checks")
+        self.paused = True
+
+    def resume(self):
+        """Switch the theme again, starting with a check right away"""
+        self.logger.info("Resuming theme checks")
+        self.paused = False
+        self._wakeup.set()
+
+    async def _in_thread(self, func):
+        """Run a check or reload in a worker thread under UPDATE_TIMEOUT
+
+        A thread cannot be cancelled: one that times out, or whose caller is
+        cancelled (for example by a control command's own timeout), keeps
+        running, and until it returns further calls raise RuntimeError
+        instead of touching the theme alongside it. Its return wakes the
+        transition loop.
+        """
+        if self._timed_out is not None:
+            raise RuntimeError("a timed out check is still running")
+        future = asyncio.ensure_future(asyncio.to_thread(func))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), Config.UPDATE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if not future.done():
+                self._timed_out = future
+                future.add_done_callback(self._on_timed_out_done)
+            raise
+
+    def _on_timed_out_done(self, future):
+        """Let checks run again once a timed out check has returned"""
+        self._timed_out = None
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.error("Timed out check failed: %s", future.exception())
+        else:
+            self.logger.info("Timed out check finished")
+        self._wakeup.set()
+
+    async def _check(self):
+        """Run one theme check in a worker thread, returns False on failure"""
+        try:
+            return await self._in_thread(self.changer.update_theme)
+        except asyncio.TimeoutError:
+            self.logger.error("Theme check timed out after %ss", Config.UPDATE_TIMEOUT)
+            return False
+        except Exception as e:
+            self.logger.error("Theme check failed: %s", e)
+            return False
+        finally:
+            self.changer.export_metrics()
+
+    async def _transition_loop(self):
+        """Check the theme, then sleep until the next theme change"""
+        while True:
+            self._wakeup.clear()
+            if self.paused:
+                ok = True
+            else:
+                async with self._check_lock:
+                    ok = await self._check()
+            if ok:
+                scheduler = TransitionScheduler(
+                    self.changer.location_manager,
+                    self.check_interval,
+                    self.clock,
+                    phase_theme=self.changer.theme_manager.get_phase_theme,
+                )
+                wakeup, reason = scheduler.next_wakeup()
+            else:
+                wakeup = self.clock() + Config.DEFAULT_CHECK_INTERVAL
+                reason = "retry"
+
+            self.next_check = (wakeup, reason)
+            self.logger.info(
+                "Next check at %s (%s)",
+                self.changer.location_manager.local_time(wakeup).strftime(
+                    "%H:%M:%S %Z"
+                ),
+                reason,
+            )
+            await self._sleep_until(wakeup)
+
+    def _on_wall_timer(self):
+        """Wake the transition loop when the timerfd fires or the clock is set"""
+        result = self.wall_timer.read()
+        if result is None:
+            return
+        if result == CLOCK_CHANGED:
+            metrics.inc("clock_changes_total")
+            self.logger.info("Wall clock changed or system resumed, re-checking")
+        self._wakeup.set()
+
+    async def _sleep_until(self, deadline):
+        """Sleep until a wall-clock time, or until woken up early"""
+        if self.wall_timer is not None:
+            self.wall_timer.arm(deadline)
+            try:
+                await self._wakeup.wait()
+            finally:
+                # Woken early: the old deadline must not cut the next sleep short
+                self.wall_timer.disarm()
+            return
+
+        # The loop's timers follow a monotonic clock, so re-check the wall clock
+        while True:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def _light_sensor_loop(self, sensor):
+        """Sample the ambient light sensor, re-check when it turns bright or dark"""
+        while True:
+            await asyncio.sleep(Config.LIGHT_SENSOR_INTERVAL)
+            try:
+                # IIO drivers may wait for a conversion, keep it off the loop
+                changed = await asyncio.to_thread(sensor.sample)
+            except Exception as e:
+                self.logger.warning("Light sensor sample failed: %s", e)
+                continue
+            if changed:
+                self._wakeup.set()
+
+    async def _profile_loop(self, profiler):
+        """Record the daemon's memory and CPU time while it waits"""
+        while True:
+            await asyncio.sleep(Config.PROFILE_SAMPLE_INTERVAL)
+            profiler.sample("idle")
+
+    async def _location_refresh_loop(self):
+        """Re-detect the location periodically and re-check if it moved
+
+        The location is detected without the check lock, as web services can
+        be slow, and switched to under it, so a check never sees half a move.
+        A detection that timed out is waited for again instead of starting
+        another one alongside it.
+        """
+        location_manager = self.changer.location_manager
+        detection = None
+        while True:
+            await asyncio.sleep(Config.LOCATION_REFRESH_INTERVAL)
+            if detection is None or detection.done():
+                detection = asyncio.ensure_future(
+                    asyncio.to_thread(location_manager.detect_location)
+                )
+            try:
+                location = await asyncio.wait_for(
+                    asyncio.shield(detection), Config.API_TIMEOUT * 2
+                )
+                if location is None:
+                    continue
+                async with self._check_lock:
+                    moved = await self._in_thread(
+                        functools.partial(location_manager.move_to, location)
+                    )
+            except asyncio.TimeoutError:
+                self.logger.warning("Location refresh timed out")
+                continue
+            except Exception as e:
+                self.logger.warning("Location refresh failed: %s", e)
+                continue
+            if moved:
+                self._wakeup.set()
@@ -5,6 +5,9 @@ Configuration module for KDE Theme Auto-Changer
 Contains default settings and configuration management.
 """
 
+import json
+import logging
+import os
 from pathlib import Path
 
 
@@ -23,15 +26,78 @@ class Config:
     DEFAULT_TIMEZONE = "America/New_York"
 
     # Daemon settings
-    DEFAULT_CHECK_INTERVAL = 300  # 5 minutes in seconds
+    DEFAULT_CHECK_INTERVAL = 300  # 5 minutes in seconds, retry after a failed check
+    SAFETY_CHECK_INTERVAL = 3600  # 1 hour in seconds, maximum sleep between transitions
+    TRANSITION_GRACE = 0.5  # seconds to wait past a transition before re-checking
+    UPDATE_TIMEOUT = 120  # seconds a theme check may take in daemon mode
+    LOCATION_REFRESH_INTERVAL = 6 * 3600  # seconds between IP location refreshes
+    PHASE_LOOKAHEAD = 40  # sun phase transitions searched for the next theme change
+    CONTROL_SOCKET_NAME = "kde_theme_changer.sock"  # in $XDG_RUNTIME_DIR
+    CONTROL_TIMEOUT = UPDATE_TIMEOUT + 10  # seconds the client waits for an answer
+
+    # Theme apply settings
+    APPLY_MAX_WORKERS = 4
+    APPLY_STEP_TIMEOUT = 30  # seconds per apply command
+    # "full": lookandfeeltool --apply; "partial": only the settings that differ
+    APPLY_MODE = "full"
+
+    # Ambient light sensor, see app/light_sensor.py
+    LIGHT_SENSOR_ROOT = Path("/sys/bus/iio/devices")
+    LIGHT_SENSOR_INTERVAL = 15  # seconds between samples in daemon mode
+    LIGHT_SENSOR_ALPHA = 0.2  # weight of the newest sample in the smoothed level
+    LIGHT_SENSOR_DARK_LUX = 50.0  # dark once the smoothed level falls below this
+    LIGHT_SENSOR_BRIGHT_LUX = 200.0  # bright once it rises above this
+
+    # --profile mode, see app/profiling.py
+    PROFILE_SAMPLE_INTERVAL = 60  # seconds between memory samples of the idle daemon
+
+    # Multi-user daemon settings
+    SESSION_RUNTIME_ROOT = Path("/run/user")  # logind creates <uid>/ per logged-in user
+    SESSION_SCAN_INTERVAL = 60  # seconds between scans for new sessions
+    MULTI_USER_MAX_WORKERS = 8  # sessions switched concurrently
+    USER_SETTINGS_FILE = "kde_theme_changer.json"  # per-user overrides in ~/.config
+    USER_SETTINGS_KEYS = (
+        "latitude",
+        "longitude",
+        "city",
+        "light_theme",
+        "dark_theme",
+        "phase_themes",
+        "apply_mode",
+    )
 
     # Logging settings
     LOG_FILE = Path.home() / ".kde_theme_changer.log"
     LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+    LOG_JSON = False  # write the log file as one JSON object per line
+    LOG_MAX_BYTES = 1024 * 1024  # rotate the log file when it reaches 1 MiB
+    LOG_MAX_AGE = 7 * 24 * 3600  # or when it has been written to for a week
+    LOG_BACKUP_COUNT = 5  # gzipped rotated log files to keep
+    LOG_QUEUE_SIZE = 10000  # records waiting for the writer thread; more are dropped
+
+    # Cache settings
+    CACHE_DIR = (
+        Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+        / "kde_theme_changer"
+    )
+    SUN_TABLE_DAYS = 400  # days of sunrise/sunset times precomputed per location
+    SUN_TABLE_PRECISION = 2  # decimal places coordinates are rounded to (~1 km)
+    LOCATION_CACHE_TTL = 30 * 24 * 3600  # 30 days in seconds for geocoded cities
+    LOCATION_CACHE_IP_TTL = 24 * 3600  # 1 day in seconds for IP geolocation
+    LOCATION_CACHE_MAX_ENTRIES = 32
+    LOCATION_CACHE_TOUCH_INTERVAL = 3600  # seconds between saving an entry's last use
+    STATE_JOURNAL_FILE = "applied_state.json"  # last applied theme, in CACHE_DIR
+    # Offline city database consulted before the geocoding services
+    GAZETTEER_FILE = Path(__file__).resolve().parent / "data" / "gazetteer.bin"
+    # Time zones of coordinates, built from the gazetteer
+    TIMEZONE_GRID_FILE = Path(__file__).resolve().parent / "data" / "tz_grid.bin"
 
     # API endpoints
     IP_GEOLOCATION_API = "http://ip-api.com/json/"
+    IPWHOIS_API = "https://ipwho.is/"
+    IPAPI_CO_API = "https://ipapi.co/json/"
     GEOCODING_API = "https://nominatim.openstreetmap.org/search"
+    PHOTON_API = "https://photon.komoot.io/api/"
 
     # User agent for API requests
     USER_AGENT = "KDE-Theme-Changer/1.0"
@@ -39,6 +105,70 @@ class Config:
     # API timeouts
     API_TIMEOUT = 10  # seconds
 
+    # Location provider racing, see app/geo_providers.py
+    GEO_RACE_WIDTH = 2  # best ranked providers asked at once
+    GEO_HEDGE_FACTOR = 2.0  # ask the next provider after this many usual latencies
+    GEO_HEDGE_MIN_DELAY = 0.25  # seconds, shortest hedge delay
+    GEO_DEFAULT_LATENCY = 1.0  # seconds assumed for providers never asked
+    GEO_MAX_ATTEMPTS = 2  # requests per provider and lookup
+    GEO_STATS_ALPHA = 0.3  # weight of the newest request in the smoothed stats
+
     # Notification settings
     NOTIFICATION_APP_NAME = "KDE Theme Changer"
     NOTIFICATION_ICON = "preferences-desktop-theme"
+    NOTIFICATION_TIMEOUT = 5  # seconds
+
+
+def _check_user_setting(key, value):
+    """Get a settings file value as its key needs it, ValueError if it cannot be"""
+    if key in ("latitude", "longitude"):
+        if isinstance(value, bool):
+            raise ValueError("not a number")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("not a number") from None
+        limit = 90 if key == "latitude" else 180
+        if not -limit <= number <= limit:
+            raise ValueError(f"not between -{limit} and {limit}")
+        return number
+    if key == "phase_themes":
+        if not isinstance(value, dict):
+            raise ValueError("not an object")
+        return value
+    if not isinstance(value, str) or not value:
+        raise ValueError("not a string")
+    return value
+
+
+def load_user_settings(config_home=None):
+    """Read a user's location and theme overrides from their settings file
+
+    Returns only the known keys with usable values; a missing or broken file
+    gives {}.
+    """
+    if config_home is None:
+        home = os.environ.get("XDG_CONFIG_HOME")
+        config_home = Path(home) if home else Path.home() / ".config"
+    path = Path(config_home) / Config.USER_SETTINGS_FILE
+    logger = logging.getLogger(__name__)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring settings file %s: %s", path, e)
+        return {}
+
+    if not isinstance(data, dict):
+        logger.warning("Ignoring settings file %s: not a JSON object", path)
+        return {}
+    settings = {}
+    for key in Config.USER_SETTINGS_KEYS:
+        if key not in data:
+            continue
+        try:
+            settings[key] = _check_user_setting(key, data[key])
+        except ValueError as e:
+            logger.warning("Ignoring %s in %s: %s", key, path, e)
+    return settings
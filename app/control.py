@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Control socket module for KDE Theme Auto-Changer
+
+A running daemon serves a Unix domain socket in $XDG_RUNTIME_DIR (see
+app.control_server), so the command line can query and steer it in a few
+milliseconds instead of starting up: no location lookup, sun table or logging
+setup. The protocol is one JSON object per line in each direction:
+
+    {"command": "force", "theme": "dark"}
+    {"ok": true, "result": {...}}
+    {"ok": false, "error": "..."}
+
+This module holds the client side and is kept free of asyncio.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from .config import Config
+
+COMMANDS = ("status", "next", "check", "force", "pause", "resume", "reload")
+
+
+class ControlError(RuntimeError):
+    """The daemon answered a control request with an error"""
+
+
+def socket_path():
+    """Get the control socket path of this user's daemon"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / Config.CONTROL_SOCKET_NAME
+    return Config.CACHE_DIR / Config.CONTROL_SOCKET_NAME
+
+
+def request(command, path=None, timeout=None, **params):
+    """Send one command to the running daemon, returns its result
+
+    Raises OSError if no daemon is listening and ControlError if the command
+    failed.
+    """
+    # socket is only needed when talking to a daemon
+    import socket
+
+    message = json.dumps(dict(params, command=command)).encode("utf-8") + b"\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout or Config.CONTROL_TIMEOUT)
+        sock.connect(str(path or socket_path()))
+        sock.sendall(message)
+        with sock.makefile("rb") as f:
+            line = f.readline()
+
+    if not line:
+        raise ConnectionError("The daemon closed the connection")
+    try:
+        response = json.loads(line)
+    except ValueError as e:
+        raise ControlError(f"Invalid response from the daemon: {e}") from None
+    if not response.get("ok"):
+        raise ControlError(response.get("error") or "Request failed")
+    return response.get("result")
+
+
+def format_time(timestamp):
+    """Format a Unix timestamp in local time for the command line"""
+    return datetime.fromtimestamp(timestamp).astimezone().strftime("%Y-%m-%d %H:%M")
+
+
+def format_transitions(transitions):
+    """Format KDEThemeChanger.transitions() entries, one line each"""
+    return [
+        f"{format_time(item['timestamp'])}  {item['phase']:<20} {item['theme']}"
+        for item in transitions
+    ]
+
+
+def format_status(status):
+    """Format a status result as 'Label: value' lines"""
+    location = status["location"]
+    lines = [
+        f"Theme:     {status['current_theme']}",
+        f"Phase:     {status['phase'].replace('_', ' ')} "
+        f"(scheduled theme: {status['scheduled_theme']})",
+        f"Location:  {location['name']} "
+        f"({location['latitude']:.4f}, {location['longitude']:.4f}"
+        + (f", {location['timezone']})" if location.get("timezone") else ")"),
+    ]
+    ambient = status.get("ambient_light")
+    if ambient:
+        if ambient["lux"] is None:
+            lines.append("Light:     sensor unavailable (following the sun)")
+        else:
+            state = {True: "bright", False: "dark", None: "following the sun"}
+            lines.append(
+                f"Light:     {ambient['lux']:.0f} lux ({state[ambient['bright']]})"
+            )
+    forced = status.get("forced")
+    if forced:
+        until = forced["until"]
+        lines.append(
+            f"Forced:    {forced['theme']} until "
+            + (format_time(until) if until is not None else "resumed")
+        )
+    change = status.get("next_change")
+    if change:
+        lines.append(
+            f"Next:      {change['phase'].replace('_', ' ')} at "
+            f"{format_time(change['timestamp'])} ({change['theme']})"
+        )
+    if "paused" in status:
+        lines.append(f"Paused:    {'yes' if status['paused'] else 'no'}")
+    if status.get("next_check"):
+        check = status["next_check"]
+        lines.append(
+            f"Checking:  {format_time(check['timestamp'])} ({check['reason']})"
+        )
+    return lines
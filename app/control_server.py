@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Control server module for KDE Theme Auto-Changer
+
+Serves the control socket protocol (see app.control) from the daemon's event
+loop. Queries are answered from the daemon's in-memory state; checks, forced
+themes and reloads share the daemon's check lock, so they never run
+concurrently with a scheduled check.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import stat
+from pathlib import Path
+
+from .config import Config
+from .control import COMMANDS
+from .metrics import metrics
+
+
+class ControlServer:
+    """Unix socket server answering control requests for an AsyncDaemon"""
+
+    def __init__(self, daemon, path):
+        self.logger = logging.getLogger(__name__)
+        self.daemon = daemon
+        self.path = Path(path)
+        self._server = None
+
+    async def start(self):
+        """Listen on the socket, returns False if another daemon already does"""
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                if await self._in_use():
+                    self.logger.warning(
+                        "Another daemon serves %s, not listening", self.path
+                    )
+                    return False
+                # Left behind by a daemon that did not stop cleanly
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._server = await asyncio.start_unix_server(
+                self._serve, path=str(self.path)
+            )
+            os.chmod(self.path, 0o600)
+        except OSError as e:
+            self.logger.warning("Could not serve control socket %s: %s", self.path, e)
+            return False
+        self.logger.info("Control socket listening on %s", self.path)
+        return True
+
+    async def _in_use(self):
+        """Whether something accepts connections on the socket"""
+        try:
+            _, writer = await asyncio.open_unix_connection(str(self.path))
+        except OSError:
+            return False
+        writer.close()
+        return True
+
+    async def close(self):
+        """Stop listening and remove the socket"""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _serve(self, reader, writer):
+        """Answer requests on one connection until the client closes it"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle(line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            # ValueError: a line longer than the stream limit
+            self.logger.debug("Control connection failed: %s", e)
+        finally:
+            writer.close()
+
+    async def handle(self, line):
+        """Run one request line, returns the response dict"""
+        try:
+            request = json.loads(line)
+            command = request["command"]
+        except (ValueError, KeyError, TypeError):
+            return {"ok": False, "error": "Invalid request"}
+        if command not in COMMANDS:
+            return {"ok": False, "error": f"Unknown command '{command}'"}
+
+        metrics.inc("control_requests_total", command=command)
+        handler = getattr(self, f"_{command}")
+        try:
+            result = await asyncio.wait_for(handler(request), Config.UPDATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"'{command}' timed out"}
+        except (ValueError, TypeError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            self.logger.error("Control command %s failed: %s", command, e)
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "result": result}
+
+    async def _status(self, request):
+        status = await asyncio.to_thread(self.daemon.changer.status)
+        status["paused"] = self.daemon.paused
+        status["next_check"] = None
+        if self.daemon.next_check is not None:
+            timestamp, reason = self.daemon.next_check
+            status["next_check"] = {"timestamp": timestamp, "reason": reason}
+        return status
+
+    async def _next(self, request):
+        count = int(request.get("count", 1))
+        if not 1 <= count <= Config.PHASE_LOOKAHEAD:
+            raise ValueError(f"count must be between 1 and {Config.PHASE_LOOKAHEAD}")
+        return await asyncio.to_thread(self.daemon.changer.transitions, count)
+
+    async def _check(self, request):
+        if not await self.daemon.check_now():
+            raise RuntimeError("Theme check failed")
+        return await self._status(request)
+
+    async def _force(self, request):
+        theme = request.get("theme")
+        if not isinstance(theme, str) or not theme:
+            raise ValueError("force needs a theme: light, dark or a package name")
+        if not await self.daemon.force_now(theme):
+            raise RuntimeError("Theme check failed")
+        return await self._status(request)
+
+    async def _pause(self, request):
+        self.daemon.pause()
+        return await self._status(request)
+
+    async def _resume(self, request):
+        self.daemon.changer.clear_forced_theme()
+        self.daemon.resume()
+        return await self._check(request)
+
+    async def _reload(self, request):
+        if not await self.daemon.reload_now():
+            raise RuntimeError("Reload failed")
+        return await self._status(request)
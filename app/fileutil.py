@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+File utilities for KDE Theme Auto-Changer
+
+Helpers for crash-safe writes of cache and state files.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def atomic_write(path, data):
+    """Write bytes to path so readers see either the old or the new file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
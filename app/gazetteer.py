@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Gazetteer module for KDE Theme Auto-Changer
+
+A compact city database bundled with the application, so a city name (or
+coordinates, for the nearest city) resolves without a network round trip.
+The binary file is memory-mapped and never parsed as a whole:
+
+- names and aliases are folded (case, accents, punctuation) into one sorted
+  key array, so exact and prefix lookups are binary searches
+- the cities are stored in the order of an implicit k-d tree over their unit
+  vectors on the sphere, so the nearest city is a tree search with exact
+  great-circle ordering and no pointers
+
+The bundled file is built from astral's city list; a larger one can be built
+from a GeoNames cities*.txt export and used through Config.GAZETTEER_FILE.
+"""
+
+import logging
+import math
+import mmap
+import struct
+import sys
+import unicodedata
+from array import array
+from pathlib import Path
+
+from astral import LocationInfo
+
+from .config import Config
+from .fileutil import atomic_write
+
+# magic, version, number of cities, name keys, timezones and string bytes;
+# 24 bytes, so the point array that follows stays 8-byte aligned
+HEADER = struct.Struct("<4sH2xIIII")
+# then one unit vector (x, y, z doubles) per city, in k-d tree order, then per
+# city: latitude, longitude, population, string offsets of the name and the
+# region, their lengths in bytes and the timezone index
+CITY = struct.Struct("<ddIIIBBH")
+POINT_SIZE = 24
+# then the name keys sorted by their UTF-8 bytes: string offset, city, length
+NAME = struct.Struct("<IIH2x")
+# then the timezone names (string offset, length), then the strings
+TIMEZONE = struct.Struct("<IH2x")
+
+MAGIC = b"KGAZ"
+VERSION = 1
+EARTH_RADIUS_KM = 6371.0088
+MAX_STRING = 255  # bytes per name or region
+
+
+def normalize(name):
+    """Fold a place name for matching: case, accents, punctuation and spacing"""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    folded = "".join(
+        char if char.isalnum() else " "
+        for char in decomposed
+        if not unicodedata.combining(char)
+    )
+    return " ".join(folded.split())
+
+
+def _unit_vector(latitude, longitude):
+    """Get the point on the unit sphere at latitude, longitude in degrees"""
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+class City:
+    """A gazetteer entry to build a file from"""
+
+    def __init__(
+        self, name, region, timezone, latitude, longitude, population=0, aliases=()
+    ):
+        self.name = name
+        self.region = region
+        self.timezone = timezone
+        self.latitude = latitude
+        self.longitude = longitude
+        self.population = population
+        self.aliases = aliases
+
+    def keys(self):
+        """Get the folded name keys this city is found by"""
+        keys = {normalize(self.name)}
+        keys.update(normalize(alias) for alias in self.aliases)
+        keys.discard("")
+        return keys
+
+
+def astral_cities():
+    """Get the cities known to astral's geocoder"""
+    from astral.geocoder import all_locations, database
+
+    return [
+        City(info.name, info.region, info.timezone, info.latitude, info.longitude)
+        for info in all_locations(database())
+    ]
+
+
+def read_geonames(path, min_population=0):
+    """Read the cities of a GeoNames export (cities15000.txt and the like)
+
+    Alternate names become aliases and the country code the region.
+    """
+    cities = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 18:
+                raise ValueError(f"{path}:{line_number}: not a GeoNames line")
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            aliases = [fields[2]] + [a for a in fields[3].split(",") if a]
+            cities.append(
+                City(
+                    fields[1],
+                    fields[8],
+                    fields[17],
+                    float(fields[4]),
+                    float(fields[5]),
+                    population,
+                    aliases,
+                )
+            )
+    return cities
+
+
+def _kd_order(points, order, lo, hi, axis):
+    """Arrange order[lo:hi] as an implicit k-d tree, splitting on axis first
+
+    The node of a range is its middle element; the lower half holds the
+    points below it on the axis, the upper half the points above.
+    """
+    while hi - lo > 1:
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        mid = (lo + hi) // 2
+        axis = (axis + 1) % 3
+        _kd_order(points, order, lo, mid, axis)
+        lo = mid + 1
+
+
+def build_gazetteer(cities, path):
+    """Write a gazetteer file, returns the number of cities written
+
+    Cities without a usable name, coordinates or timezone are skipped.
+    """
+    cities = [
+        city
+        for city in cities
+        if city.timezone
+        and -90 <= city.latitude <= 90
+        and -180 <= city.longitude <= 180
+        and 0 < len(city.name.encode("utf-8")) <= MAX_STRING
+        and len(city.region.encode("utf-8")) <= MAX_STRING
+    ]
+    points = [_unit_vector(city.latitude, city.longitude) for city in cities]
+    order = list(range(len(cities)))
+    _kd_order(points, order, 0, len(order), 0)
+    cities = [cities[i] for i in order]
+    points = [points[i] for i in order]
+
+    strings = bytearray()
+    offsets = {}
+
+    def intern(text):
+        encoded = text.encode("utf-8")
+        if encoded not in offsets:
+            offsets[encoded] = len(strings)
+            strings.extend(encoded)
+        return offsets[encoded], len(encoded)
+
+    timezones = sorted({city.timezone for city in cities})
+    timezone_index = {name: index for index, name in enumerate(timezones)}
+    names = sorted(
+        (key.encode("utf-8"), index)
+        for index, city in enumerate(cities)
+        for key in city.keys()
+        if len(key.encode("utf-8")) <= MAX_STRING
+    )
+
+    out = bytearray(
+        HEADER.pack(MAGIC, VERSION, len(cities), len(names), len(timezones), 0)
+    )
+    for point in points:
+        out += struct.pack("<ddd", *point)
+    for city in cities:
+        name_offset, name_length = intern(city.name)
+        region_offset, region_length = intern(city.region)
+        out += CITY.pack(
+            city.latitude,
+            city.longitude,
+            min(city.population, 2**32 - 1),
+            name_offset,
+            region_offset,
+            name_length,
+            region_length,
+            timezone_index[city.timezone],
+        )
+    for key, index in names:
+        offset, length = intern(key.decode("utf-8"))
+        out += NAME.pack(offset, index, length)
+    for timezone in timezones:
+        out += TIMEZONE.pack(*intern(timezone))
+    out += strings
+    struct.pack_into("<I", out, 20, len(strings))
+
+    atomic_write(Path(path), bytes(out))
+    return len(cities)
+
+
+class Gazetteer:
+    """Memory-mapped city gazetteer with name and nearest-city lookups"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or Config.GAZETTEER_FILE)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except (ValueError, struct.error):
+            self._buffer.close()
+            raise
+
+    def _open(self):
+        """Check the header and locate the sections"""
+        buffer = self._buffer
+        if len(buffer) < HEADER.size:
+            raise ValueError(f"{self.path} is not a gazetteer")
+        magic, version, cities, names, timezones, strings = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} gazetteer")
+        self.count = cities
+        self._names = names
+        self._cities_offset = HEADER.size + cities * POINT_SIZE
+        self._names_offset = self._cities_offset + cities * CITY.size
+        self._timezones_offset = self._names_offset + names * NAME.size
+        self._strings_offset = self._timezones_offset + timezones * TIMEZONE.size
+        if len(buffer) != self._strings_offset + strings:
+            raise ValueError(f"{self.path} is truncated")
+
+        if sys.byteorder == "little":
+            self._points = memoryview(buffer)[HEADER.size : self._cities_offset]
+            self._points = self._points.cast("d")
+        else:
+            self._points = array("d")
+            self._points.frombytes(buffer[HEADER.size : self._cities_offset])
+            self._points.byteswap()
+        self._timezones = [
+            self._string(*TIMEZONE.unpack_from(buffer, offset))
+            for offset in range(
+                self._timezones_offset, self._strings_offset, TIMEZONE.size
+            )
+        ]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterate over the cities as LocationInfo, in file order"""
+        return (self._city(index)[0] for index in range(self.count))
+
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return self._buffer[start : start + length].decode("utf-8")
+
+    def _key(self, position):
+        """Get the UTF-8 name key at position and its city index"""
+        offset, city, length = NAME.unpack_from(
+            self._buffer, self._names_offset + position * NAME.size
+        )
+        start = self._strings_offset + offset
+        return self._buffer[start : start + length], city
+
+    def _bisect(self, key):
+        """Get the position of the first name key not below key"""
+        lo, hi = 0, self._names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _matches(self, key, prefix=False):
+        """Yield the city indexes whose key equals (or starts with) key"""
+        encoded = key.encode("utf-8")
+        for position in range(self._bisect(encoded), self._names):
+            found, city = self._key(position)
+            if found != encoded and not (prefix and found.startswith(encoded)):
+                return
+            yield city
+
+    def _city(self, index):
+        """Get (LocationInfo, population) for a city index"""
+        (
+            latitude,
+            longitude,
+            population,
+            name,
+            region,
+            name_length,
+            region_length,
+            tz,
+        ) = CITY.unpack_from(self._buffer, self._cities_offset + index * CITY.size)
+        location = LocationInfo(
+            self._string(name, name_length),
+            self._string(region, region_length),
+            self._timezones[tz],
+            latitude,
+            longitude,
+        )
+        return location, population
+
+    def lookup(self, name):
+        """Find a city by name or alias, returns a LocationInfo or None
+
+        "City, Region" only matches cities whose region starts with Region.
+        Of several cities with the name, the most populous one wins.
+        """
+        query, _, region = name.partition(",")
+        region = normalize(region)
+        best, best_population = None, -1
+        for index in self._matches(normalize(query)):
+            location, population = self._city(index)
+            if region and not normalize(location.region).startswith(region):
+                continue
+            if population > best_population:
+                best, best_population = location, population
+        return best
+
+    def complete(self, prefix, limit=10):
+        """Get up to limit cities with a name or alias starting with prefix"""
+        key = normalize(prefix)
+        if not key:
+            return []
+        seen = []
+        for index in self._matches(key, prefix=True):
+            if index not in seen:
+                seen.append(index)
+                if len(seen) == limit:
+                    break
+        return [self._city(index)[0] for index in seen]
+
+    def nearest(self, latitude, longitude):
+        """Find the city nearest to a point, returns (LocationInfo, km) or None"""
+        if not self.count:
+            return None
+        query = _unit_vector(latitude, longitude)
+        qx, qy, qz = query
+        points = self._points
+        best_index, best = -1, math.inf
+
+        def search(lo, hi, axis):
+            nonlocal best_index, best
+            mid = (lo + hi) // 2
+            base = mid * 3
+            dx = qx - points[base]
+            dy = qy - points[base + 1]
+            dz = qz - points[base + 2]
+            distance = dx * dx + dy * dy + dz * dz
+            if distance < best:
+                best_index, best = mid, distance
+            diff = query[axis] - points[base + axis]
+            next_axis = (axis + 1) % 3
+            near, far = (
+                ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            )
+            if near[0] < near[1]:
+                search(near[0], near[1], next_axis)
+            if far[0] < far[1] and diff * diff < best:
+                search(far[0], far[1], next_axis)
+
+        search(0, self.count, 0)
+        chord = math.sqrt(best)
+        kilometers = 2 * math.asin(min(chord / 2, 1.0)) * EARTH_RADIUS_KM
+        return self._city(best_index)[0], kilometers
+
+    def close(self):
+        """Unmap the file"""
+        if isinstance(self._points, memoryview):
+            self._points.release()
+        self._buffer.close()
+
+
+_gazetteers = {}
+
+
+def open_gazetteer(path=None):
+    """Get the shared Gazetteer for path (default: Config.GAZETTEER_FILE)
+
+    Returns None if the file is missing or unreadable; the result is kept, so
+    the file is mapped once per process.
+    """
+    path = path or Config.GAZETTEER_FILE
+    if path not in _gazetteers:
+        logger = logging.getLogger(__name__)
+        try:
+            _gazetteers[path] = Gazetteer(path)
+        except FileNotFoundError:
+            logger.debug("No gazetteer at %s", path)
+            _gazetteers[path] = None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable gazetteer: %s", e)
+            _gazetteers[path] = None
+    return _gazetteers[path]
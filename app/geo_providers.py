@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Location provider module for KDE Theme Auto-Changer
+
+Asks several IP geolocation and geocoding web services at once instead of
+waiting on a single one. The best ranked providers are queried concurrently
+and the first valid answer wins; if none has answered after a hedge delay
+derived from their usual latency, the next provider is asked too, and failed
+providers are retried while there is time left. Each provider keeps a pooled
+keep-alive requests.Session, and its latency and success rate are tracked
+(and stored next to the location cache) to rank the providers over time.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from .config import Config
+from .fileutil import atomic_write
+from .metrics import metrics
+
+
+class Provider:
+    """One location web service: where to ask and how to read the answer"""
+
+    def __init__(self, name, url, parse, params=None):
+        self.name = name
+        self.url = url
+        # parse(json) returns an answer dict, None for "not found", or raises
+        self.parse = parse
+        # params(query) returns the query string parameters, if any
+        self.params = params
+
+
+def _parse_ip_api(data):
+    if data.get("status") != "success":
+        raise ValueError(data.get("message") or "lookup failed")
+    return {
+        "name": data["city"],
+        "region": data["country"],
+        "latitude": data["lat"],
+        "longitude": data["lon"],
+        "ip": data.get("query"),
+    }
+
+
+def _parse_ipwhois(data):
+    if not data.get("success"):
+        raise ValueError(data.get("message") or "lookup failed")
+    return {
+        "name": data["city"],
+        "region": data["country"],
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "ip": data.get("ip"),
+    }
+
+
+def _parse_ipapi_co(data):
+    if data.get("error"):
+        raise ValueError(data.get("reason") or "lookup failed")
+    return {
+        "name": data["city"],
+        "region": data["country_name"],
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "ip": data.get("ip"),
+    }
+
+
+def _parse_nominatim(data):
+    if not data:
+        return None
+    return {
+        "name": data[0]["name"] if data[0].get("name") else None,
+        "region": data[0]["display_name"],
+        "latitude": float(data[0]["lat"]),
+        "longitude": float(data[0]["lon"]),
+    }
+
+
+def _parse_photon(data):
+    features = data["features"]
+    if not features:
+        return None
+    properties = features[0]["properties"]
+    longitude, latitude = features[0]["geometry"]["coordinates"]
+    parts = [properties.get(key) for key in ("name", "state", "country")]
+    return {
+        "name": properties.get("name"),
+        "region": ", ".join(part for part in parts if part),
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+    }
+
+
+def default_ip_providers():
+    """Get the built-in IP geolocation providers, in their default order"""
+    return (
+        Provider("ip-api", Config.IP_GEOLOCATION_API, _parse_ip_api),
+        Provider("ipwho.is", Config.IPWHOIS_API, _parse_ipwhois),
+        Provider("ipapi.co", Config.IPAPI_CO_API, _parse_ipapi_co),
+    )
+
+
+def default_geocoding_providers():
+    """Get the built-in geocoding providers, in their default order"""
+    return (
+        Provider(
+            "nominatim",
+            Config.GEOCODING_API,
+            _parse_nominatim,
+            lambda city: {"q": city, "format": "json", "limit": 1},
+        ),
+        Provider(
+            "photon",
+            Config.PHOTON_API,
+            _parse_photon,
+            lambda city: {"q": city, "limit": 1},
+        ),
+    )
+
+
+def _check_answer(answer):
+    """Reject answers without usable coordinates"""
+    latitude = float(answer["latitude"])
+    longitude = float(answer["longitude"])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"coordinates out of range: {latitude}, {longitude}")
+    answer["latitude"], answer["longitude"] = latitude, longitude
+    return answer
+
+
+class ProviderStats:
+    """Smoothed latency and success rate of one provider"""
+
+    def __init__(self, latency=None, success=1.0, count=0):
+        self.latency = Config.GEO_DEFAULT_LATENCY if latency is None else latency
+        self.success = success
+        self.count = count
+
+    def record(self, seconds, ok):
+        alpha = Config.GEO_STATS_ALPHA
+        if ok:
+            self.latency += alpha * (seconds - self.latency)
+        self.success += alpha * ((1.0 if ok else 0.0) - self.success)
+        self.count += 1
+
+    @property
+    def expected_seconds(self):
+        """Expected time to a valid answer, the ranking key"""
+        return self.latency / max(self.success, 0.05)
+
+    def to_dict(self):
+        return {"latency": self.latency, "success": self.success, "count": self.count}
+
+
+class GeoClient:
+    """Races location providers over pooled HTTP sessions"""
+
+    def __init__(self, ip_providers=None, geocoding_providers=None, stats_path=None):
+        self.logger = logging.getLogger(__name__)
+        self.ip_providers = ip_providers or default_ip_providers()
+        self.geocoding_providers = geocoding_providers or default_geocoding_providers()
+        self.stats_path = stats_path or Config.CACHE_DIR / "geo_providers.json"
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.stats = self._load_stats()
+
+    def _load_stats(self):
+        """Read the provider statistics, starting fresh if they are unreadable"""
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)["providers"]
+            return {name: ProviderStats(**entry) for name, entry in entries.items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning("Ignoring unreadable provider statistics: %s", e)
+        return {}
+
+    def _save_stats(self):
+        """Write the provider statistics atomically"""
+        with self._lock:
+            entries = {name: stats.to_dict() for name, stats in self.stats.items()}
+        data = json.dumps({"providers": entries}, indent=1).encode("utf-8")
+        try:
+            atomic_write(self.stats_path, data)
+        except OSError as e:
+            self.logger.warning("Could not store provider statistics: %s", e)
+
+    def _stats(self, name):
+        """Get the statistics of a provider, call with the lock held"""
+        if name not in self.stats:
+            self.stats[name] = ProviderStats()
+        return self.stats[name]
+
+    def ranked(self, providers):
+        """Order providers by expected time to a valid answer, best first"""
+        with self._lock:
+            return sorted(providers, key=lambda p: self._stats(p.name).expected_seconds)
+
+    def _session(self, provider):
+        """Get the keep-alive session of a provider"""
+        with self._lock:
+            session = self._sessions.get(provider.name)
+            if session is None:
+                session = requests.Session()
+                session.headers["User-Agent"] = Config.USER_AGENT
+                self._sessions[provider.name] = session
+            return session
+
+    def locate_ip(self):
+        """Locate this host by its public IP, returns an answer dict or None
+
+        Answers have name, region, latitude, longitude and, for IP
+        geolocation, the public ip.
+        """
+        return self._race("ip_geolocation", self.ip_providers, None)
+
+    def geocode(self, city):
+        """Look up a city, returns an answer dict or None if nobody found it"""
+        return self._race("geocoding", self.geocoding_providers, city)
+
+    def _fetch(self, api, provider, query, answers):
+        """Ask one provider, putting (provider, answer, ok) on answers"""
+        start = time.perf_counter()
+        answer, ok = None, False
+        try:
+            with metrics.timer("http_request_seconds", api=api, provider=provider.name):
+                response = self._session(provider).get(
+                    provider.url,
+                    params=provider.params(query) if provider.params else None,
+                    timeout=Config.API_TIMEOUT,
+                )
+                response.raise_for_status()
+                parsed = provider.parse(response.json())
+            answer = _check_answer(parsed) if parsed is not None else None
+            ok = True
+        except Exception as e:
+            metrics.inc("http_failures_total", api=api, provider=provider.name)
+            self.logger.debug("Location provider %s failed: %s", provider.name, e)
+
+        with self._lock:
+            self._stats(provider.name).record(time.perf_counter() - start, ok)
+        answers.put((provider, answer, ok))
+
+    def _hedge_delay(self, provider):
+        """How long to wait on provider before asking another one too"""
+        with self._lock:
+            latency = self._stats(provider.name).latency
+        return min(
+            max(latency * Config.GEO_HEDGE_FACTOR, Config.GEO_HEDGE_MIN_DELAY),
+            Config.API_TIMEOUT,
+        )
+
+    def _race(self, api, providers, query):
+        """Ask the providers concurrently, returns the first valid answer or None
+
+        The slower requests are abandoned: they finish in the background, only
+        to update the statistics.
+        """
+        candidates = self.ranked(providers)
+        if not candidates:
+            return None
+        attempts = dict.fromkeys((p.name for p in candidates), 0)
+        answers = queue.Queue()
+        in_flight = 0
+        now = time.monotonic()
+        deadline = now + Config.API_TIMEOUT
+
+        def launch():
+            nonlocal in_flight, hedge_at
+            provider = candidates.pop(0)
+            attempts[provider.name] += 1
+            in_flight += 1
+            hedge_at = time.monotonic() + self._hedge_delay(provider)
+            threading.Thread(
+                target=self._fetch,
+                args=(api, provider, query, answers),
+                name=f"geo-{provider.name}",
+                daemon=True,
+            ).start()
+
+        hedge_at = now
+        for _ in range(min(Config.GEO_RACE_WIDTH, len(candidates))):
+            launch()
+
+        result = None
+        while in_flight:
+            now = time.monotonic()
+            if now >= deadline:
+                self.logger.warning("No location provider answered in time")
+                break
+            timeout = deadline - now
+            if candidates:
+                timeout = min(timeout, max(hedge_at - now, 0))
+            try:
+                provider, answer, ok = answers.get(timeout=timeout)
+            except queue.Empty:
+                # Nobody answered within the usual latency: hedge
+                if candidates and time.monotonic() >= hedge_at:
+                    launch()
+                continue
+
+            in_flight -= 1
+            if answer is not None:
+                result = answer
+                metrics.inc(
+                    "location_provider_wins_total", api=api, provider=provider.name
+                )
+                self.logger.debug("Location answered by %s", provider.name)
+                break
+            if not ok and attempts[provider.name] < Config.GEO_MAX_ATTEMPTS:
+                candidates.append(provider)
+            if candidates:
+                launch()
+
+        self._save_stats()
+        return result
+
+    def close(self):
+        """Close the pooled connections"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
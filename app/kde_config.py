@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+KDE config reading module for KDE Theme Auto-Changer
+
+Reads KDE INI-style config files (such as kdeglobals) in-process, following
+KConfig's cascade over XDG_CONFIG_DIRS and XDG_CONFIG_HOME including `[$i]`
+immutability markers. Parsed results are cached until the files change, which
+is detected with inotify when available and a stat of each file otherwise.
+"""
+
+import logging
+import os
+import struct
+from pathlib import Path
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct("iIII")
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+ESCAPES = {"s": " ", "t": "\t", "n": "\n", "r": "\r", "\\": "\\", ";": ";", ",": ","}
+
+
+def _unescape(value):
+    """Decode KConfig escape sequences in a value"""
+    if "\\" not in value:
+        return value
+
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            result.append(ESCAPES.get(escaped, "\\" + escaped))
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def _split_groups(line):
+    """Split a `[Group][Subgroup]...` header into group names and flags"""
+    names = []
+    immutable = False
+    for part in line[1:-1].split("]["):
+        if part == "$i":
+            immutable = True
+        elif part.startswith("$"):
+            continue
+        else:
+            names.append(part)
+    return tuple(names), immutable
+
+
+def parse_kconfig(text, entries=None, locked=None):
+    """Parse KDE config text into {(group, ...): {key: value}}
+
+    When entries/locked from lower-priority files are passed in, entries are
+    merged on top of them except where those files marked a key, group or the
+    whole file as immutable. Returns (entries, locked, file_immutable), where
+    locked holds the immutable (group, key) pairs and groups (key None).
+    """
+    entries = {} if entries is None else entries
+    locked = set() if locked is None else locked
+    # Only locks from lower-priority files apply to this one
+    previous_locks = frozenset(locked)
+    group = None
+    group_immutable = False
+    file_immutable = False
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("[") and line.endswith("]"):
+            names, group_immutable = _split_groups(line)
+            if not names:
+                # A lone `[$i]` before the first group locks the whole file
+                file_immutable = file_immutable or (group is None and group_immutable)
+                continue
+            group = names
+            if group_immutable:
+                locked.add((group, None))
+            continue
+
+        if group is None or "=" not in line:
+            continue
+
+        key, value = line.split("=", 1)
+        key = key.strip()
+        key_immutable = False
+        if key.endswith("]") and "[" in key:
+            key, _, options = key[:-1].partition("[")
+            flags = options.split("][")
+            if any(not flag.startswith("$") for flag in flags):
+                # Localized entry such as Name[de]=..., not the default value
+                continue
+            key_immutable = "$i" in flags
+
+        if (group, None) in previous_locks or (group, key) in previous_locks:
+            continue
+
+        entries.setdefault(group, {})[key] = _unescape(value.strip())
+        if key_immutable:
+            locked.add((group, key))
+
+    return entries, locked, file_immutable
+
+
+class InotifyWatch:
+    """Minimal non-blocking inotify watch on a set of directories"""
+
+    def __init__(self, directories, filename):
+        self.filename = os.fsencode(filename)
+        self.fd = None
+        # Reused for every read, so polling an idle watch allocates nothing
+        self._buffer = bytearray(4096)
+
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        for directory in directories:
+            if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+        self.fd = fd
+
+    def changed(self):
+        """Drain pending events, returns True if the watched file was touched"""
+        changed = False
+        data = self._buffer
+        while True:
+            try:
+                size = os.readv(self.fd, [data])
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < size:
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW or name == self.filename:
+                    changed = True
+
+    def close(self):
+        """Stop watching"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class KConfigReader:
+    """Cached reader for one KDE config file across the XDG cascade"""
+
+    def __init__(self, filename="kdeglobals", config_home=None, config_dirs=None):
+        self.logger = logging.getLogger(__name__)
+        self.filename = filename
+
+        home = config_home or os.environ.get("XDG_CONFIG_HOME")
+        self.config_home = Path(home) if home else Path.home() / ".config"
+        dirs = config_dirs
+        if dirs is None:
+            dirs = (os.environ.get("XDG_CONFIG_DIRS") or "/etc/xdg").split(":")
+
+        # Lowest priority first: the last XDG_CONFIG_DIRS entry, up to the
+        # user's own file, which is read last and overrides the rest
+        directories = [Path(d) for d in reversed(dirs) if d] + [self.config_home]
+        self.paths = [directory / filename for directory in directories]
+
+        self._entries = None
+        # Signature the entries were read at, and the latest one taken
+        self._signature = None
+        self._fingerprint = None
+        self._watch = self._start_watch(directories)
+
+    def _start_watch(self, directories):
+        """Watch the cascade directories with inotify, if possible"""
+        if not all(directory.is_dir() for directory in directories):
+            return None
+        try:
+            return InotifyWatch(directories, self.filename)
+        except (OSError, AttributeError) as e:
+            self.logger.debug("inotify unavailable, using mtime checks: %s", e)
+            return None
+
+    def _stat_signature(self):
+        """Get (mtime, size, inode) of every cascade file"""
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def fingerprint(self):
+        """Get a cheap fingerprint of the cascade that changes with any write
+
+        While inotify reports no write the last one is reused, without stat().
+        """
+        if self._fingerprint is None or not self._watch or self._watch.changed():
+            self._fingerprint = self._stat_signature()
+        return self._fingerprint
+
+    def _load(self):
+        """Parse the cascade, lowest priority file first"""
+        entries, locked = {}, set()
+        for path in self.paths:
+            try:
+                text = path.read_text(encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+            entries, locked, file_immutable = parse_kconfig(text, entries, locked)
+            if file_immutable:
+                break
+        return entries
+
+    def entries(self):
+        """Get the merged {(group, ...): {key: value}} of the cascade"""
+        signature = self.fingerprint()
+        if self._entries is None or signature != self._signature:
+            self._entries = self._load()
+            self._signature = signature
+        return self._entries
+
+    def read_entry(self, group, key, default=None):
+        """Read one entry, group being a name or a tuple of nested group names"""
+        if isinstance(group, str):
+            group = (group,)
+        return self.entries().get(group, {}).get(key, default)
+
+    def close(self):
+        """Release the inotify watch"""
+        if self._watch:
+            self._watch.close()
+            self._watch = None
@@ -19,18 +19,28 @@ Author: Renato Nagy
 """
 
 import argparse
-import time
+import json
 import logging
+import os
+import time
+from datetime import date as date_type
+from datetime import datetime, timezone
 
-try:
-    import requests
-except ImportError:
-    requests = None
-    print("Warning: 'requests' package not found. Auto-location detection disabled.")
-
-from .config import Config
+from .config import Config, load_user_settings
+from .control import COMMANDS, format_transitions, socket_path
 from .location_manager import LocationManager
-from .theme_manager import ThemeManager
+from .metrics import metrics
+from .phases import PHASES
+from .state_journal import StateJournal
+from .theme_manager import APPLY_MODES, ThemeManager
+
+
+def setup_logging(verbose=False, json_format=None, rotate=False):
+    """Log to the log file and the console, see app.logging_setup"""
+    # logging.handlers pulls in socket and pickle; keep it off the import path
+    from .logging_setup import setup_logging as setup_queued_logging
+
+    setup_queued_logging(verbose, json_format, rotate=rotate)
 
 
 class KDEThemeChanger:
@@ -41,69 +51,546 @@ class KDEThemeChanger:
         city=None,
         light_theme=None,
         dark_theme=None,
+        metrics_file=None,
+        stats_file=None,
+        phase_themes=None,
+        timetable_entry=None,
+        clock=time.time,
+        theme_manager_factory=ThemeManager,
+        apply_mode=None,
+        light_sensor=False,
+        journal=None,
+        configure_logging=True,
     ):
-        self.setup_logging()
-        self.location_manager = LocationManager(latitude, longitude, city)
-        self.theme_manager = ThemeManager(light_theme, dark_theme)
+        if configure_logging:
+            self.setup_logging()
+        self.logger = logging.getLogger(__name__)
+        self.options = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "city": city,
+            "light_theme": light_theme,
+            "dark_theme": dark_theme,
+            "phase_themes": phase_themes,
+            "apply_mode": apply_mode,
+        }
+        # This host's schedule from a fleet timetable, see app.timetable
+        self.timetable_entry = timetable_entry
+        # Wall clock and theme manager class, replaced by simulations, which
+        # also bring their own journal and leave logging to their caller
+        self.clock = clock
+        self.theme_manager_factory = theme_manager_factory
+        self.location_manager, self.theme_manager = self._build_managers()
+        # What was applied last, lets checks skip reading the theme
+        self.journal = journal if journal is not None else StateJournal()
+        # Theme forced over the control socket: (theme, until timestamp or None)
+        self.forced = None
+        self.metrics_file = metrics_file
+        self.stats_file = stats_file
+        if metrics_file or stats_file:
+            metrics.time_lookups = True
+        # Ambient light sensor deciding between light and dark, or None
+        self.light_sensor = None
+        if light_sensor:
+            from .light_sensor import open_light_sensor
+
+            self.light_sensor = open_light_sensor()
+        # CycleProfiler wrapping each check in --profile mode, see app.profiling
+        self.profiler = None
+
+    def _build_managers(self):
+        """Create the managers from the options and the user's settings file
+
+        Command line options take precedence over the settings file.
+        """
+        settings = load_user_settings()
+        if self.options["latitude"] is not None or self.options["city"] is not None:
+            # A location given on the command line replaces the file's entirely
+            for key in ("latitude", "longitude", "city"):
+                settings.pop(key, None)
+        settings.update(
+            (key, value) for key, value in self.options.items() if value is not None
+        )
+
+        entry = self.timetable_entry
+        if entry is not None:
+            # The timetable fixes the location, nothing needs computing
+            location_manager = LocationManager(
+                entry.latitude, entry.longitude, clock=self.clock
+            )
+            if not location_manager.sun_table.use_buffer(entry.table):
+                self.logger.warning("Timetable entry for %s is invalid", entry.name)
+        else:
+            location_manager = LocationManager(
+                settings.get("latitude"),
+                settings.get("longitude"),
+                settings.get("city"),
+                clock=self.clock,
+            )
+        theme_manager = self.theme_manager_factory(
+            settings.get("light_theme"),
+            settings.get("dark_theme"),
+            phase_themes=settings.get("phase_themes"),
+            apply_mode=settings.get("apply_mode"),
+        )
+        return location_manager, theme_manager
+
+    def reload(self):
+        """Re-read the settings file and rebuild the managers"""
+        self.logger.info("Reloading configuration")
+        old_theme_manager = self.theme_manager
+        self.location_manager, self.theme_manager = self._build_managers()
+        old_theme_manager.close()
+        old_theme_manager.apply_pipeline.shutdown(wait=False)
 
     def setup_logging(self):
         """Setup logging configuration"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format=Config.LOG_FORMAT,
-            handlers=[logging.FileHandler(Config.LOG_FILE), logging.StreamHandler()],
-        )
+        setup_logging()
         self.logger = logging.getLogger(__name__)
 
     def update_theme(self):
-        """Update theme based on current daylight status"""
-        is_day = self.location_manager.is_daylight()
-        target_theme = self.theme_manager.get_target_theme(is_day)
-        current_theme = self.theme_manager.get_current_theme()
+        """Update theme based on current daylight status, returns False on failure"""
+        metrics.inc("checks_total")
+        with metrics.timer("update_seconds"):
+            if self.profiler is not None:
+                return self.profiler.run("cycle", self._update_theme)
+            return self._update_theme()
 
-        sunrise, sunset = self.location_manager.get_sun_times()
-        theme_status = "light (day)" if is_day else "dark (night)"
+    def _update_theme(self):
+        """Check and switch the theme, see update_theme"""
+        timestamp = self.clock()
+        now = datetime.fromtimestamp(timestamp, timezone.utc)
+        phase = self.location_manager.get_phase(now)
+        target_theme = self._target_theme(phase, timestamp)
+        phase_name = phase.replace("_", " ")
+
+        # Unchanged kdeglobals since our last apply: no need to read the theme
+        fingerprint = self.theme_manager.fingerprint()
+        if self.journal.holds(target_theme, fingerprint):
+            metrics.inc("state_journal_total", result="hit")
+            self._log_theme_correct(phase_name, now)
+            self._record_applied(target_theme, timestamp, phase, now, fingerprint)
+            return True
+
+        metrics.inc("state_journal_total", result="miss")
+        current_theme = self.theme_manager.get_current_theme()
+        journal_theme = self.journal.theme
+        if journal_theme is not None and current_theme not in (None, journal_theme):
+            # Only a write to kdeglobals can have changed it since we applied
+            metrics.inc("manual_changes_total")
+            self.logger.info(
+                "Theme was changed by hand from %s to %s", journal_theme, current_theme
+            )
 
         if current_theme != target_theme:
-            theme_type = "light" if is_day else "dark"
-            self.logger.info(f"Switching to {theme_type} theme")
+            self.logger.info("Switching to %s (%s)", target_theme, phase_name)
 
             if self.theme_manager.set_theme(target_theme):
-                self.logger.info(
-                    f"Theme changed successfully. Next change at: "
-                    f"{'sunset' if is_day else 'sunrise'} "
-                    f"({sunset.strftime('%H:%M') if is_day else sunrise.strftime('%H:%M')})"
-                )
+                metrics.inc("switches_total")
+                metrics.set("last_switch_timestamp_seconds", self.clock())
+                self._record_applied(target_theme, self.clock(), phase, now)
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info(
+                        "Theme changed successfully. Next change at: %s",
+                        self._describe_next_change(now),
+                    )
             else:
+                metrics.inc("switch_failures_total")
                 self.logger.error("Failed to change theme")
+                self.journal.clear()
+                return False
         else:
+            self._record_applied(target_theme, timestamp, phase, now, fingerprint)
+            self._log_theme_correct(phase_name, now)
+
+        return True
+
+    def _record_applied(self, theme, applied_at, phase, now, fingerprint=None):
+        """Journal that theme is shown for the phase at now"""
+        if fingerprint is None:
+            fingerprint = self.theme_manager.fingerprint()
+        self.journal.record_applied(
+            theme,
+            applied_at,
+            phase,
+            self.location_manager.get_phase_start(now),
+            fingerprint,
+        )
+
+    def _log_theme_correct(self, phase_name, now):
+        """Log that no switch is needed"""
+        if self.logger.isEnabledFor(logging.INFO):
+            # Looking up the next change only pays off if it is logged
             self.logger.info(
-                f"Theme check: {theme_status}, current theme is correct. "
-                f"Next change at: {'sunset' if is_day else 'sunrise'} "
-                f"({sunset.strftime('%H:%M') if is_day else sunrise.strftime('%H:%M')})"
+                "Theme check: %s, current theme is correct. Next change at: %s",
+                phase_name,
+                self._describe_next_change(now),
             )
 
+    def _describe_next_change(self, now):
+        """Describe when the target theme changes next, for the log"""
+        change = self.location_manager.next_phase_change(
+            self.theme_manager.get_phase_theme, now
+        )
+        if change is None:
+            return "not within the next days"
+        when, phase = change
+        local = self.location_manager.local_time(when.timestamp())
+        return f"{phase.replace('_', ' ')} ({local.strftime('%H:%M %Z')})"
+
+    def _target_theme(self, phase, timestamp):
+        """Get the theme to show in phase, a forced theme until it expires"""
+        if self.forced is not None:
+            theme, until = self.forced
+            if until is None or timestamp < until:
+                return theme
+            self.forced = None
+            self.logger.info("Forced theme %s expired", theme)
+        bright = self._ambient_daylight()
+        if bright is not None:
+            return self.theme_manager.get_target_theme(bright)
+        return self.theme_manager.get_phase_theme(phase)
+
+    def _ambient_daylight(self):
+        """Whether the light sensor finds it bright, None to follow the sun"""
+        sensor = self.light_sensor
+        if sensor is None:
+            return None
+        if sensor.lux is None:
+            # Daemons sample periodically, single checks once here
+            sensor.sample()
+        return sensor.bright
+
+    def force_theme(self, theme):
+        """Show theme instead of the scheduled one until that next changes
+
+        theme is 'light', 'dark' or a theme package name. Returns when the
+        forced theme expires, as a timestamp, or None if it lasts until
+        clear_forced_theme().
+        """
+        theme = {
+            "light": self.theme_manager.light_theme,
+            "dark": self.theme_manager.dark_theme,
+        }.get(theme, theme)
+        now = datetime.fromtimestamp(self.clock(), timezone.utc)
+        change = self.location_manager.next_phase_change(
+            self.theme_manager.get_phase_theme, now
+        )
+        until = change[0].timestamp() if change is not None else None
+        self.forced = (theme, until)
+        self.logger.info("Forcing theme %s", theme)
+        return until
+
+    def clear_forced_theme(self):
+        """Go back to the scheduled theme"""
+        self.forced = None
+
+    def transitions(self, count):
+        """Get the next count sun phase transitions as dicts with their themes"""
+        return [
+            {
+                "timestamp": when.timestamp(),
+                "phase": phase,
+                "theme": self.theme_manager.get_phase_theme(phase),
+            }
+            for when, phase in self.location_manager.next_transitions(count)
+        ]
+
+    def print_next_transitions(self, count):
+        """Print the upcoming sun phase transitions and their themes"""
+        for line in format_transitions(self.transitions(count)):
+            print(line)
+
+    def status(self):
+        """Describe the location, phase and themes as a dict"""
+        timestamp = self.clock()
+        now = datetime.fromtimestamp(timestamp, timezone.utc)
+        phase = self.location_manager.get_phase(now)
+        target_theme = self._target_theme(phase, timestamp)
+        if self.journal.holds(target_theme, self.theme_manager.fingerprint()):
+            current_theme = target_theme
+        else:
+            current_theme = self.theme_manager.get_current_theme()
+
+        change = self.location_manager.next_phase_change(
+            self.theme_manager.get_phase_theme, now
+        )
+        location = self.location_manager.location
+        status = {
+            "location": {
+                "name": location.name,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "timezone": location.timezone,
+            },
+            "phase": phase,
+            "scheduled_theme": self.theme_manager.get_phase_theme(phase),
+            "current_theme": current_theme,
+            "forced": None,
+            "next_change": None,
+        }
+        if self.light_sensor is not None:
+            status["ambient_light"] = {
+                "lux": self.light_sensor.lux,
+                "bright": self.light_sensor.bright,
+            }
+        if self.forced is not None:
+            status["forced"] = {"theme": self.forced[0], "until": self.forced[1]}
+        if change is not None:
+            status["next_change"] = {
+                "timestamp": change[0].timestamp(),
+                "phase": change[1],
+                "theme": self.theme_manager.get_phase_theme(change[1]),
+            }
+        return status
+
+    def export_metrics(self):
+        """Write the metrics files, if configured"""
+        try:
+            if self.metrics_file:
+                metrics.write_textfile(self.metrics_file)
+            if self.stats_file:
+                metrics.write_json(self.stats_file)
+        except OSError as e:
+            self.logger.warning("Could not write metrics: %s", e)
+
     def run_once(self):
         """Run the theme update once"""
         self.logger.info("Running KDE theme changer")
-        self.theme_manager._send_startup_notification(mode="manual")
+        self.theme_manager.apply_pipeline.submit(
+            self.theme_manager._send_startup_notification, mode="manual"
+        )
         self.update_theme()
+        self.export_metrics()
+
+    def run_daemon(self, check_interval=Config.SAFETY_CHECK_INTERVAL):
+        """Run as a daemon, sleeping until the next sunrise/sunset
+
+        Runs until SIGTERM or Ctrl+C; SIGHUP reloads the settings file.
+        """
+        # asyncio is only needed in daemon mode
+        import asyncio
+
+        from .async_daemon import AsyncDaemon
 
-    def run_daemon(self, check_interval=Config.DEFAULT_CHECK_INTERVAL):
-        """Run as a daemon, checking periodically"""
         self.logger.info(
-            f"Starting KDE theme changer daemon (check interval: {check_interval}s)"
+            "Starting KDE theme changer daemon (safety check interval: %ss)",
+            check_interval,
+        )
+        self.theme_manager.apply_pipeline.submit(
+            self.theme_manager._send_startup_notification, mode="daemon"
         )
-        self.theme_manager._send_startup_notification(mode="daemon")
 
         try:
-            while True:
-                self.update_theme()
-                time.sleep(check_interval)
+            daemon = AsyncDaemon(
+                self, check_interval, self.clock, control_socket=socket_path()
+            )
+            asyncio.run(daemon.run())
         except KeyboardInterrupt:
             self.logger.info("Daemon stopped by user")
         except Exception as e:
-            self.logger.error(f"Daemon error: {e}")
+            self.logger.error("Daemon error: %s", e)
+
+
+def run_ctl(parser, args):
+    """Send a command to the running daemon, the ctl subcommand"""
+    from .control import ControlError, format_status, request
+
+    params = {}
+    if args.action == "force":
+        if not args.theme:
+            parser.error("force needs a theme: light, dark or a package name")
+        params["theme"] = args.theme
+    elif args.action == "next":
+        params["count"] = args.count
+    try:
+        result = request(args.action, **params)
+    except ControlError as e:
+        parser.exit(1, f"{parser.prog}: {e}\n")
+    except OSError as e:
+        parser.exit(1, f"{parser.prog}: no daemon is running ({e})\n")
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.action == "next":
+        print("\n".join(format_transitions(result)))
+    else:
+        print("\n".join(format_status(result)))
+
+
+def _ask_daemon(args):
+    """Answer a one-shot run through a running daemon, returns False if none is
+
+    Only runs that do not choose their own location, themes, apply mode, light
+    sensor or outputs are handed over, since the daemon would answer with its
+    own; --profile runs must be profiled here.
+    """
+    from .control import ControlError, request
+
+    own_options = (
+        args.latitude,
+        args.longitude,
+        args.city,
+        args.light_theme,
+        args.dark_theme,
+        args.phase_theme,
+        args.timetable,
+        args.apply_mode,
+        args.light_sensor,
+        args.metrics_file,
+        args.stats_file,
+        args.log_json,
+        args.profile,
+    )
+    if any(own_options):
+        return False
+    try:
+        if args.next_transitions:
+            result = request("next", count=args.next_transitions)
+        else:
+            result = request("check")
+    except (OSError, ControlError):
+        return False
+
+    if args.next_transitions:
+        print("\n".join(format_transitions(result)))
+    else:
+        print(f"Theme checked by the running daemon: {result['current_theme']}")
+    return True
+
+
+def run_timetable(parser, args):
+    """Generate fleet timetables, the timetable subcommand"""
+    from .timetable import generate_timetable, read_hosts
+
+    if not args.jsonl and not args.binary:
+        parser.error("give --jsonl and/or --binary")
+    if args.days < 1 or args.workers < 1:
+        parser.error("--days and --workers must be positive")
+    try:
+        hosts = read_hosts(args.hosts)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    try:
+        stats = generate_timetable(
+            hosts, args.start, args.days, args.jsonl, args.binary, args.workers
+        )
+    except ValueError as e:
+        parser.exit(1, f"{parser.prog}: {e}\n")
+    print(
+        f"{stats['hosts']} hosts x {stats['days']} days = "
+        f"{stats['location_days']} location-days in {stats['seconds']:.2f}s "
+        f"({stats['location_days_per_second']:.0f} location-days/s, "
+        f"{stats['workers']} workers)"
+    )
+
+
+def run_gazetteer(parser, args):
+    """Search or build the offline city database, the gazetteer subcommand"""
+    from .gazetteer import (
+        Gazetteer,
+        astral_cities,
+        build_gazetteer,
+        read_geonames,
+    )
+
+    if args.build:
+        try:
+            cities = read_geonames(args.geonames) if args.geonames else astral_cities()
+            count = build_gazetteer(cities, args.build)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"{count} cities written to {args.build}")
+        return
+    if not args.name and args.nearest is None and not args.timezone_grid:
+        parser.error("give a city name, --nearest, --build or --timezone-grid")
+
+    try:
+        gazetteer = Gazetteer(args.file)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read gazetteer: {e}")
+    if args.timezone_grid:
+        from .tz_grid import build_timezone_grid, read_boundaries
+
+        if not args.boundaries:
+            parser.error("--timezone-grid needs --boundaries")
+        try:
+            runs = build_timezone_grid(
+                read_boundaries(args.boundaries),
+                args.timezone_grid,
+                cities=[
+                    (city.latitude, city.longitude, city.timezone) for city in gazetteer
+                ],
+            )
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"Time zone grid with {runs} runs written to {args.timezone_grid}")
+        gazetteer.close()
+        return
+    if args.nearest is not None:
+        found = gazetteer.nearest(*args.nearest)
+        matches = [found[0]] if found else []
+    else:
+        matches = gazetteer.complete(args.name, args.limit)
+    if not matches:
+        print("No matching city")
+    for location in matches:
+        print(
+            f"{location.name}, {location.region}  "
+            f"({location.latitude:.4f}, {location.longitude:.4f})  "
+            f"{location.timezone}"
+        )
+    gazetteer.close()
+
+
+def run_simulation(parser, args, phase_themes):
+    """Replay the daemon over a date range, the simulate subcommand"""
+    from .simulation import VirtualClock, make_changer, simulate
+
+    def midnight(day):
+        return datetime.combine(day, datetime.min.time()).astimezone().timestamp()
+
+    moves = []
+    for item in args.move:
+        try:
+            day, _, coordinates = item.partition("=")
+            latitude, longitude = (float(value) for value in coordinates.split(","))
+            moves.append((midnight(date_type.fromisoformat(day)), latitude, longitude))
+        except ValueError:
+            parser.error(f"invalid --move '{item}', expected DATE=LAT,LON")
+    if args.days < 1:
+        parser.error("--days must be positive")
+
+    start = midnight(args.start)
+    clock = VirtualClock(start)
+    changer = make_changer(
+        clock,
+        current_theme=args.current_theme,
+        latitude=args.latitude,
+        longitude=args.longitude,
+        city=args.city,
+        light_theme=args.light_theme,
+        dark_theme=args.dark_theme,
+        phase_themes=phase_themes or None,
+    )
+    result = simulate(changer, clock, start + args.days * 86400, args.interval, moves)
+
+    if not args.quiet:
+        for entry in result.timeline():
+            when = datetime.fromtimestamp(entry["timestamp"]).astimezone()
+            print(
+                f"{when.strftime('%Y-%m-%d %H:%M:%S %z')}  {entry['phase']:<20} "
+                f"{entry['theme']}"
+            )
+    for key, value in result.stats.items():
+        print(f"{key}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"stats": result.stats, "timeline": result.timeline()}, f, indent=2
+            )
 
 
 def main():
@@ -114,39 +601,335 @@ def main():
     parser.add_argument("--longitude", type=float, help="Longitude for location")
     parser.add_argument("--city", help="City name for location")
     parser.add_argument("--daemon", action="store_true", help="Run as daemon")
+    parser.add_argument(
+        "--multi-user",
+        action="store_true",
+        help="Run one daemon for every Plasma session on this host (usually as root)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=Config.MULTI_USER_MAX_WORKERS,
+        help="Sessions switched concurrently in multi-user mode "
+        f"(default: {Config.MULTI_USER_MAX_WORKERS})",
+    )
     parser.add_argument(
         "--interval",
         type=int,
-        default=Config.DEFAULT_CHECK_INTERVAL,
-        help="Check interval in seconds for daemon mode "
-        f"(default: {Config.DEFAULT_CHECK_INTERVAL})",
+        default=Config.SAFETY_CHECK_INTERVAL,
+        help="Maximum seconds between safety re-checks in daemon mode; theme "
+        "switches are scheduled at sun phase transitions "
+        f"(default: {Config.SAFETY_CHECK_INTERVAL})",
     )
     parser.add_argument(
         "--light-theme",
-        default=Config.DEFAULT_LIGHT_THEME,
-        help="Light theme package name",
+        help=f"Light theme package name (default: {Config.DEFAULT_LIGHT_THEME})",
     )
     parser.add_argument(
         "--dark-theme",
-        default=Config.DEFAULT_DARK_THEME,
-        help="Dark theme package name",
+        help=f"Dark theme package name (default: {Config.DEFAULT_DARK_THEME})",
+    )
+    parser.add_argument(
+        "--phase-theme",
+        action="append",
+        default=[],
+        metavar="PHASE=THEME",
+        help="Theme for one sun phase, may be repeated; THEME may be 'light' or "
+        f"'dark'. Phases: {', '.join(PHASES)}",
+    )
+    parser.add_argument(
+        "--apply-mode",
+        choices=APPLY_MODES,
+        help="full: apply the whole theme with lookandfeeltool; partial: only "
+        "change the colors, styles and icons that differ from the current theme, "
+        f"falling back to a full apply (default: {Config.APPLY_MODE})",
+    )
+    parser.add_argument(
+        "--light-sensor",
+        action="store_true",
+        help="Switch to the light or dark theme when an ambient light sensor finds "
+        "it bright or dark, following the sun in between",
+    )
+    parser.add_argument(
+        "--next-transitions",
+        type=int,
+        metavar="N",
+        help="Print the next N sun phase transitions and exit",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Write Prometheus metrics to this file (textfile collector format)",
+    )
+    parser.add_argument("--stats-file", help="Write a JSON stats dump to this file")
+    parser.add_argument(
+        "--timetable",
+        help="Load this host's sun schedule from a binary fleet timetable "
+        "instead of detecting the location and computing it",
+    )
+    parser.add_argument(
+        "--host", help="Host name to look up in --timetable (default: this host)"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(Config.CACHE_DIR / "profile"),
+        metavar="DIR",
+        help="Profile startup and every theme check with cProfile and tracemalloc, "
+        "writing the reports to DIR (default: %(const)s)",
     )
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose logging")
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Write the log file as one JSON object per line",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    timetable_parser = subparsers.add_parser(
+        "timetable",
+        help="Generate sun phase timetables for many hosts",
+        description="Compute every sun phase transition for a list of hosts and "
+        "write them as JSONL and/or a binary timetable for --timetable",
+    )
+    timetable_parser.add_argument(
+        "hosts",
+        help="CSV (with a header row) or JSONL file with host, latitude and "
+        "longitude, or host and city",
+    )
+    timetable_parser.add_argument("--jsonl", help="Write the timetables as JSONL")
+    timetable_parser.add_argument(
+        "--binary", help="Write the binary timetable daemons load with --timetable"
+    )
+    timetable_parser.add_argument(
+        "--start",
+        type=date_type.fromisoformat,
+        default=date_type.today(),
+        help="First day, YYYY-MM-DD (default: today)",
+    )
+    timetable_parser.add_argument(
+        "--days",
+        type=int,
+        default=Config.SUN_TABLE_DAYS,
+        help=f"Number of days (default: {Config.SUN_TABLE_DAYS})",
+    )
+    timetable_parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes (default: number of CPUs)",
+    )
+
+    simulate_parser = subparsers.add_parser(
+        "simulate",
+        help="Replay the theme decisions over a date range on a virtual clock",
+        description="Run the daemon's checks against a virtual clock and a fake "
+        "desktop, then print the switch timeline and statistics. Location and "
+        "theme options go before the subcommand; --interval sets the safety "
+        "check interval.",
+    )
+    simulate_parser.add_argument(
+        "--start",
+        type=date_type.fromisoformat,
+        default=date_type.today(),
+        help="First day, YYYY-MM-DD, starting at local midnight (default: today)",
+    )
+    simulate_parser.add_argument(
+        "--days", type=int, default=365, help="Number of days (default: 365)"
+    )
+    simulate_parser.add_argument(
+        "--move",
+        action="append",
+        default=[],
+        metavar="DATE=LAT,LON",
+        help="Move to new coordinates at local midnight of DATE (repeatable)",
+    )
+    simulate_parser.add_argument(
+        "--current-theme", help="Theme shown when the simulation starts (default: none)"
+    )
+    simulate_parser.add_argument(
+        "--json", help="Write the timeline and statistics to this JSON file"
+    )
+    simulate_parser.add_argument(
+        "--quiet", "-q", action="store_true", help="Only print the statistics"
+    )
+
+    gazetteer_parser = subparsers.add_parser(
+        "gazetteer",
+        help="Search the offline city database used for --city",
+        description="List the cities whose name starts with NAME, find the city "
+        "nearest to a point, or build a gazetteer file",
+    )
+    gazetteer_parser.add_argument("name", nargs="?", help="City name or prefix")
+    gazetteer_parser.add_argument(
+        "--nearest",
+        type=float,
+        nargs=2,
+        metavar=("LAT", "LON"),
+        help="Show the city nearest to these coordinates",
+    )
+    gazetteer_parser.add_argument(
+        "--limit", type=int, default=10, help="Cities listed (default: 10)"
+    )
+    gazetteer_parser.add_argument(
+        "--file", help=f"Gazetteer to search (default: {Config.GAZETTEER_FILE})"
+    )
+    gazetteer_parser.add_argument(
+        "--build", metavar="PATH", help="Write a gazetteer file to PATH and exit"
+    )
+    gazetteer_parser.add_argument(
+        "--geonames",
+        help="Build from this GeoNames export (e.g. cities15000.txt) instead of "
+        "astral's city list",
+    )
+    gazetteer_parser.add_argument(
+        "--timezone-grid",
+        metavar="PATH",
+        help="Write a time zone grid from --boundaries to PATH and exit; cells "
+        "holding a gazetteer (--file) city take its zone",
+    )
+    gazetteer_parser.add_argument(
+        "--boundaries",
+        metavar="GEOJSON",
+        help="timezone-boundary-builder GeoJSON (or its release .zip) to build "
+        "--timezone-grid from",
+    )
+
+    ctl_parser = subparsers.add_parser(
+        "ctl",
+        help="Query or steer the running daemon",
+        description="Send a command to the daemon over its control socket "
+        f"($XDG_RUNTIME_DIR/{Config.CONTROL_SOCKET_NAME})",
+    )
+    ctl_parser.add_argument(
+        "action",
+        choices=COMMANDS,
+        help="status: show the current state; next: upcoming transitions; check: "
+        "re-check now; force THEME: show light, dark or a theme package until the "
+        "next scheduled change; pause/resume: stop/restart switching; reload: "
+        "re-read the settings file",
+    )
+    ctl_parser.add_argument("theme", nargs="?", help="Theme for force")
+    ctl_parser.add_argument(
+        "--count", type=int, default=5, help="Transitions shown by next (default: 5)"
+    )
+    ctl_parser.add_argument("--json", action="store_true", help="Print the raw JSON")
 
     args = parser.parse_args()
 
-    if args.verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+    if args.command == "timetable":
+        run_timetable(timetable_parser, args)
+        return
+    if args.command == "ctl":
+        run_ctl(ctl_parser, args)
+        return
+    if args.command == "gazetteer":
+        run_gazetteer(gazetteer_parser, args)
+        return
+    # A running daemon answers one-shot runs without starting up
+    if (
+        args.command is None
+        and not (args.daemon or args.multi_user)
+        and _ask_daemon(args)
+    ):
+        return
+
+    # Before anything logs, so --verbose is not overridden by the defaults;
+    # only a daemon rotates the log file the one-shot runs share
+    if args.command == "simulate":
+        # A replay logs to the console only, never into the daemon's log
+        logging.basicConfig(
+            level=logging.DEBUG if args.verbose else logging.INFO,
+            format=Config.LOG_FORMAT,
+        )
+    else:
+        setup_logging(
+            args.verbose, args.log_json or None, rotate=args.daemon or args.multi_user
+        )
+
+    phase_themes = {}
+    for item in args.phase_theme:
+        phase, _, theme = item.partition("=")
+        if phase not in PHASES or not theme:
+            parser.error(f"invalid --phase-theme '{item}', expected PHASE=THEME")
+        phase_themes[phase] = theme
+
+    timetable_entry = None
+    if args.timetable:
+        if args.multi_user:
+            parser.error("--timetable cannot be used with --multi-user")
+        import socket
+
+        from .timetable import Timetable
+
+        host = args.host or socket.gethostname()
+        try:
+            timetable_entry = Timetable(args.timetable).lookup(host)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read timetable: {e}")
+        if timetable_entry is None:
+            parser.error(f"host '{host}' is not in {args.timetable}")
+
+    if args.command == "simulate":
+        run_simulation(simulate_parser, args, phase_themes)
+        return
+
+    if args.multi_user:
+        from .multi_user import MultiUserDaemon
+
+        daemon = MultiUserDaemon(
+            args.latitude,
+            args.longitude,
+            args.city,
+            args.light_theme,
+            args.dark_theme,
+            phase_themes=phase_themes or None,
+            apply_mode=args.apply_mode,
+            max_workers=args.workers,
+            metrics_file=args.metrics_file,
+            stats_file=args.stats_file,
+        )
+        daemon.run_daemon(args.interval)
+        return
+
+    profiler = None
+    if args.profile:
+        from .profiling import CycleProfiler
+
+        profiler = CycleProfiler(args.profile)
 
     # Create theme changer instance
-    changer = KDEThemeChanger(
-        args.latitude, args.longitude, args.city, args.light_theme, args.dark_theme
-    )
+    def make_changer():
+        return KDEThemeChanger(
+            args.latitude,
+            args.longitude,
+            args.city,
+            args.light_theme,
+            args.dark_theme,
+            metrics_file=args.metrics_file,
+            stats_file=args.stats_file,
+            phase_themes=phase_themes or None,
+            timetable_entry=timetable_entry,
+            apply_mode=args.apply_mode,
+            light_sensor=args.light_sensor,
+        )
 
-    if args.daemon:
-        changer.run_daemon(args.interval)
+    if profiler is None:
+        changer = make_changer()
     else:
-        changer.run_once()
+        changer = profiler.run("startup", make_changer)
+        changer.profiler = profiler
+
+    try:
+        if args.next_transitions:
+            changer.print_next_transitions(args.next_transitions)
+        elif args.daemon:
+            changer.run_daemon(args.interval)
+        else:
+            changer.run_once()
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(f"Profile written to {profiler.report_dir}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Ambient light sensor module for KDE Theme Auto-Changer
+
+Lets an IIO ambient light sensor decide between the light and the dark theme,
+for overcast days and windowless rooms the sun schedule knows nothing about.
+The illuminance attributes of every sensor under /sys/bus/iio/devices are
+opened once and re-read with pread(), one pass over all of them per sample.
+Readings are smoothed with an exponential moving average and only count once
+they cross a threshold: above LIGHT_SENSOR_BRIGHT_LUX it is bright, below
+LIGHT_SENSOR_DARK_LUX it is dark, and in between the last decision stands, so
+a passing cloud or a switched lamp does not flip the theme back and forth.
+Until a threshold is crossed, or when the sensor fails, the sun decides.
+"""
+
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+from .config import Config
+from .metrics import metrics
+
+# in_illuminance_input is in lux, in_illuminance_raw needs _offset and _scale;
+# channels with a modifier such as in_illuminance_ir_raw only see part of it
+CHANNEL = re.compile(r"in_illuminance(\d*)_(input|raw)")
+
+
+def _read_number(path, default):
+    """Read a number from a sysfs attribute, default if it is missing"""
+    try:
+        return float(path.read_bytes())
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).debug("Cannot read %s: %s", path, e)
+        return default
+
+
+def _channel_attribute(device, index, attribute, default):
+    """Read a raw channel's _scale or _offset, else the device's shared one"""
+    for prefix in (f"in_illuminance{index}", "in_illuminance"):
+        path = device / f"{prefix}_{attribute}"
+        if path.exists():
+            return _read_number(path, default)
+    return default
+
+
+class IlluminanceChannel:
+    """An open illuminance attribute of one IIO device"""
+
+    def __init__(self, path, scale=1.0, offset=0.0):
+        self.path = path
+        self.scale = scale
+        self.offset = offset
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+
+    def read(self):
+        """Read the illuminance in lux, raises OSError or ValueError"""
+        # sysfs produces a fresh value for each read from offset 0
+        return (float(os.pread(self.fd, 32, 0)) + self.offset) * self.scale
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_channels(root):
+    """Open one illuminance channel of every IIO device under root"""
+    logger = logging.getLogger(__name__)
+    channels = []
+    try:
+        devices = sorted(root.iterdir())
+    except OSError as e:
+        logger.debug("No IIO devices at %s: %s", root, e)
+        return channels
+
+    for device in devices:
+        try:
+            names = [
+                entry.name
+                for entry in os.scandir(device)
+                if CHANNEL.fullmatch(entry.name)
+            ]
+        except OSError:
+            continue
+        # Processed values are preferred over raw ones
+        names.sort(key=lambda name: (not name.endswith("_input"), name))
+        if not names:
+            continue
+        index, kind = CHANNEL.fullmatch(names[0]).groups()
+        scale, offset = 1.0, 0.0
+        if kind == "raw":
+            scale = _channel_attribute(device, index, "scale", 1.0)
+            offset = _channel_attribute(device, index, "offset", 0.0)
+        try:
+            channels.append(IlluminanceChannel(device / names[0], scale, offset))
+        except OSError as e:
+            logger.warning("Cannot open light sensor %s: %s", device / names[0], e)
+    return channels
+
+
+class LightSensor:
+    """Smoothed ambient light level with hysteresis
+
+    The daemon samples from a worker thread while a check may take the first
+    sample; a lock keeps reads and closing the channels apart.
+    """
+
+    def __init__(self, root=None, alpha=None, dark_below=None, bright_above=None):
+        self.logger = logging.getLogger(__name__)
+        self.root = Path(root or Config.LIGHT_SENSOR_ROOT)
+        self.alpha = Config.LIGHT_SENSOR_ALPHA if alpha is None else alpha
+        self.dark_below = (
+            Config.LIGHT_SENSOR_DARK_LUX if dark_below is None else dark_below
+        )
+        self.bright_above = (
+            Config.LIGHT_SENSOR_BRIGHT_LUX if bright_above is None else bright_above
+        )
+        self._lock = threading.Lock()
+        self.channels = open_channels(self.root)
+        # Smoothed illuminance in lux, None before the first sample
+        self.lux = None
+        # True when bright, False when dark, None while the sun decides
+        self.bright = None
+
+    def sample(self):
+        """Read every channel once and update the level
+
+        Returns True if that changed whether it is bright, dark or up to the
+        sun.
+        """
+        with self._lock:
+            return self._sample()
+
+    def _sample(self):
+        """See sample(), called with the lock held"""
+        if not self.channels:
+            # Failed before: the device may be back, e.g. after a resume
+            self.channels = open_channels(self.root)
+            if not self.channels:
+                return False
+        try:
+            lux = sum(channel.read() for channel in self.channels)
+        except (OSError, ValueError) as e:
+            metrics.inc("light_sensor_errors_total")
+            self.logger.warning("Light sensor failed, following the sun: %s", e)
+            self._close()
+            changed = self.bright is not None
+            self.lux = self.bright = None
+            return changed
+
+        lux /= len(self.channels)
+        if self.lux is None:
+            self.lux = lux
+        else:
+            self.lux += self.alpha * (lux - self.lux)
+        metrics.set("ambient_light_lux", self.lux)
+
+        bright = self.bright
+        if self.lux >= self.bright_above:
+            bright = True
+        elif self.lux <= self.dark_below:
+            bright = False
+        if bright == self.bright:
+            return False
+        self.bright = bright
+        self.logger.info(
+            "Ambient light is %s (%.0f lux)", "bright" if bright else "dark", self.lux
+        )
+        return True
+
+    def close(self):
+        """Close the channels"""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        """See close(), called with the lock held"""
+        for channel in self.channels:
+            channel.close()
+        self.channels = []
+
+
+def open_light_sensor(root=None):
+    """Get a LightSensor, None if there is no ambient light sensor"""
+    sensor = LightSensor(root)
+    if not sensor.channels:
+        logging.getLogger(__name__).warning(
+            "No ambient light sensor found in %s, following the sun", sensor.root
+        )
+        return None
+    return sensor
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Location cache module for KDE Theme Auto-Changer
+
+Persists resolved geocoding and IP geolocation results on disk so startup does
+not have to wait for the network. Entries expire after a TTL, but stale entries
+are still returned so callers can refresh them in the background.
+"""
+
+import json
+import logging
+import numbers
+import threading
+import time
+
+from astral import LocationInfo
+
+from .config import Config
+from .fileutil import atomic_write
+
+FIELDS = (
+    ("name", str),
+    ("region", str),
+    ("timezone", str),
+    ("latitude", numbers.Real),
+    ("longitude", numbers.Real),
+    ("expires_at", numbers.Real),
+    ("last_used", numbers.Real),
+)
+
+
+def _is_entry(entry):
+    """Whether a cached value has every field, e.g. not from an older version"""
+    return isinstance(entry, dict) and all(
+        isinstance(entry.get(field), kind) and not isinstance(entry[field], bool)
+        for field, kind in FIELDS
+    )
+
+
+class LocationCache:
+    """On-disk LRU cache of resolved locations"""
+
+    def __init__(self, path=None, max_entries=None, clock=time.time):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or Config.CACHE_DIR / "locations.json"
+        self.max_entries = max_entries or Config.LOCATION_CACHE_MAX_ENTRIES
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        """Read the cache file, starting empty if it is missing or corrupt"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)["entries"]
+            if isinstance(entries, dict):
+                valid = {k: v for k, v in entries.items() if _is_entry(v)}
+                if len(valid) < len(entries):
+                    self.logger.warning(
+                        "Dropping %d malformed location cache entries",
+                        len(entries) - len(valid),
+                    )
+                return valid
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning("Ignoring unreadable location cache: %s", e)
+        return {}
+
+    def _save(self):
+        """Write the cache file atomically"""
+        data = json.dumps({"entries": self._entries}, indent=1).encode("utf-8")
+        try:
+            atomic_write(self.path, data)
+        except OSError as e:
+            self.logger.warning("Could not store location cache: %s", e)
+
+    def get(self, key):
+        """Get (location, is_stale) for key, or None if it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            try:
+                location = LocationInfo(
+                    entry["name"],
+                    entry["region"],
+                    entry["timezone"],
+                    entry["latitude"],
+                    entry["longitude"],
+                )
+            except (KeyError, TypeError, ValueError):
+                del self._entries[key]
+                return None
+
+            now = self.clock()
+            last_used, entry["last_used"] = entry["last_used"], now
+            # Keep the LRU order across runs without a write for every hit
+            if now - last_used >= Config.LOCATION_CACHE_TOUCH_INTERVAL:
+                self._save()
+            return location, now >= entry["expires_at"]
+
+    def put(self, key, location, ttl):
+        """Store a resolved location for ttl seconds, evicting the LRU entries"""
+        with self._lock:
+            now = self.clock()
+            self._entries[key] = {
+                "name": location.name,
+                "region": location.region,
+                "timezone": location.timezone,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "expires_at": now + ttl,
+                "last_used": now,
+            }
+
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k]["last_used"])
+                del self._entries[oldest]
+
+            self._save()
+
+    def most_recent(self, prefix):
+        """Get the most recently used key starting with prefix, or None"""
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            if not keys:
+                return None
+            return max(keys, key=lambda k: self._entries[k]["last_used"])
@@ -3,54 +3,122 @@
 Location management module for KDE Theme Auto-Changer
 
 Handles location detection, geocoding, and sunrise/sunset calculations.
+Every location carries the IANA time zone of its coordinates (see
+app.tz_grid), which decides the local date sun times are computed for.
 """
 
 import logging
+import threading
+import time
 from datetime import datetime, timezone
+from functools import cached_property
 
 try:
     from astral import LocationInfo
-    from astral.sun import sun
 except ImportError:
     raise ImportError(
         "'astral' package is required. Install it with: pip install astral"
     )
 
-try:
-    import requests
-except ImportError:
-    requests = None
-
 from .config import Config
+from .location_cache import LocationCache
+from .metrics import metrics
+from .phases import DAYLIGHT_PHASES, PHASES
+from .sun_table import SunTimeTable
 
 
 class LocationManager:
     """Manages location data and sun time calculations"""
 
-    def __init__(self, latitude=None, longitude=None, city=None):
+    def __init__(
+        self, latitude=None, longitude=None, city=None, clock=time.time, fallback=True
+    ):
+        """Resolve the location, falling back to IP detection and the default
+
+        With fallback=False a city that cannot be found raises ValueError.
+        """
         self.logger = logging.getLogger(__name__)
-        self.location = self._setup_location(latitude, longitude, city)
+        # Wall clock in epoch seconds; simulations pass a virtual one
+        self.clock = clock
+        self._refresh_thread = None
+        self._tzinfo = None
+        self._query = (latitude, longitude, city)
+        self.location = self._setup_location(latitude, longitude, city, fallback)
+        self.sun_table = self._sun_table(self.location)
+
+    @cached_property
+    def location_cache(self):
+        """On-disk cache of resolved locations, loaded on first use"""
+        return LocationCache()
+
+    @cached_property
+    def geo_client(self):
+        """Location web services client, None without the requests package
+
+        Imported on first network use, requests is slow to import.
+        """
+        try:
+            from .geo_providers import GeoClient
+        except ImportError:
+            return None
+        return GeoClient()
+
+    @staticmethod
+    def _sun_table(location):
+        """Create the sun table of a location"""
+        return SunTimeTable(
+            location.latitude, location.longitude, timezone_name=location.timezone
+        )
 
-    def _setup_location(self, latitude, longitude, city):
+    @staticmethod
+    def _located(name, region, latitude, longitude):
+        """Create a LocationInfo in the time zone of its coordinates"""
+        from .tz_grid import timezone_at
+
+        return LocationInfo(
+            name, region, timezone_at(latitude, longitude), latitude, longitude
+        )
+
+    @property
+    def tzinfo(self):
+        """The location's time zone as a tzinfo"""
+        name = self.location.timezone
+        if self._tzinfo is None or self._tzinfo[0] != name:
+            from .tz_grid import zone_info
+
+            self._tzinfo = (name, zone_info(name))
+        return self._tzinfo[1]
+
+    def local_time(self, timestamp):
+        """Get a Unix timestamp as an aware datetime in the location's time zone"""
+        return datetime.fromtimestamp(timestamp, self.tzinfo)
+
+    def _setup_location(self, latitude, longitude, city, fallback=True):
         """Setup location for sunrise/sunset calculations"""
-        if latitude and longitude:
-            location = LocationInfo("Custom", "Custom", "UTC", latitude, longitude)
-            self.logger.info(f"Using custom coordinates: {latitude}, {longitude}")
+        if latitude is not None and longitude is not None:
+            location = self._located("Custom", "Custom", latitude, longitude)
+            self.logger.info("Using custom coordinates: %s, %s", latitude, longitude)
             return location
 
         if city:
-            location = self._geocode_city(city)
+            location = self._gazetteer_city(city) or self._cached_location(
+                self._city_cache_key(city), lambda: self._geocode_city(city)
+            )
             if location:
                 return location
-            self.logger.warning(f"Could not find city '{city}', trying auto-detection")
+            if not fallback:
+                raise ValueError(f"city '{city}' not found")
+            self.logger.warning("Could not find city '%s', trying auto-detection", city)
 
-        # Try to auto-detect location
-        location = self._auto_detect_location()
+        # Try to auto-detect location, starting from the last known public IP
+        location = self._cached_location(
+            self.location_cache.most_recent("ip:"), self._auto_detect_location
+        )
         if location:
             return location
 
         # Default to configured location if everything else fails
-        self.logger.warning(f"Using default location ({Config.DEFAULT_CITY})")
+        self.logger.warning("Using default location (%s)", Config.DEFAULT_CITY)
         return LocationInfo(
             Config.DEFAULT_CITY,
             Config.DEFAULT_REGION,
@@ -59,97 +127,258 @@ class LocationManager:
             Config.DEFAULT_LONGITUDE,
         )
 
-    def _geocode_city(self, city_name):
-        """Geocode a city name to get coordinates"""
-        if not requests:
-            self.logger.error("'requests' package required for city lookup")
+    def _gazetteer_city(self, city_name):
+        """Look up a city in the offline gazetteer, None if it is not there"""
+        from .gazetteer import open_gazetteer
+
+        gazetteer = open_gazetteer()
+        if gazetteer is None:
             return None
+        location = gazetteer.lookup(city_name)
+        metrics.inc("gazetteer_lookups_total", result="hit" if location else "miss")
+        if location:
+            self.logger.info(
+                "Found city in gazetteer: %s, %s (%.4f, %.4f)",
+                location.name,
+                location.region,
+                location.latitude,
+                location.longitude,
+            )
+        return location
 
-        try:
-            params = {"q": city_name, "format": "json", "limit": 1}
-            headers = {"User-Agent": Config.USER_AGENT}
-
-            response = requests.get(
-                Config.GEOCODING_API,
-                params=params,
-                headers=headers,
-                timeout=Config.API_TIMEOUT,
+    @staticmethod
+    def _city_cache_key(city_name):
+        """Get the location cache key for a city query"""
+        return "city:" + " ".join(city_name.lower().split())
+
+    def _cached_location(self, key, resolve):
+        """Resolve a location from the cache, refreshing stale entries in the background"""
+        cached = self.location_cache.get(key) if key else None
+        if cached is None:
+            metrics.inc("location_cache_total", result="miss")
+            return resolve()
+
+        location, is_stale = cached
+        if location.timezone == "UTC":
+            # Cached before locations carried their time zone
+            location = self._located(
+                location.name, location.region, location.latitude, location.longitude
             )
-            data = response.json()
+        metrics.inc("location_cache_total", result="stale" if is_stale else "hit")
+        self.logger.info(
+            "Using cached location: %s, %s", location.name, location.region
+        )
+        if is_stale:
+            self._refresh_in_background(resolve)
+        return location
 
-            if data:
-                lat = float(data[0]["lat"])
-                lon = float(data[0]["lon"])
-                display_name = data[0]["display_name"]
+    def _refresh_in_background(self, resolve):
+        """Re-resolve a stale location without blocking startup"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
 
-                location = LocationInfo(city_name, display_name, "UTC", lat, lon)
-                self.logger.info(f"Found city: {display_name} ({lat:.4f}, {lon:.4f})")
-                return location
-            else:
-                self.logger.warning(
-                    f"City '{city_name}' not found in geocoding service"
-                )
-        except Exception as e:
-            self.logger.warning(f"Error geocoding city '{city_name}': {e}")
+        def refresh():
+            location = resolve()
+            if location:
+                self.move_to(location)
 
-        return None
+        self._refresh_thread = threading.Thread(
+            target=refresh, name="location-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def move_to(self, location):
+        """Switch to a refreshed location if it moved, returns True if it did"""
+        old = self.location
+        if (location.latitude, location.longitude) == (old.latitude, old.longitude):
+            return False
+
+        self.logger.info(
+            "Location refreshed: %s, %s (%.4f, %.4f)",
+            location.name,
+            location.region,
+            location.latitude,
+            location.longitude,
+        )
+        self.sun_table = self._sun_table(location)
+        self.location = location
+        return True
+
+    def set_location(self, latitude, longitude, name="Custom"):
+        """Move to new coordinates, returns True if they differ"""
+        location = self._located(name, name, latitude, longitude)
+        return self.move_to(location)
+
+    def detect_location(self):
+        """Detect the location again by IP, None if it is fixed or unknown
+
+        Only auto-detected locations are refreshed; fixed coordinates and
+        cities do not move. The result is not used until passed to move_to().
+        """
+        latitude, longitude, city = self._query
+        if (latitude is not None and longitude is not None) or city:
+            return None
+        return self._auto_detect_location()
+
+    def refresh_location(self):
+        """Detect the location again by IP, returns True if it moved"""
+        location = self.detect_location()
+        return bool(location) and self.move_to(location)
+
+    def _geocode_city(self, city_name):
+        """Geocode a city name to get coordinates"""
+        if not self.geo_client:
+            self.logger.error("'requests' package required for city lookup")
+            return None
+
+        answer = self.geo_client.geocode(city_name)
+        if answer is None:
+            self.logger.warning("City '%s' not found in geocoding service", city_name)
+            return None
+
+        lat, lon = answer["latitude"], answer["longitude"]
+        location = self._located(city_name, answer["region"], lat, lon)
+        self.logger.info("Found city: %s (%.4f, %.4f)", answer["region"], lat, lon)
+        self.location_cache.put(
+            self._city_cache_key(city_name), location, Config.LOCATION_CACHE_TTL
+        )
+        return location
 
     def _auto_detect_location(self):
         """Auto-detect location using IP geolocation"""
-        if not requests:
+        if not self.geo_client:
+            self.logger.warning(
+                "'requests' package not found. Auto-location detection disabled."
+            )
             return None
 
-        try:
-            response = requests.get(
-                Config.IP_GEOLOCATION_API, timeout=Config.API_TIMEOUT
-            )
-            data = response.json()
-            if data["status"] == "success":
-                lat = data["lat"]
-                lon = data["lon"]
-                city = data["city"]
-                country = data["country"]
-
-                location = LocationInfo(city, country, "UTC", lat, lon)
-                self.logger.info(
-                    f"Auto-detected location: {city}, {country} ({lat}, {lon})"
-                )
-                return location
-        except Exception as e:
-            self.logger.warning(f"Could not auto-detect location: {e}")
+        answer = self.geo_client.locate_ip()
+        if answer is None:
+            self.logger.warning("Could not auto-detect location")
+            return None
 
-        return None
+        city, country = answer["name"], answer["region"]
+        lat, lon = answer["latitude"], answer["longitude"]
+        location = self._located(city, country, lat, lon)
+        self.logger.info(
+            "Auto-detected location: %s, %s (%s, %s)", city, country, lat, lon
+        )
+        self.location_cache.put(
+            f"ip:{answer.get('ip') or 'unknown'}",
+            location,
+            Config.LOCATION_CACHE_IP_TTL,
+        )
+        return location
 
     def get_sun_times(self, date=None):
-        """Get sunrise and sunset times for the given date"""
+        """Get sunrise and sunset times for the given local date (default: today)
+
+        Today is the current date at the location, not on the system clock.
+        """
         if date is None:
-            date = datetime.now().date()
+            date = self.local_time(self.clock()).date()
+        if not metrics.time_lookups:
+            return self._sun_times(date)[0]
+
+        start = time.perf_counter()
+        sun_times, source = self._sun_times(date)
+        metrics.observe("sun_times_seconds", time.perf_counter() - start, source=source)
+        return sun_times
+
+    def _sun_times(self, date):
+        """Get ((sunrise, sunset), source) for a local date, see get_sun_times"""
+        try:
+            return self.sun_table.get(date), "table"
+        except ValueError as e:
+            # The table records days without sunrise/sunset, e.g. polar day
+            self.logger.debug("No sun times in table: %s", e)
+        except Exception as e:
+            self.logger.warning("Sun time table unavailable: %s", e)
 
         try:
-            s = sun(self.location.observer, date=date)
-            sunrise = s["sunrise"]
-            sunset = s["sunset"]
-            return sunrise, sunset
+            from astral.sun import sun
+
+            s = sun(self.location.observer, date=date, tzinfo=self.tzinfo)
+            return (s["sunrise"], s["sunset"]), "astral"
         except Exception as e:
-            self.logger.error(f"Error calculating sun times: {e}")
+            self.logger.error("Error calculating sun times: %s", e)
             # Default fallback times (6 AM - 6 PM)
             from datetime import time as dt_time
 
-            sunrise = datetime.combine(date, dt_time(hour=6)).replace(
-                tzinfo=timezone.utc
-            )
-            sunset = datetime.combine(date, dt_time(hour=18)).replace(
-                tzinfo=timezone.utc
-            )
-            return sunrise, sunset
+            sunrise = datetime.combine(date, dt_time(hour=6), self.tzinfo)
+            sunset = datetime.combine(date, dt_time(hour=18), self.tzinfo)
+            return (sunrise, sunset), "fallback"
+
+    def get_sun_times_batch(self, dates, latitudes=None, longitudes=None):
+        """Get sunrise and sunset arrays for many dates and/or locations at once
+
+        Coordinates default to the managed location. See app.solar_batch for
+        the array semantics and accuracy.
+        """
+        from .solar_batch import sun_times_batch
 
-    def is_daylight(self):
-        """Check if it's currently daylight"""
-        sunrise, sunset = self.get_sun_times()
-        now = datetime.now(sunrise.tzinfo)
+        if latitudes is None:
+            latitudes = self.location.latitude
+        if longitudes is None:
+            longitudes = self.location.longitude
+
+        return sun_times_batch(dates, latitudes, longitudes)
+
+    def get_phase(self, now=None):
+        """Get the sun phase (see app.phases) at now, a UTC datetime"""
+        if now is None:
+            now = self._now()
+        return PHASES[self.sun_table.phase_at(now.timestamp())]
+
+    def get_phase_start(self, now=None):
+        """Get the UTC timestamp the sun phase at now began, or None if unknown"""
+        if now is None:
+            now = self._now()
+        return self.sun_table.phase_start(now.timestamp())
+
+    def next_transitions(self, n=1, now=None):
+        """Get the next n phase transitions after now as [(time, phase)]
+
+        Looked up in the precomputed table, near the poles fewer than n may
+        be returned.
+        """
+        if now is None:
+            now = self._now()
+        return [
+            (datetime.fromtimestamp(timestamp, timezone.utc), PHASES[phase])
+            for timestamp, phase in self.sun_table.transitions_after(now.timestamp(), n)
+        ]
+
+    def next_phase_change(self, key, now=None):
+        """Get the first transition after now that changes key(phase)
+
+        Returns (time, phase), or None if there is none within the lookahead.
+        """
+        if now is None:
+            now = self._now()
+        timestamp = now.timestamp()
+        current = key(PHASES[self.sun_table.phase_at(timestamp)])
+        for when, phase in self.sun_table.iter_transitions(
+            timestamp, Config.PHASE_LOOKAHEAD
+        ):
+            if key(PHASES[phase]) != current:
+                return datetime.fromtimestamp(when, timezone.utc), PHASES[phase]
+        return None
+
+    def get_next_transition(self, now=None):
+        """Get the next sunrise/sunset after now as (time, is_daylight_after)"""
+        change = self.next_phase_change(lambda phase: phase in DAYLIGHT_PHASES, now)
+        if change is None:
+            return None
+        when, phase = change
+        return when, phase in DAYLIGHT_PHASES
 
-        self.logger.debug(f"Current time: {now}")
-        self.logger.debug(f"Sunrise: {sunrise}")
-        self.logger.debug(f"Sunset: {sunset}")
+    def _now(self):
+        """Get the current time from the clock as a UTC datetime"""
+        return datetime.fromtimestamp(self.clock(), timezone.utc)
 
-        return sunrise <= now <= sunset
+    def is_daylight(self, now=None):
+        """Check if it's daylight at now, a UTC datetime (default: current time)"""
+        phase = self.get_phase(now)
+        self.logger.debug("Current sun phase: %s", phase)
+        return phase in DAYLIGHT_PHASES
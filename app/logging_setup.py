@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Logging setup module for KDE Theme Auto-Changer
+
+Keeps the daemon from ever waiting on disk for its log: records go through a
+bounded in-memory queue to a background thread that writes the log file and
+the console. The daemon rotates the log file by size and age and gzips the
+rotated files; one-shot runs share the file but only append to it, reopening
+it when the daemon has rotated it. It can be written as one JSON object per
+line for log shippers.
+"""
+
+import atexit
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from datetime import datetime
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    WatchedFileHandler,
+)
+
+from .config import Config
+from .metrics import metrics
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created)
+            .astimezone()
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        # Records from the queue carry the traceback already formatted
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Log file rotated by size and age, keeping gzipped old files
+
+    Rotated files are named <log>.1.gz (newest) to <log>.<backup_count>.gz.
+    The age counts from when the file was started, which survives restarts:
+    see file_started.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, max_age=None):
+        super().__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count, delay=True
+        )
+        self.max_age = max_age
+        self.rollover_at = self.file_started() + max_age if max_age else None
+
+    def file_started(self):
+        """Get when the current log file was started
+
+        Its modification time changes with every record, but a rotation
+        starts a new file, so the newest rotated file was written when the
+        current one started. A log file that was never rotated is of unknown
+        age and counts as old.
+        """
+        try:
+            return os.stat(self.rotation_filename(self.baseFilename + ".1")).st_mtime
+        except OSError:
+            pass
+        try:
+            return 0.0 if os.path.getsize(self.baseFilename) else time.time()
+        except OSError:
+            return time.time()
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.max_age:
+            self.rollover_at = time.time() + self.max_age
+
+    def rotation_filename(self, default_name):
+        return default_name + ".gz"
+
+    def rotate(self, source, dest):
+        if not os.path.exists(source):
+            return
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of waiting when the queue is full"""
+
+    def prepare(self, record):
+        """Merge the message arguments but keep the traceback apart
+
+        QueueHandler.prepare() appends the traceback to the message and drops
+        exc_info, which left the JSON log without its exception field.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # Tracebacks hold frames, which must not wait in the queue
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+
+def setup_logging(verbose=False, json_format=None, log_file=None, rotate=False):
+    """Log to the log file and the console from a background thread
+
+    Only the daemon sets rotate: a one-shot run rotating the file would
+    remove it under the daemon, which then wrote to the removed file. If
+    logging is already set up, e.g. by an earlier call or by an embedding
+    application, only the level is raised for verbose. Returns the started
+    QueueListener, or None.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    if verbose:
+        root.setLevel(logging.DEBUG)
+    if root.handlers:
+        return None
+    if not verbose:
+        root.setLevel(logging.INFO)
+
+    if json_format is None:
+        json_format = Config.LOG_JSON
+    text_formatter = logging.Formatter(Config.LOG_FORMAT)
+
+    # The file is opened on the first record, in the writer thread
+    if rotate:
+        file_handler = CompressingRotatingFileHandler(
+            log_file or Config.LOG_FILE,
+            Config.LOG_MAX_BYTES,
+            Config.LOG_BACKUP_COUNT,
+            Config.LOG_MAX_AGE,
+        )
+    else:
+        file_handler = WatchedFileHandler(log_file or Config.LOG_FILE, delay=True)
+    file_handler.setFormatter(JsonFormatter() if json_format else text_formatter)
+    console = logging.StreamHandler()
+    console.setFormatter(text_formatter)
+    handlers = [file_handler, console]
+
+    log_queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Write out the queued records and stop the writer thread"""
+    global _listener
+
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    for handler in logging.getLogger().handlers[:]:
+        if isinstance(handler, DroppingQueueHandler):
+            logging.getLogger().removeHandler(handler)
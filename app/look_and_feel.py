@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Look-and-feel package module for KDE Theme Auto-Changer
+
+Plans partial applies. `lookandfeeltool --apply` rewrites every setting a
+look-and-feel package carries and reloads Plasma components, which takes
+seconds. Two packages such as Breeze and Breeze Dark usually differ in a few
+settings only, so their `contents/defaults` files are compared and just the
+differing settings are applied, each with the tool Plasma provides for it
+(plasma-apply-colorscheme and friends) or a kwriteconfig5 write announced to
+running applications. Packages that differ in anything else need the full
+apply.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+from .kde_config import parse_kconfig
+
+PACKAGE_DIR = Path("plasma") / "look-and-feel"
+
+# Settings applied with a Plasma tool taking the new value as its argument
+APPLY_TOOLS = {
+    ("kdeglobals", "General", "ColorScheme"): "plasma-apply-colorscheme",
+    ("plasmarc", "Theme", "name"): "plasma-apply-desktoptheme",
+    ("kcminputrc", "Mouse", "cursorTheme"): "plasma-apply-cursortheme",
+}
+# Settings written with kwriteconfig5, with the KGlobalSettings change type
+# that makes running applications pick them up
+WRITTEN_SETTINGS = {
+    ("kdeglobals", "KDE", "widgetStyle"): 2,  # StyleChanged
+    ("kdeglobals", "Icons", "Theme"): 4,  # IconChanged
+}
+
+
+def package_dirs(home=None, env=None):
+    """Get the directories look-and-feel packages are installed in, by priority
+
+    home and env describe another user's session; default: our own.
+    """
+    env = os.environ if env is None else env
+    data_home = env.get("XDG_DATA_HOME") or Path(home or Path.home()) / ".local/share"
+    data_dirs = env.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    return [Path(data_home) / PACKAGE_DIR] + [
+        Path(directory) / PACKAGE_DIR for directory in data_dirs.split(":") if directory
+    ]
+
+
+def read_defaults(package, directories):
+    """Read a package's settings as {(file, group, key): value}
+
+    Returns None if the package is not installed or has no defaults.
+    """
+    for directory in directories:
+        path = directory / package / "contents" / "defaults"
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        except (OSError, UnicodeDecodeError) as e:
+            logging.getLogger(__name__).debug("Cannot read %s: %s", path, e)
+            return None
+        entries, _, _ = parse_kconfig(text)
+        return {
+            group + (key,): value
+            for group, values in entries.items()
+            for key, value in values.items()
+        }
+    return None
+
+
+def settings_delta(current, target):
+    """Get the settings to change from one package's defaults to another's
+
+    Returns {(file, group, key): value} of the settings that differ, or None
+    when only a full apply can switch between them: a setting without a
+    targeted way to apply it differs or one package lacks a setting.
+    """
+    if current is None or target is None:
+        return None
+    delta = {}
+    for setting in current.keys() | target.keys():
+        if current.get(setting) == target.get(setting):
+            continue
+        if setting not in target or not (
+            setting in APPLY_TOOLS or setting in WRITTEN_SETTINGS
+        ):
+            return None
+        delta[setting] = target[setting]
+    return delta
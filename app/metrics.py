@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Metrics module for KDE Theme Auto-Changer
+
+Collects counters, gauges and latency histograms from the hot paths and
+exports them as a Prometheus textfile-collector file and a JSON stats dump.
+"""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from .fileutil import atomic_write
+
+PREFIX = "kde_theme_changer_"
+
+# Upper bounds in seconds, from in-process lookups up to slow subprocesses/HTTP
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+HELP = {
+    "checks_total": "Theme checks performed",
+    "switches_total": "Theme switches applied",
+    "switch_failures_total": "Theme switches that failed",
+    "last_switch_timestamp_seconds": "Unix time of the last successful switch",
+    "update_seconds": "Duration of a complete theme check",
+    "sun_times_seconds": "Duration of a sunrise/sunset lookup",
+    "current_theme_seconds": "Duration of reading the current theme",
+    "apply_seconds": "Duration of applying a theme, by apply mode",
+    "apply_fallbacks_total": "Partial applies replaced by a full apply, by reason",
+    "apply_step_seconds": "Duration of one apply command",
+    "apply_step_failures_total": "Apply commands that failed",
+    "http_request_seconds": "Duration of location API requests",
+    "http_failures_total": "Location API requests that failed",
+    "location_cache_total": "Location cache lookups by result",
+    "gazetteer_lookups_total": "City lookups in the offline gazetteer by result",
+    "location_provider_wins_total": "Location lookups answered first, by provider",
+    "sessions": "Desktop sessions managed by the multi-user daemon",
+    "session_errors_total": "Sessions the multi-user daemon could not set up",
+    "locations": "Distinct locations scheduled by the multi-user daemon",
+    "state_journal_total": "Theme checks answered by the state journal, by result",
+    "manual_changes_total": "Theme changes made by hand that were detected",
+    "clock_changes_total": "Wall clock changes and resumes that woke the daemon",
+    "ambient_light_lux": "Smoothed ambient light sensor level",
+    "light_sensor_errors_total": "Ambient light sensor reads that failed",
+    "control_requests_total": "Control socket requests by command",
+    "log_records_dropped_total": "Log records dropped because the log writer fell behind",
+}
+
+
+class Histogram:
+    """Latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Per-bucket counts plus one for values above the last bound
+        self._counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def counts(self):
+        """Cumulative counts per bucket, as Prometheus expects"""
+        counts, total = [], 0
+        for count in self._counts[:-1]:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class _Timer:
+    """Context manager timing a block into a histogram, see MetricsRegistry.timer"""
+
+    __slots__ = ("registry", "name", "labels", "extra", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.extra = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.extra
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.registry.observe(self.name, elapsed, **self.labels, **self.extra)
+
+
+def _format_labels(labels, extra=None):
+    """Format a label tuple as {name="value",...}"""
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in items
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe in-process metrics store"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per-call lookups (sun times, the current theme) take microseconds and
+        # timing them costs as much again, so they are only timed when the
+        # metrics are exported
+        self.time_lookups = False
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        if not labels:
+            return name, ()
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name, **labels):
+        """Time the enclosed block into a histogram
+
+        The dict returned on entering can be used to add labels known only at
+        the end, such as the source a value came from.
+        """
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            families = {}
+            for kind, series in (
+                ("counter", self._counters),
+                ("gauge", self._gauges),
+                ("histogram", self._histograms),
+            ):
+                for (name, labels), value in series.items():
+                    families.setdefault((name, kind), []).append((labels, value))
+
+            for (name, kind), series in sorted(families.items()):
+                full_name = PREFIX + name
+                if name in HELP:
+                    lines.append(f"# HELP {full_name} {HELP[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in sorted(series, key=lambda item: item[0]):
+                    if kind != "histogram":
+                        lines.append(f"{full_name}{_format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        label_text = _format_labels(labels, ("le", repr(bound)))
+                        lines.append(f"{full_name}_bucket{label_text} {count}")
+                    label_text = _format_labels(labels, ("le", "+Inf"))
+                    lines.append(f"{full_name}_bucket{label_text} {value.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {value.sum}")
+                    lines.append(
+                        f"{full_name}_count{_format_labels(labels)} {value.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """Get a JSON-serializable snapshot of all metrics"""
+
+        def series_name(name, labels):
+            return name + _format_labels(labels)
+
+        with self._lock:
+            return {
+                "counters": {
+                    series_name(*key): value for key, value in self._counters.items()
+                },
+                "gauges": {
+                    series_name(*key): value for key, value in self._gauges.items()
+                },
+                "histograms": {
+                    series_name(*key): {
+                        "count": h.count,
+                        "sum": h.sum,
+                        "mean": h.sum / h.count if h.count else 0.0,
+                        "buckets": dict(zip(map(repr, h.buckets), h.counts)),
+                    }
+                    for key, h in self._histograms.items()
+                },
+            }
+
+    def write_textfile(self, path):
+        """Write the Prometheus textfile-collector file atomically"""
+        atomic_write(path, self.to_prometheus().encode("utf-8"))
+
+    def write_json(self, path):
+        """Write the JSON stats dump atomically"""
+        data = dict(self.to_dict(), generated_at=time.time())
+        atomic_write(path, (json.dumps(data, indent=2) + "\n").encode("utf-8"))
+
+
+# Process-wide registry used by all modules
+metrics = MetricsRegistry()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Multi-user daemon module for KDE Theme Auto-Changer
+
+Manages the themes of every logged-in Plasma session from a single process,
+for hosts running many desktops. Sessions are discovered from the per-user
+runtime directories logind creates, users at the same location share one
+sunrise/sunset schedule, and switches are dispatched to a bounded worker pool
+that runs the KDE tools as the session's user.
+"""
+
+import logging
+import os
+import pwd
+import time
+from datetime import datetime
+from functools import cached_property
+from pathlib import Path
+
+from .apply_pipeline import ApplyPipeline
+from .config import Config, load_user_settings
+from .location_manager import LocationManager
+from .metrics import metrics
+from .scheduler import TransitionScheduler
+from .theme_manager import ThemeManager
+
+
+class UserSession:
+    """A logged-in user with a desktop session"""
+
+    def __init__(self, uid, gid, name, home, runtime_dir):
+        self.uid = uid
+        self.gid = gid
+        self.name = name
+        self.home = Path(home)
+        self.runtime_dir = Path(runtime_dir)
+
+    def __repr__(self):
+        return f"UserSession({self.name!r}, uid={self.uid})"
+
+    @property
+    def config_home(self):
+        return self.home / ".config"
+
+    @property
+    def bus_address(self):
+        return f"unix:path={self.runtime_dir / 'bus'}"
+
+    @property
+    def user(self):
+        """(uid, gid) to run tools as, None if that is us already"""
+        if self.uid == os.geteuid():
+            return None
+        return self.uid, self.gid
+
+    @cached_property
+    def env(self):
+        """Environment for running KDE tools inside this session"""
+        env = {
+            "HOME": str(self.home),
+            "USER": self.name,
+            "LOGNAME": self.name,
+            "PATH": os.environ.get("PATH", os.defpath),
+            "XDG_CONFIG_HOME": str(self.config_home),
+            "XDG_RUNTIME_DIR": str(self.runtime_dir),
+            "DBUS_SESSION_BUS_ADDRESS": self.bus_address,
+        }
+        if os.environ.get("XDG_CONFIG_DIRS"):
+            env["XDG_CONFIG_DIRS"] = os.environ["XDG_CONFIG_DIRS"]
+        if (self.runtime_dir / "wayland-0").exists():
+            env["WAYLAND_DISPLAY"] = "wayland-0"
+        return env
+
+    def load_settings(self):
+        """Read the user's overrides of location and themes"""
+        return load_user_settings(self.config_home)
+
+
+def discover_sessions(runtime_root=None, lookup_user=pwd.getpwuid):
+    """Find users with a Plasma session
+
+    logind creates /run/user/<uid> for every logged-in user; a session bus
+    socket there and a kdeglobals in the user's config mark a Plasma desktop.
+    """
+    logger = logging.getLogger(__name__)
+    root = Path(runtime_root or Config.SESSION_RUNTIME_ROOT)
+    try:
+        entries = sorted(os.scandir(root), key=lambda entry: entry.name)
+    except OSError as e:
+        logger.warning("Could not list sessions in %s: %s", root, e)
+        return []
+
+    sessions = []
+    for entry in entries:
+        if not entry.name.isdigit() or not os.path.exists(f"{entry.path}/bus"):
+            continue
+        try:
+            pw = lookup_user(int(entry.name))
+        except KeyError:
+            continue
+
+        session = UserSession(pw.pw_uid, pw.pw_gid, pw.pw_name, pw.pw_dir, entry.path)
+        if (session.config_home / "kdeglobals").exists():
+            sessions.append(session)
+    return sessions
+
+
+class SessionState:
+    """A managed session with its theme and location managers"""
+
+    def __init__(self, session, theme_manager, location_manager):
+        self.session = session
+        self.theme_manager = theme_manager
+        self.location_manager = location_manager
+
+
+class MultiUserDaemon:
+    """Keeps the themes of all Plasma sessions on the host in sync with the sun"""
+
+    def __init__(
+        self,
+        latitude=None,
+        longitude=None,
+        city=None,
+        light_theme=None,
+        dark_theme=None,
+        phase_themes=None,
+        apply_mode=None,
+        runtime_root=None,
+        lookup_user=pwd.getpwuid,
+        max_workers=None,
+        metrics_file=None,
+        stats_file=None,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.defaults = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "city": city,
+            "light_theme": light_theme,
+            "dark_theme": dark_theme,
+            "phase_themes": phase_themes,
+            "apply_mode": apply_mode,
+        }
+        self.runtime_root = runtime_root
+        self.lookup_user = lookup_user
+        self.metrics_file = metrics_file
+        self.stats_file = stats_file
+        if metrics_file or stats_file:
+            metrics.time_lookups = True
+        self.clock = clock
+        self.sleep = sleep
+
+        max_workers = max_workers or Config.MULTI_USER_MAX_WORKERS
+        # Apply steps of all users share one pool; a second one waits on them
+        self.apply_pipeline = ApplyPipeline(max_workers)
+        self.dispatch = ApplyPipeline(max_workers)
+
+        self.sessions = {}  # runtime dir -> SessionState
+        self.schedulers = {}  # rounded (lat, lon) -> TransitionScheduler
+        self._location_queries = {}  # (lat, lon, city) -> LocationManager
+
+    def _location_for(self, settings):
+        """Get the shared location manager for a user's settings
+
+        Users without a location of their own get the daemon's location.
+        """
+        if (
+            settings.get("latitude") is not None
+            and settings.get("longitude") is not None
+        ):
+            query = (settings["latitude"], settings["longitude"], None)
+        elif settings.get("city"):
+            query = (None, None, settings["city"])
+        else:
+            query = (
+                self.defaults["latitude"],
+                self.defaults["longitude"],
+                self.defaults["city"],
+            )
+
+        manager = self._location_queries.get(query)
+        if manager is None:
+            manager = LocationManager(*query, clock=self.clock)
+            # Different queries can resolve to the same place; share its schedule
+            key = (
+                round(manager.location.latitude, Config.SUN_TABLE_PRECISION),
+                round(manager.location.longitude, Config.SUN_TABLE_PRECISION),
+            )
+            if key not in self.schedulers:
+                # Users map phases to themes differently; wake at every phase
+                self.schedulers[key] = TransitionScheduler(
+                    manager,
+                    clock=self.clock,
+                    sleep=self.sleep,
+                    phase_theme=lambda phase: phase,
+                )
+            manager = self.schedulers[key].location_manager
+            self._location_queries[query] = manager
+        return manager
+
+    def _manage(self, session):
+        """Create the managers of a new session from the user's settings"""
+        settings = session.load_settings()
+        location_manager = self._location_for(settings)
+        theme_manager = ThemeManager(
+            settings.get("light_theme") or self.defaults["light_theme"],
+            settings.get("dark_theme") or self.defaults["dark_theme"],
+            session=session,
+            apply_pipeline=self.apply_pipeline,
+            phase_themes=settings.get("phase_themes") or self.defaults["phase_themes"],
+            apply_mode=settings.get("apply_mode") or self.defaults["apply_mode"],
+        )
+        return SessionState(session, theme_manager, location_manager)
+
+    def refresh_sessions(self):
+        """Start managing new sessions and forget ended ones"""
+        discovered = {
+            str(session.runtime_dir): session
+            for session in discover_sessions(self.runtime_root, self.lookup_user)
+        }
+
+        for runtime_dir in list(self.sessions):
+            if runtime_dir not in discovered:
+                state = self.sessions.pop(runtime_dir)
+                state.theme_manager.close()
+                self.logger.info("Session ended: %s", state.session.name)
+
+        for runtime_dir, session in discovered.items():
+            if runtime_dir in self.sessions:
+                continue
+            try:
+                self.sessions[runtime_dir] = self._manage(session)
+            except Exception as e:
+                # One user's broken setup must not stop the others; retried
+                # at the next scan
+                metrics.inc("session_errors_total")
+                self.logger.error("Cannot manage session of %s: %s", session.name, e)
+                continue
+            self.logger.info("Managing session of %s", session.name)
+
+        # Drop schedules no session uses any more
+        in_use = {id(state.location_manager) for state in self.sessions.values()}
+        self.schedulers = {
+            key: scheduler
+            for key, scheduler in self.schedulers.items()
+            if id(scheduler.location_manager) in in_use
+        }
+        self._location_queries = {
+            query: manager
+            for query, manager in self._location_queries.items()
+            if id(manager) in in_use
+        }
+
+        metrics.set("sessions", len(self.sessions))
+        metrics.set("locations", len(self.schedulers))
+
+    def update_all(self):
+        """Check every session and switch those showing the wrong theme
+
+        Returns (sessions checked, switched, failed).
+        """
+        phases = {}
+        pending = []
+        for state in self.sessions.values():
+            manager = state.location_manager
+            if id(manager) not in phases:
+                phases[id(manager)] = manager.get_phase()
+
+            metrics.inc("checks_total")
+            target = state.theme_manager.get_phase_theme(phases[id(manager)])
+            if state.theme_manager.get_current_theme() != target:
+                pending.append((state, target))
+
+        futures = [
+            (state, target, self.dispatch.submit(state.theme_manager.set_theme, target))
+            for state, target in pending
+        ]
+
+        failed = 0
+        for state, target, future in futures:
+            try:
+                ok = future.result()
+            except Exception as e:
+                self.logger.error("%s: apply failed: %s", state.session.name, e)
+                ok = False
+
+            if ok:
+                metrics.inc("switches_total")
+                metrics.set("last_switch_timestamp_seconds", time.time())
+                self.logger.info("%s: switched to %s", state.session.name, target)
+            else:
+                metrics.inc("switch_failures_total")
+                self.logger.error(
+                    "%s: failed to switch to %s", state.session.name, target
+                )
+                failed += 1
+
+        return len(self.sessions), len(pending) - failed, failed
+
+    def next_wakeup(self, check_interval=Config.SAFETY_CHECK_INTERVAL):
+        """Get the next wakeup over all locations as (timestamp, reason)"""
+        wakeup = self.clock() + Config.SESSION_SCAN_INTERVAL, "session scan"
+        for scheduler in self.schedulers.values():
+            scheduler.safety_interval = check_interval
+            wakeup = min(wakeup, scheduler.next_wakeup())
+        return wakeup
+
+    def export_metrics(self):
+        """Write the metrics files, if configured"""
+        try:
+            if self.metrics_file:
+                metrics.write_textfile(self.metrics_file)
+            if self.stats_file:
+                metrics.write_json(self.stats_file)
+        except OSError as e:
+            self.logger.warning("Could not write metrics: %s", e)
+
+    def run_daemon(self, check_interval=Config.SAFETY_CHECK_INTERVAL):
+        """Run as a daemon for all sessions, sleeping until the next transition"""
+        self.logger.info(
+            "Starting multi-user daemon (safety check interval: %ss)", check_interval
+        )
+        try:
+            while True:
+                self.refresh_sessions()
+                checked, switched, failed = self.update_all()
+                self.export_metrics()
+                self.logger.info(
+                    "Checked %d sessions at %d locations, switched %d, failed %d",
+                    checked,
+                    len(self.schedulers),
+                    switched,
+                    failed,
+                )
+
+                wakeup, reason = self.next_wakeup(check_interval)
+                if failed:
+                    retry = self.clock() + Config.DEFAULT_CHECK_INTERVAL
+                    wakeup, reason = min((wakeup, reason), (retry, "retry"))
+
+                self.logger.info(
+                    "Next check at %s (%s)",
+                    datetime.fromtimestamp(wakeup).strftime("%H:%M:%S"),
+                    reason,
+                )
+                # Re-check the wall clock, sleep() follows a monotonic one
+                remaining = wakeup - self.clock()
+                while remaining > 0:
+                    self.sleep(remaining)
+                    remaining = wakeup - self.clock()
+        except KeyboardInterrupt:
+            self.logger.info("Daemon stopped by user")
+        except Exception as e:
+            self.logger.error("Daemon error: %s", e)
+        finally:
+            self.close()
+
+    def close(self):
+        """Release every session and stop the worker pools"""
+        for state in self.sessions.values():
+            state.theme_manager.close()
+        self.sessions.clear()
+        self.dispatch.shutdown()
+        self.apply_pipeline.shutdown()
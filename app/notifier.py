@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Notification module for KDE Theme Auto-Changer
+
+Sends desktop notifications through org.freedesktop.Notifications over one
+persistent session bus connection, so no process is forked per message.
+Repeated notifications of the same kind replace the previous one instead of
+stacking up.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+
+from .config import Config
+
+HAS_JEEPNEY = importlib.util.find_spec("jeepney") is not None
+
+
+class DBusNotifier:
+    """Persistent D-Bus client for org.freedesktop.Notifications"""
+
+    def __init__(self, bus_address=None):
+        self.logger = logging.getLogger(__name__)
+        self.bus_address = bus_address
+        self._connection = None
+        self._notification_ids = {}
+        # Notifications are sent from worker threads; one call at a time
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Whether a session bus can be used at all"""
+        return HAS_JEEPNEY and bool(
+            self.bus_address or os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+        )
+
+    def notify(self, title, message, kind=None):
+        """Show a notification, returns False if the bus could not be used
+
+        Notifications with the same kind replace each other.
+        """
+        if not self.available:
+            return False
+
+        with self._lock:
+            try:
+                from jeepney import DBusAddress, MessageType, new_method_call
+
+                connection = self._connect()
+                msg = new_method_call(
+                    DBusAddress(
+                        "/org/freedesktop/Notifications",
+                        bus_name="org.freedesktop.Notifications",
+                        interface="org.freedesktop.Notifications",
+                    ),
+                    "Notify",
+                    "susssasa{sv}i",
+                    (
+                        Config.NOTIFICATION_APP_NAME,
+                        self._notification_ids.get(kind, 0),
+                        Config.NOTIFICATION_ICON,
+                        title,
+                        message,
+                        [],
+                        {},
+                        -1,
+                    ),
+                )
+                reply = connection.send_and_get_reply(
+                    msg, timeout=Config.NOTIFICATION_TIMEOUT
+                )
+            except Exception as e:
+                self.logger.debug("D-Bus notification failed: %s", e)
+                self.close()
+                return False
+
+            if reply.header.message_type == MessageType.error:
+                self.logger.debug("D-Bus notification rejected: %s", reply.body)
+                return False
+
+            if kind is not None:
+                self._notification_ids[kind] = reply.body[0]
+            return True
+
+    def _connect(self):
+        """Open the session bus connection on first use"""
+        if self._connection is None:
+            # jeepney is only imported once a notification is actually sent
+            from jeepney.io.blocking import open_dbus_connection
+
+            self._connection = open_dbus_connection(bus=self.bus_address or "SESSION")
+        return self._connection
+
+    def close(self):
+        """Close the bus connection; the next notification reconnects"""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
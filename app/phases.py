@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Sun phase module for KDE Theme Auto-Changer
+
+Names the phases of the day by the sun's elevation: night, the astronomical,
+nautical and civil twilights around dawn and dusk, the golden hours after
+sunrise and before sunset, and day. Each phase can be mapped to its own theme.
+"""
+
+# Phases in the order they follow each other; indexes are stored in sun tables
+PHASES = (
+    "night",
+    "astronomical_dawn",
+    "nautical_dawn",
+    "civil_dawn",
+    "morning_golden_hour",
+    "day",
+    "evening_golden_hour",
+    "civil_dusk",
+    "nautical_dusk",
+    "astronomical_dusk",
+)
+
+# Phases between sunrise and sunset, shown with the light theme by default
+DAYLIGHT_PHASES = frozenset(("morning_golden_hour", "day", "evening_golden_hour"))
+
+# Sun elevation in degrees (None: sunrise/sunset) and direction at which each
+# phase begins
+PHASE_STARTS = {
+    "astronomical_dawn": (-18.0, "rising"),
+    "nautical_dawn": (-12.0, "rising"),
+    "civil_dawn": (-6.0, "rising"),
+    "morning_golden_hour": (None, "rising"),
+    "day": (6.0, "rising"),
+    "evening_golden_hour": (6.0, "setting"),
+    "civil_dusk": (None, "setting"),
+    "nautical_dusk": (-6.0, "setting"),
+    "astronomical_dusk": (-12.0, "setting"),
+    "night": (-18.0, "setting"),
+}
+
+# Elevation of the sun's upper edge at sunrise/sunset, including refraction
+HORIZON = -0.833
+
+
+def phase_for_elevation(elevation, rising):
+    """Get the phase for a sun elevation and whether the sun is rising"""
+    if elevation < -18.0:
+        return "night"
+    if elevation < -12.0:
+        return "astronomical_dawn" if rising else "astronomical_dusk"
+    if elevation < -6.0:
+        return "nautical_dawn" if rising else "nautical_dusk"
+    if elevation < HORIZON:
+        return "civil_dawn" if rising else "civil_dusk"
+    if elevation < 6.0:
+        return "morning_golden_hour" if rising else "evening_golden_hour"
+    return "day"
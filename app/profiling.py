@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Profiling module for KDE Theme Auto-Changer
+
+Backs the --profile mode, which shows what startup, one theme check and an
+idle daemon cost. Each profiled run is wrapped in cProfile and compared to a
+tracemalloc snapshot taken before it; the report directory receives
+
+- <label>-<n>.prof: the run's CPU profile, for pstats or snakeviz
+- <label>-<n>-alloc.txt: the source lines that allocated the most during it
+- rss.csv: resident memory, traced Python memory and CPU time over time, one
+  row per run and per idle sample of the daemon
+- summary.txt: where the time went, by category and by function
+
+cProfile sees the thread it runs in only, so work handed to worker threads
+(apply commands, location providers) shows up as the time spent waiting for
+it, which the categories below count where it is waited for.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+
+from .fileutil import atomic_write
+
+# Categories of the summary: the path fragments of the functions whose time,
+# including what they call, counts. Nested categories count in each of them,
+# e.g. an import inside an astral call.
+CATEGORIES = (
+    ("imports", ("<frozen importlib._bootstrap",)),
+    ("astral", ("/astral/",)),
+    ("subprocesses", ("/subprocess.py", "/app/apply_pipeline.py")),
+    (
+        "http",
+        ("/requests/", "/urllib3/", "/http/client.py", "/app/geo_providers.py"),
+    ),
+    ("logging", ("/logging/", "/app/logging_setup.py")),
+)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_kib():
+    """Get the resident memory of this process in KiB"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE // 1024
+    except (OSError, ValueError, IndexError):
+        # Without procfs only the peak is known
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def category_times(stats):
+    """Sum the cumulative time spent in each category of a pstats.Stats
+
+    Only calls entering a category from outside count, so recursion and calls
+    within the category are not counted twice.
+    """
+
+    def matches(func, fragments):
+        return any(fragment in func[0] for fragment in fragments)
+
+    times = {}
+    for name, fragments in CATEGORIES:
+        total = 0.0
+        for func, (_, _, _, cumulative, callers) in stats.stats.items():
+            if not matches(func, fragments):
+                continue
+            if not callers:
+                total += cumulative
+                continue
+            total += sum(
+                entry[3]
+                for caller, entry in callers.items()
+                if not matches(caller, fragments)
+            )
+        times[name] = total
+    return times
+
+
+class CycleProfiler:
+    """Profiles runs of a function into a report directory"""
+
+    def __init__(self, report_dir, top=None, frames=1):
+        self.logger = logging.getLogger(__name__)
+        self.report_dir = Path(report_dir)
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        self.top = top or 25
+        self.counts = {}
+        # Accumulated pstats.Stats per label
+        self.stats = {}
+        self.started = time.time()
+        self._cpu_mark = time.process_time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._rss_file = self.report_dir / "rss.csv"
+        with open(self._rss_file, "w", encoding="utf-8") as f:
+            f.write("seconds,label,rss_kib,traced_kib,cpu_seconds\n")
+        self.sample("start")
+
+    def sample(self, label):
+        """Add a row to rss.csv, with the CPU time used since the last row"""
+        cpu = time.process_time()
+        cpu_seconds, self._cpu_mark = cpu - self._cpu_mark, cpu
+        traced, _ = tracemalloc.get_traced_memory()
+        with open(self._rss_file, "a", encoding="utf-8") as f:
+            f.write(
+                f"{time.time() - self.started:.3f},{label},{rss_kib()},"
+                f"{traced // 1024},{cpu_seconds:.6f}\n"
+            )
+
+    def run(self, label, func, *args, **kwargs):
+        """Call func under the profiler and write the run's reports"""
+        count = self.counts[label] = self.counts.get(label, 0) + 1
+        name = f"{label}-{count:03d}"
+        self.sample(f"{label} start")
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            after = tracemalloc.take_snapshot()
+            self.sample(label)
+            profile.dump_stats(self.report_dir / f"{name}.prof")
+            self._write_allocations(name, before, after)
+            if label in self.stats:
+                self.stats[label].add(profile)
+            else:
+                self.stats[label] = pstats.Stats(profile)
+            self.write_summary()
+
+    def _write_allocations(self, name, before, after):
+        """Write the lines that allocated the most between two snapshots"""
+        ignored = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, pstats.__file__),
+        )
+        differences = after.filter_traces(ignored).compare_to(
+            before.filter_traces(ignored), "lineno"
+        )
+        retained = sum(difference.size_diff for difference in differences)
+        lines = [f"{name}: {retained / 1024:+.1f} KiB retained"]
+        lines += [str(difference) for difference in differences[: self.top]]
+        atomic_write(
+            self.report_dir / f"{name}-alloc.txt",
+            ("\n".join(lines) + "\n").encode("utf-8"),
+        )
+
+    def summary(self):
+        """Describe where the time went, as text"""
+        out = io.StringIO()
+        for label, stats in self.stats.items():
+            total = stats.total_tt
+            runs = self.counts[label]
+            out.write(
+                f"{label}: {runs} run(s), {total * 1000:.1f} ms profiled, "
+                f"{total * 1000 / runs:.1f} ms per run\n"
+            )
+            for category, seconds in category_times(stats).items():
+                share = seconds / total * 100 if total else 0.0
+                out.write(f"  {category:<13} {seconds * 1000:9.1f} ms  {share:5.1f}%\n")
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
+
+    def write_summary(self):
+        """Write summary.txt"""
+        atomic_write(self.report_dir / "summary.txt", self.summary().encode("utf-8"))
+
+    def stop(self):
+        """Write the final summary and stop tracing allocations"""
+        self.sample("stop")
+        self.write_summary()
+        tracemalloc.stop()
+        self.logger.info("Profile written to %s", self.report_dir)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Transition scheduling module for KDE Theme Auto-Changer
+
+Works out when the next sunrise/sunset, or the next sun phase that changes the
+theme, happens so the daemon can sleep until exactly that moment instead of
+polling at a fixed interval.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+
+from .config import Config
+
+
+class TransitionScheduler:
+    """Computes daemon wakeups from the sun schedule"""
+
+    def __init__(
+        self,
+        location_manager,
+        safety_interval=Config.SAFETY_CHECK_INTERVAL,
+        clock=time.time,
+        sleep=time.sleep,
+        phase_theme=None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.location_manager = location_manager
+        self.safety_interval = safety_interval
+        self.clock = clock
+        self.sleep = sleep
+        # Maps a sun phase to its theme; without it only sunrise/sunset count
+        self.phase_theme = phase_theme
+
+    def next_wakeup(self):
+        """Get the next wakeup as (timestamp, reason)"""
+        now_ts = self.clock()
+        safety_ts = now_ts + self.safety_interval
+
+        now = datetime.fromtimestamp(now_ts, timezone.utc)
+        if self.phase_theme is None:
+            transition = self.location_manager.get_next_transition(now)
+            if transition is not None:
+                transition_time, is_day_after = transition
+                reason = "sunrise" if is_day_after else "sunset"
+        else:
+            transition = self.location_manager.next_phase_change(self.phase_theme, now)
+            if transition is not None:
+                transition_time, reason = transition
+        if transition is None:
+            return safety_ts, "safety"
+
+        transition_ts = transition_time.timestamp() + Config.TRANSITION_GRACE
+        if transition_ts > safety_ts:
+            return safety_ts, "safety"
+
+        return transition_ts, reason
+
+    def wait(self, deadline):
+        """Sleep until the given wall-clock timestamp"""
+        # time.sleep() follows a monotonic clock, so re-check the wall clock
+        while True:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            self.sleep(remaining)
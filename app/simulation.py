@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Simulation module for KDE Theme Auto-Changer
+
+Replays the daemon's theme decisions over weeks or years in seconds. The real
+KDEThemeChanger.update_theme() and transition scheduler run against a virtual
+clock, and a recording ThemeManager stands in for the desktop. The result is
+the switch timeline plus statistics (switches, redundant applies, lateness
+against the ideal schedule) for checking DST changes, polar days and location
+changes without waiting in real time.
+"""
+
+import functools
+import logging
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .config import Config
+from .scheduler import TransitionScheduler
+from .state_journal import StateJournal
+from .theme_manager import ThemeManager
+
+
+class VirtualClock:
+    """Wall clock in epoch seconds that only moves when told to"""
+
+    def __init__(self, start):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def set(self, timestamp):
+        """Jump to timestamp; the clock never goes backwards"""
+        self.now = max(self.now, float(timestamp))
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+class RecordingThemeManager(ThemeManager):
+    """ThemeManager that records applies instead of touching the desktop"""
+
+    def __init__(
+        self,
+        light_theme=None,
+        dark_theme=None,
+        session=None,
+        apply_pipeline=None,
+        phase_themes=None,
+        apply_mode=None,
+        clock=time.time,
+        current_theme=None,
+    ):
+        super().__init__(
+            light_theme, dark_theme, session, apply_pipeline, phase_themes, apply_mode
+        )
+        self.clock = clock
+        self.current_theme = current_theme
+        self.applies = []  # (timestamp, theme, theme shown before)
+        self.reads = 0
+
+    def _open_desktop(self, session):
+        # No kdeglobals reader or notifier; nothing touches the desktop
+        return None, None
+
+    def get_current_theme(self):
+        self.reads += 1
+        return self.current_theme
+
+    def fingerprint(self):
+        # Nothing to fingerprint, so the state journal is never trusted
+        return None
+
+    def set_theme(self, theme_name):
+        self.applies.append((self.clock(), theme_name, self.current_theme))
+        self.current_theme = theme_name
+        return True
+
+    def close(self):
+        pass
+
+
+class MemoryJournal(StateJournal):
+    """StateJournal that starts empty and is only kept in memory
+
+    A replay must neither trust nor change the journal of the real daemon.
+    """
+
+    def __init__(self):
+        super().__init__(path=Path(os.devnull))
+
+    def _load(self):
+        return None
+
+    def _store(self, data):
+        pass
+
+    def _remove(self):
+        pass
+
+
+def _ideal_changes(location_manager, phase_theme, start, end):
+    """Get every (timestamp, theme, phase) at which the target theme changes
+
+    The first entry is the target at start.
+    """
+    now = datetime.fromtimestamp(start, timezone.utc)
+    phase = location_manager.get_phase(now)
+    changes = [(start, phase_theme(phase), phase)]
+    timestamp = start
+    while timestamp < end:
+        now = datetime.fromtimestamp(timestamp, timezone.utc)
+        transitions = location_manager.next_transitions(Config.PHASE_LOOKAHEAD, now)
+        if not transitions:
+            timestamp += 86400
+            continue
+        for when, phase in transitions:
+            if when.timestamp() >= end:
+                return changes
+            theme = phase_theme(phase)
+            if theme != changes[-1][1]:
+                changes.append((when.timestamp(), theme, phase))
+        timestamp = transitions[-1][0].timestamp()
+    return changes
+
+
+class SimulationResult:
+    """Switch timeline and statistics of a simulation run"""
+
+    def __init__(self, start, end, initial_theme, checks, applies, ideal, wall_seconds):
+        self.start = start
+        self.end = end
+        self.initial_theme = initial_theme
+        self.checks = checks
+        self.applies = applies  # (timestamp, theme, previous theme, phase)
+        self.ideal = ideal  # (timestamp, theme, phase), see _ideal_changes
+        self.wall_seconds = wall_seconds
+        self.lateness, self.missed = self._match()
+
+    def _match(self):
+        """Find how long after each ideal change the theme actually followed"""
+        times = [timestamp for timestamp, *_ in self.applies]
+        lateness, missed = [], []
+        for index, (due, theme, phase) in enumerate(self.ideal):
+            until = self.ideal[index + 1][0] if index + 1 < len(self.ideal) else None
+            position = bisect_right(times, due)
+            shown = self.applies[position - 1][1] if position else self.initial_theme
+            if shown == theme:
+                lateness.append(0.0)
+                continue
+            for timestamp, applied, _, _ in self.applies[position:]:
+                if until is not None and timestamp >= until:
+                    break
+                if applied == theme:
+                    lateness.append(timestamp - due)
+                    break
+            else:
+                missed.append((due, theme, phase))
+        return lateness, missed
+
+    @property
+    def stats(self):
+        """Summary statistics as a dict"""
+        switches = [apply for apply in self.applies if apply[1] != apply[2]]
+        return {
+            "days": round((self.end - self.start) / 86400, 1),
+            "checks": self.checks,
+            "applies": len(self.applies),
+            "switches": len(switches),
+            "redundant_applies": len(self.applies) - len(switches),
+            "ideal_changes": len(self.ideal),
+            "missed_changes": len(self.missed),
+            "max_lateness_seconds": round(max(self.lateness, default=0.0), 3),
+            "mean_lateness_seconds": round(
+                sum(self.lateness) / len(self.lateness) if self.lateness else 0.0, 3
+            ),
+            "wall_seconds": round(self.wall_seconds, 3),
+        }
+
+    def timeline(self):
+        """Get the applies as dicts in time order"""
+        return [
+            {
+                "time": datetime.fromtimestamp(timestamp).astimezone().isoformat(),
+                "timestamp": timestamp,
+                "phase": phase,
+                "theme": theme,
+                "previous": previous,
+            }
+            for timestamp, theme, previous, phase in self.applies
+        ]
+
+
+def simulate(
+    changer,
+    clock,
+    end,
+    check_interval=Config.SAFETY_CHECK_INTERVAL,
+    moves=(),
+):
+    """Run the daemon loop of a KDEThemeChanger from clock() until end
+
+    changer must have been created with clock and a RecordingThemeManager
+    (see make_changer). moves are (timestamp, latitude, longitude) location
+    changes, handled like a location refresh that found a new place. Log
+    output below WARNING is muted while running.
+    """
+    start = clock()
+    moves = sorted(moves)
+    theme_manager = changer.theme_manager
+    initial_theme = theme_manager.current_theme
+    location_manager = changer.location_manager
+    scheduler = TransitionScheduler(
+        location_manager,
+        check_interval,
+        clock,
+        sleep=clock.sleep,
+        phase_theme=theme_manager.get_phase_theme,
+    )
+
+    app_logger = logging.getLogger(__package__)
+    level = app_logger.level
+    app_logger.setLevel(logging.WARNING)
+    wall_start = time.perf_counter()
+    try:
+        segment_start = start
+        ideal = []
+        applies = []
+        checks = 0
+        while True:
+            segment_end = moves[0][0] if moves else end
+            changes = _ideal_changes(
+                location_manager,
+                theme_manager.get_phase_theme,
+                segment_start,
+                min(segment_end, end),
+            )
+            if ideal and changes[0][1] == ideal[-1][1]:
+                changes = changes[1:]
+            ideal.extend(changes)
+
+            while clock() < min(segment_end, end):
+                applied = len(theme_manager.applies)
+                ok = changer.update_theme()
+                checks += 1
+                for timestamp, theme, previous in theme_manager.applies[applied:]:
+                    now = datetime.fromtimestamp(timestamp, timezone.utc)
+                    phase = location_manager.get_phase(now)
+                    applies.append((timestamp, theme, previous, phase))
+
+                if ok:
+                    wakeup, _ = scheduler.next_wakeup()
+                else:
+                    wakeup = clock() + Config.DEFAULT_CHECK_INTERVAL
+                if wakeup >= segment_end:
+                    break
+                scheduler.wait(wakeup)
+
+            if not moves or segment_end >= end:
+                break
+            # Like a location refresh that moved: switch places and re-check
+            timestamp, latitude, longitude = moves.pop(0)
+            clock.set(timestamp)
+            location_manager.set_location(latitude, longitude)
+            segment_start = clock()
+    finally:
+        app_logger.setLevel(level)
+
+    return SimulationResult(
+        start,
+        end,
+        initial_theme,
+        checks,
+        applies,
+        ideal,
+        time.perf_counter() - wall_start,
+    )
+
+
+def make_changer(clock, current_theme=None, **options):
+    """Create a KDEThemeChanger on a virtual clock with a recording theme manager
+
+    options are passed on to KDEThemeChanger (location, themes, ...). The
+    changer gets a MemoryJournal and does not set up logging, so the replay
+    stays out of the real daemon's journal and log file.
+    """
+    from .kde_theme_changer import KDEThemeChanger
+
+    factory = functools.partial(
+        RecordingThemeManager, clock=clock, current_theme=current_theme
+    )
+    return KDEThemeChanger(
+        clock=clock,
+        theme_manager_factory=factory,
+        journal=MemoryJournal(),
+        configure_logging=False,
+        **options,
+    )
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Batch sun time module for KDE Theme Auto-Changer
+
+Vectorized NumPy port of the NOAA sunrise/sunset algorithm used by astral, for
+computing schedules over many dates and locations in one pass.
+
+Results agree with astral.sun.sunrise()/sunset() to within SUN_TIME_TOLERANCE
+seconds; days without a sunrise or sunset are returned as NaT where astral
+raises ValueError.
+"""
+
+from math import cos, radians
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from astral import refraction_at_zenith
+
+SUN_TIME_TOLERANCE = 1.0  # seconds
+
+# Using 32 arc minutes as sun's apparent diameter, as astral does
+SUN_APPARENT_RADIUS = 32.0 / (60.0 * 2.0)
+HORIZON_ZENITH = 90.0 + SUN_APPARENT_RADIUS
+COS_ZENITH = cos(radians(HORIZON_ZENITH + refraction_at_zenith(HORIZON_ZENITH)))
+
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+MINUTES_PER_DAY = 1440.0
+
+
+def _julian_century(julian_day):
+    """Convert Julian Day numbers to Julian Centuries"""
+    return (julian_day - 2451545.0) / 36525.0
+
+
+def _sun_position(jc):
+    """Calculate the sun's declination (degrees) and equation of time (minutes)"""
+    l0 = np.mod(280.46646 + jc * (36000.76983 + 0.0003032 * jc), 360.0)
+    m = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    e = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    mrad = np.radians(m)
+    c = (
+        np.sin(mrad) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2.0 * mrad) * (0.019993 - 0.000101 * jc)
+        + np.sin(3.0 * mrad) * 0.000289
+    )
+
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = l0 + c - 0.00569 - 0.00478 * np.sin(omega)
+
+    seconds = 21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))
+    obliquity = 23.0 + (26.0 + seconds / 60.0) / 60.0 + 0.00256 * np.cos(omega)
+
+    declination = np.degrees(
+        np.arcsin(np.sin(np.radians(obliquity)) * np.sin(np.radians(apparent_long)))
+    )
+
+    y = np.tan(np.radians(obliquity) / 2.0) ** 2
+    l0rad = np.radians(l0)
+    eq_time = (
+        y * np.sin(2.0 * l0rad)
+        - 2.0 * e * np.sin(mrad)
+        + 4.0 * e * y * np.sin(mrad) * np.cos(2.0 * l0rad)
+        - 0.5 * y * y * np.sin(4.0 * l0rad)
+        - 1.25 * e * e * np.sin(2.0 * mrad)
+    )
+
+    return declination, np.degrees(eq_time) * 4.0
+
+
+def _time_of_transit(days, latitude, longitude, direction, position=None):
+    """Minutes after UTC midnight of each day when the sun crosses the horizon
+
+    position is the sun's (declination, equation of time) at UTC midnight,
+    which does not depend on direction and can be shared between events.
+    """
+    latitude = np.radians(np.clip(latitude, -89.8, 89.8))
+    sin_lat = np.sin(latitude)
+    cos_lat = np.cos(latitude)
+    julian_day = days + UNIX_EPOCH_JULIAN_DAY
+
+    time_utc = 0.0
+    for iteration in range(2):
+        if iteration == 0 and position is not None:
+            declination, eq_time = position
+        else:
+            adjustment = time_utc / MINUTES_PER_DAY
+            declination, eq_time = _sun_position(
+                _julian_century(julian_day + adjustment)
+            )
+        dec_rad = np.radians(declination)
+
+        h = (COS_ZENITH - sin_lat * np.sin(dec_rad)) / (cos_lat * np.cos(dec_rad))
+        with np.errstate(invalid="ignore"):
+            hour_angle = direction * np.arccos(h)
+
+        offset = (-longitude - np.degrees(hour_angle)) * 4.0 - eq_time
+        offset = np.where(offset < -720.0, offset + MINUTES_PER_DAY, offset)
+        time_utc = 720.0 + offset
+
+    return time_utc
+
+
+def _event_times(days, latitude, longitude, direction, position):
+    """Event times as epoch milliseconds on each UTC day, NaN where there is none"""
+    minutes = _time_of_transit(days, latitude, longitude, direction, position)
+
+    # Like astral, an event that lands on a neighbouring UTC day is recomputed
+    # from that neighbouring day so that it falls on the requested date.
+    for shift in (-1, 1):
+        out_of_day = (minutes >= MINUTES_PER_DAY) if shift < 0 else (minutes < 0)
+        if np.any(out_of_day):
+            minutes[out_of_day] = (
+                _time_of_transit(
+                    days[out_of_day] + shift,
+                    latitude[out_of_day],
+                    longitude[out_of_day],
+                    direction,
+                )
+                + shift * MINUTES_PER_DAY
+            )
+
+    minutes[(minutes < 0) | (minutes >= MINUTES_PER_DAY)] = np.nan
+    return (days * MINUTES_PER_DAY + minutes) * 60000.0
+
+
+def _to_datetime64(epoch_ms):
+    """Convert epoch milliseconds to datetime64[ms], NaN becoming NaT"""
+    result = np.full(epoch_ms.shape, np.datetime64("NaT"), dtype="datetime64[ms]")
+    valid = ~np.isnan(epoch_ms)
+    result[valid] = np.rint(epoch_ms[valid]).astype("int64").astype("datetime64[ms]")
+    return result
+
+
+def sun_times_batch(dates, latitudes, longitudes):
+    """Get UTC sunrise and sunset arrays for arrays of dates and coordinates
+
+    Arguments are broadcast against each other, so one location can be paired
+    with many dates or one date with many locations. Returns a
+    (sunrise, sunset) tuple of datetime64[ms] arrays with NaT on days where the
+    sun does not rise or set.
+    """
+    if np is None:
+        raise ImportError(
+            "'numpy' package is required for batch sun times. "
+            "Install it with: pip install numpy"
+        )
+
+    days = np.asarray(dates, dtype="datetime64[D]").astype("int64").astype(float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    days, latitudes, longitudes = np.broadcast_arrays(days, latitudes, longitudes)
+
+    # Schedules repeat the same dates across many locations, so evaluate the
+    # midnight sun position once per distinct day
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    declination, eq_time = _sun_position(
+        _julian_century(unique_days + UNIX_EPOCH_JULIAN_DAY)
+    )
+    position = (
+        declination[inverse].reshape(days.shape),
+        eq_time[inverse].reshape(days.shape),
+    )
+    sunrise = _event_times(days, latitudes, longitudes, 1.0, position)
+    sunset = _event_times(days, latitudes, longitudes, -1.0, position)
+    return _to_datetime64(sunrise), _to_datetime64(sunset)
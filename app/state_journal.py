@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+State journal module for KDE Theme Auto-Changer
+
+Remembers what the changer last applied: the theme, when, the sun phase
+transition it served and a fingerprint (mtime, size, inode) of kdeglobals
+taken right after. While kdeglobals keeps that fingerprint nobody has touched
+the theme, so a check can tell the desired state already holds with a few
+stat() calls instead of reading the theme. The journal survives restarts and
+is written atomically, so a crash leaves either the old or the new record.
+"""
+
+import json
+import logging
+
+from .config import Config
+from .fileutil import atomic_write
+
+VERSION = 1
+
+
+class StateJournal:
+    """Last applied theme and the kdeglobals fingerprint it left behind"""
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path or Config.CACHE_DIR / Config.STATE_JOURNAL_FILE
+        self.record = self._load()
+
+    def _load(self):
+        """Read the journal, starting empty if it is missing or corrupt"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            if record.get("version") == VERSION and isinstance(record["theme"], str):
+                record["fingerprint"] = _as_fingerprint(record["fingerprint"])
+                return record
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning("Ignoring unreadable state journal: %s", e)
+        return None
+
+    @property
+    def theme(self):
+        """The last theme recorded, or None"""
+        return self.record["theme"] if self.record else None
+
+    def holds(self, theme, fingerprint):
+        """Whether theme is applied and kdeglobals is unchanged since
+
+        An unknown fingerprint (None) never matches.
+        """
+        return (
+            fingerprint is not None
+            and self.record is not None
+            and self.record["theme"] == theme
+            and self.record["fingerprint"] == fingerprint
+        )
+
+    def record_applied(self, theme, applied_at, phase, transition_at, fingerprint):
+        """Remember that theme is shown, serving the phase begun at transition_at
+
+        applied_at is kept from the existing record while the theme stays the
+        same, so it tells when the theme was really applied. Nothing is written
+        if the record would not change.
+        """
+        if fingerprint is None:
+            return
+        record = self.record
+        if record is not None and record["theme"] == theme:
+            if (
+                record["fingerprint"] == fingerprint
+                and record["phase"] == phase
+                and record["transition_at"] == transition_at
+            ):
+                return
+            applied_at = record["applied_at"]
+
+        self.record = {
+            "version": VERSION,
+            "theme": theme,
+            "applied_at": applied_at,
+            "phase": phase,
+            "transition_at": transition_at,
+            "fingerprint": fingerprint,
+        }
+        self._store(json.dumps(self.record, indent=1).encode("utf-8"))
+
+    def clear(self):
+        """Forget the record, e.g. after a failed apply left the state unknown"""
+        self.record = None
+        self._remove()
+
+    def _store(self, data):
+        """Write the journal file"""
+        try:
+            atomic_write(self.path, data)
+        except OSError as e:
+            self.logger.warning("Could not store state journal: %s", e)
+
+    def _remove(self):
+        """Remove the journal file"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning("Could not remove state journal: %s", e)
+
+
+def _as_fingerprint(value):
+    """Turn a fingerprint read back from JSON into the tuples stat gives"""
+    return tuple(tuple(entry) if entry is not None else None for entry in value)
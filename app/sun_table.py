@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Sun time table module for KDE Theme Auto-Changer
+
+Precomputes a year of sunrise/sunset times for a location into a compact
+binary file that is memory-mapped and indexed by the location's local date,
+so lookups never need to repeat the astral calculation. The file also holds every sun phase
+transition (twilights, golden hours) as one sorted array, so the current
+phase and the next transitions are binary searches.
+"""
+
+import logging
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from datetime import date as date_type
+from datetime import datetime, timedelta, timezone
+
+from .config import Config
+from .fileutil import atomic_write
+from .phases import PHASE_STARTS, PHASES, phase_for_elevation
+
+# magic, version, latitude and longitude (scaled by 10**precision), first day
+# (proleptic Gregorian ordinal), number of days, number of phase transitions,
+# phase at the start of the first day, CRC-32 of the time zone name the days
+# are local to; padded so the arrays stay 8-byte aligned
+HEADER = struct.Struct("<4sHiiIIIBxI")
+# sunrise, sunset as UTC epoch seconds, one per day
+RECORD = struct.Struct("<qq")
+# followed by the transition times (int64 UTC epoch seconds, ascending) and
+# the index into PHASES of the phase each transition starts (one byte each)
+TRANSITION_SIZE = 9
+
+MAGIC = b"KSUN"
+VERSION = 3
+NO_EVENT = -(2**63)  # the sun never rises or never sets on that day
+DAY = 86400
+EPOCH_ORDINAL = date_type(1970, 1, 1).toordinal()  # day ordinal of epoch 0
+
+
+def read_transitions(buffer):
+    """Unpack a table's phase transitions
+
+    Returns (first day ordinal, number of days, phase index at the start of the
+    first day, transition times array, phase index bytes).
+    """
+    _, _, _, _, start, count, transitions, initial_phase, _ = HEADER.unpack_from(buffer)
+
+    offset = HEADER.size + count * RECORD.size
+    times = array("q")
+    times.frombytes(buffer[offset : offset + transitions * 8])
+    if sys.byteorder != "little":
+        times.byteswap()
+    offset += transitions * 8
+    return (
+        start,
+        count,
+        initial_phase,
+        times,
+        bytes(buffer[offset : offset + transitions]),
+    )
+
+
+class SunTimeTable:
+    """Memory-mapped table of precomputed sunrise/sunset times"""
+
+    def __init__(
+        self, latitude, longitude, cache_dir=None, days=None, timezone_name="UTC"
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.scale = 10**Config.SUN_TABLE_PRECISION
+        self.lat_key = round(latitude * self.scale)
+        self.lon_key = round(longitude * self.scale)
+        self.days = days or Config.SUN_TABLE_DAYS
+        # Dates are local to this IANA time zone
+        self.timezone_name = timezone_name
+        self.tz_key = zlib.crc32(timezone_name.encode("utf-8"))
+        zone_slug = timezone_name.replace("/", "-")
+        self.path = (cache_dir or Config.CACHE_DIR) / (
+            f"sun_{self.lat_key}_{self.lon_key}_{zone_slug}.bin"
+        )
+        self._buffer = None
+        self._start = 0
+        self._count = 0
+        self._first_timestamp = 0
+        self._transition_times = array("q")
+        self._transition_phases = b""
+        self._initial_phase = 0
+
+    def get(self, date):
+        """Get (sunrise, sunset) for date, regenerating the table if needed"""
+        index = self._index(date)
+        if index is None:
+            self._load()
+            index = self._index(date)
+        if index is None:
+            # Start slightly in the past so neighbouring-day lookups stay in range
+            self.generate(date - timedelta(days=7))
+            index = self._index(date)
+
+        sunrise, sunset = RECORD.unpack_from(
+            self._buffer, HEADER.size + index * RECORD.size
+        )
+        if sunrise == NO_EVENT or sunset == NO_EVENT:
+            raise ValueError(f"No sunrise/sunset on {date}")
+
+        return (
+            datetime.fromtimestamp(sunrise, timezone.utc),
+            datetime.fromtimestamp(sunset, timezone.utc),
+        )
+
+    def _index(self, date):
+        """Get the record index for date, or None if it is not in the table"""
+        if self._buffer is None:
+            return None
+        index = date.toordinal() - self._start
+        return index if 0 <= index < self._count else None
+
+    def _load(self):
+        """Memory-map the table file if it exists and matches this location"""
+        try:
+            with open(self.path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        if self._validate(buffer):
+            self._set_buffer(buffer)
+        else:
+            buffer.close()
+
+    def _validate(self, buffer):
+        """Check the table header and size"""
+        if len(buffer) < HEADER.size:
+            return False
+        magic, version, lat_key, lon_key, _, count, transitions, _, tz_key = (
+            HEADER.unpack_from(buffer)
+        )
+        return (
+            magic == MAGIC
+            and version == VERSION
+            and (lat_key, lon_key, tz_key) == (self.lat_key, self.lon_key, self.tz_key)
+            and len(buffer)
+            == HEADER.size + count * RECORD.size + transitions * TRANSITION_SIZE
+        )
+
+    def use_buffer(self, buffer):
+        """Look up times in a table built elsewhere, e.g. a fleet timetable
+
+        Returns False if the buffer is not a table for this location. The
+        table is still regenerated locally once the buffer runs out.
+        """
+        if not self._validate(buffer):
+            return False
+        self._set_buffer(buffer)
+        return True
+
+    def _set_buffer(self, buffer):
+        """Switch lookups over to a new table buffer"""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        start, count, initial_phase, times, phases = read_transitions(buffer)
+
+        self._transition_times = times
+        self._transition_phases = phases
+        self._initial_phase = initial_phase
+        self._first_timestamp = (start - EPOCH_ORDINAL) * DAY
+        self._buffer = buffer
+        self._start = start
+        self._count = count
+
+    def _covers(self, timestamp, margin):
+        """Whether the table has transitions from timestamp to margin seconds on"""
+        return (
+            self._buffer is not None
+            and self._first_timestamp <= timestamp
+            and timestamp + margin < self._first_timestamp + self._count * DAY
+        )
+
+    def _ensure_covers(self, timestamp, margin=2 * DAY):
+        """Load or regenerate the table so it covers timestamp"""
+        if self._covers(timestamp, margin):
+            return
+        self._load()
+        if not self._covers(timestamp, margin):
+            day = datetime.fromtimestamp(timestamp, timezone.utc).date()
+            self.generate(day - timedelta(days=7))
+
+    def phase_at(self, timestamp):
+        """Get the index into PHASES of the sun phase at a UTC timestamp"""
+        self._ensure_covers(timestamp)
+        index = bisect_right(self._transition_times, timestamp) - 1
+        if index < 0:
+            return self._initial_phase
+        return self._transition_phases[index]
+
+    def phase_start(self, timestamp):
+        """Get when the sun phase at a UTC timestamp began, None if before the table"""
+        self._ensure_covers(timestamp)
+        index = bisect_right(self._transition_times, timestamp) - 1
+        if index < 0:
+            return None
+        return self._transition_times[index]
+
+    def transitions_after(self, timestamp, count):
+        """Get up to count (timestamp, phase index) transitions after timestamp
+
+        Fewer are returned near the poles, where the sun can stay in one phase
+        for months.
+        """
+        return list(self.iter_transitions(timestamp, count))
+
+    def iter_transitions(self, timestamp, count):
+        """Iterate over the transitions of transitions_after() one by one
+
+        For callers that usually stop after the first few.
+        """
+        margin = min(max(2, count // 4), self.days - 8) * DAY
+        self._ensure_covers(timestamp, margin)
+        times, phases = self._transition_times, self._transition_phases
+        index = bisect_right(times, timestamp)
+        for index in range(index, min(index + count, len(times))):
+            yield times[index], phases[index]
+
+    def generate(self, start_date):
+        """Compute the table starting at start_date and store it on disk"""
+        data = self.build(start_date)
+        self.logger.info(
+            "Generated sun time table for %d days from %s", self.days, start_date
+        )
+
+        try:
+            atomic_write(self.path, data)
+        except OSError as e:
+            self.logger.warning("Could not store sun time table: %s", e)
+            self._set_buffer(bytes(data))
+            return
+
+        self._load()
+        if self._buffer is None:
+            self._set_buffer(bytes(data))
+
+    def build(self, start_date):
+        """Compute the table starting at start_date, returns the file contents"""
+        from astral import Observer
+
+        observer = Observer(self.lat_key / self.scale, self.lon_key / self.scale)
+        events = self._sun_events(observer, start_date)
+
+        records = bytearray(self.days * RECORD.size)
+        for index in range(self.days):
+            times = (
+                events.get((index, "morning_golden_hour")),
+                events.get((index, "civil_dusk")),
+            )
+            if None in times:
+                times = (NO_EVENT, NO_EVENT)
+            RECORD.pack_into(records, index * RECORD.size, *times)
+
+        first = (start_date.toordinal() - EPOCH_ORDINAL) * DAY
+        initial_phase, transitions = self._phase_transitions(
+            observer, events, first, first + self.days * DAY
+        )
+
+        data = bytearray(HEADER.size)
+        HEADER.pack_into(
+            data,
+            0,
+            MAGIC,
+            VERSION,
+            self.lat_key,
+            self.lon_key,
+            start_date.toordinal(),
+            self.days,
+            len(transitions),
+            initial_phase,
+            self.tz_key,
+        )
+        times = array("q", (timestamp for timestamp, _ in transitions))
+        if sys.byteorder != "little":
+            times.byteswap()
+        data += records + times.tobytes() + bytes(phase for _, phase in transitions)
+        return data
+
+    def _sun_events(self, observer, start_date):
+        """Compute {(day index, phase): UTC timestamp} of every phase start
+
+        Days are local dates in the table's time zone. Covers the table days
+        and one day either side, as the transitions are kept by UTC time.
+        """
+        from astral.sun import SunDirection, sunrise, sunset, time_at_elevation
+
+        from .tz_grid import zone_info
+
+        tzinfo = zone_info(self.timezone_name)
+        directions = {"rising": SunDirection.RISING, "setting": SunDirection.SETTING}
+        events = {}
+        for index in range(-1, self.days + 1):
+            date = start_date + timedelta(days=index)
+            for phase, (sun_elevation, direction) in PHASE_STARTS.items():
+                try:
+                    if sun_elevation is None:
+                        event = sunrise if direction == "rising" else sunset
+                        when = event(observer, date=date, tzinfo=tzinfo)
+                    else:
+                        when = time_at_elevation(
+                            observer,
+                            sun_elevation,
+                            date,
+                            directions[direction],
+                            tzinfo,
+                        )
+                except ValueError:
+                    # The sun does not reach that elevation on this day
+                    continue
+                events[index, phase] = int(when.timestamp())
+        return events
+
+    def _phase_transitions(self, observer, events, first, end):
+        """Get the phase at first and the sorted transitions from first to end"""
+        from astral.sun import elevation
+
+        transitions = []
+        for timestamp, phase in sorted(
+            (timestamp, PHASES.index(phase))
+            for (_, phase), timestamp in events.items()
+            if first <= timestamp < end
+        ):
+            # Neighbouring dates can yield the same event twice
+            if transitions and transitions[-1][1] == phase:
+                continue
+            transitions.append((timestamp, phase))
+
+        start = datetime.fromtimestamp(first, timezone.utc)
+        start_elevation = elevation(observer, start)
+        rising = elevation(observer, start + timedelta(minutes=1)) > start_elevation
+        initial_phase = PHASES.index(phase_for_elevation(start_elevation, rising))
+        return initial_phase, transitions
@@ -2,25 +2,128 @@
 """
 Theme management module for KDE Theme Auto-Changer
 
-Handles KDE Plasma theme operations and system notifications.
+Handles KDE Plasma theme operations and system notifications. Themes are
+applied in full with lookandfeeltool, or in the partial apply mode by
+changing only the settings that differ from the current theme (see
+app.look_and_feel).
 """
 
 import logging
 import subprocess
+import time
 
+from .apply_pipeline import ApplyPipeline, ApplyStep
 from .config import Config
+from .kde_config import KConfigReader
+from .look_and_feel import (
+    APPLY_TOOLS,
+    WRITTEN_SETTINGS,
+    package_dirs,
+    read_defaults,
+    settings_delta,
+)
+from .metrics import metrics
+from .notifier import DBusNotifier
+from .phases import DAYLIGHT_PHASES, PHASES
+
+APPLY_MODES = ("full", "partial")
 
 
 class ThemeManager:
     """Manages KDE Plasma theme changes and notifications"""
 
-    def __init__(self, light_theme=None, dark_theme=None):
+    def __init__(
+        self,
+        light_theme=None,
+        dark_theme=None,
+        session=None,
+        apply_pipeline=None,
+        phase_themes=None,
+        apply_mode=None,
+    ):
         self.logger = logging.getLogger(__name__)
         self.light_theme = light_theme or Config.DEFAULT_LIGHT_THEME
         self.dark_theme = dark_theme or Config.DEFAULT_DARK_THEME
+        self.phase_themes = self._check_phase_themes(phase_themes or {})
+        self.apply_mode = self._check_apply_mode(apply_mode or Config.APPLY_MODE)
+        # Another user's session (see app.multi_user), None for our own
+        self.session = session
+        self.config_reader, self.notifier = self._open_desktop(session)
+        self.apply_pipeline = apply_pipeline or ApplyPipeline()
+        self.last_apply_result = None
+        self.last_apply_mode = None
+
+    def _open_desktop(self, session):
+        """Get the (kdeglobals reader, notifier) of the session"""
+        if session is None:
+            return KConfigReader("kdeglobals"), DBusNotifier()
+        return (
+            KConfigReader("kdeglobals", config_home=session.config_home),
+            DBusNotifier(session.bus_address),
+        )
+
+    def _check_apply_mode(self, apply_mode):
+        """Fall back to the full apply for unknown modes"""
+        if apply_mode in APPLY_MODES:
+            return apply_mode
+        self.logger.warning("Ignoring unknown apply mode %r", apply_mode)
+        return "full"
+
+    def _check_phase_themes(self, phase_themes):
+        """Drop mappings for unknown sun phases"""
+        checked = {}
+        for phase, theme in phase_themes.items():
+            if phase in PHASES and isinstance(theme, str) and theme:
+                checked[phase] = theme
+            else:
+                self.logger.warning("Ignoring theme %r for phase '%s'", theme, phase)
+        return checked
+
+    def _subprocess_kwargs(self):
+        """Get the subprocess.run() arguments to run a tool in the session"""
+        if self.session is None:
+            return {}
+        kwargs = {"env": self.session.env}
+        if self.session.user is not None:
+            kwargs["user"], kwargs["group"] = self.session.user
+        return kwargs
+
+    def close(self):
+        """Release the kdeglobals watch and the notification connection"""
+        self.config_reader.close()
+        self.notifier.close()
+
+    def fingerprint(self):
+        """Get the kdeglobals fingerprint, see KConfigReader.fingerprint"""
+        return self.config_reader.fingerprint()
 
     def get_current_theme(self):
         """Get the currently active KDE theme"""
+        if not metrics.time_lookups:
+            return self._current_theme()[0]
+
+        start = time.perf_counter()
+        current_theme, source = self._current_theme()
+        metrics.observe(
+            "current_theme_seconds", time.perf_counter() - start, source=source
+        )
+        return current_theme
+
+    def _current_theme(self):
+        """Get (theme, source) of the active theme, see get_current_theme"""
+        try:
+            current_theme = self.config_reader.read_entry("KDE", "LookAndFeelPackage")
+        except Exception as e:
+            self.logger.debug("Could not read kdeglobals directly: %s", e)
+            current_theme = None
+
+        if current_theme:
+            self.logger.debug("Current theme: %s", current_theme)
+            return current_theme, "kdeglobals"
+        return self._get_current_theme_kreadconfig(), "kreadconfig5"
+
+    def _get_current_theme_kreadconfig(self):
+        """Get the currently active KDE theme through kreadconfig5"""
         try:
             result = subprocess.run(
                 [
@@ -35,51 +138,168 @@ class ThemeManager:
                 capture_output=True,
                 text=True,
                 check=True,
+                **self._subprocess_kwargs(),
             )
 
             current_theme = result.stdout.strip()
-            self.logger.debug(f"Current theme: {current_theme}")
+            self.logger.debug("Current theme: %s", current_theme)
             return current_theme
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Error getting current theme: {e}")
+            self.logger.error("Error getting current theme: %s", e)
             return None
         except FileNotFoundError:
             self.logger.error("kreadconfig5 not found. Are you running KDE Plasma?")
             return None
 
+    def _step(self, name, command, after=()):
+        """Create an apply step running in this manager's session"""
+        return ApplyStep(
+            name,
+            command,
+            after=after,
+            env=self.session.env if self.session else None,
+            user=self.session.user if self.session else None,
+        )
+
+    def _package_step(self, theme_name):
+        """Step recording the look and feel package in kdeglobals"""
+        return self._step(
+            "kwriteconfig5",
+            [
+                "kwriteconfig5",
+                "--file",
+                "kdeglobals",
+                "--group",
+                "KDE",
+                "--key",
+                "LookAndFeelPackage",
+                theme_name,
+            ],
+        )
+
+    def _full_apply_steps(self, theme_name):
+        """Steps applying every setting of the theme with lookandfeeltool"""
+        return [
+            self._package_step(theme_name),
+            # lookandfeeltool also writes kdeglobals and so must not race the
+            # step above
+            self._step(
+                "lookandfeeltool",
+                ["lookandfeeltool", "--apply", theme_name],
+                after=["kwriteconfig5"],
+            ),
+        ]
+
+    def _partial_apply_steps(self, theme_name):
+        """Steps changing only the settings that differ from the current theme
+
+        Returns None when the themes differ in settings that only a full
+        apply changes, or a package cannot be read.
+        """
+        current = self.get_current_theme()
+        if not current:
+            return None
+        directories = package_dirs(
+            self.session.home if self.session else None,
+            self.session.env if self.session else None,
+        )
+        delta = settings_delta(
+            read_defaults(current, directories), read_defaults(theme_name, directories)
+        )
+        if delta is None:
+            return None
+
+        steps = [self._package_step(theme_name)]
+        # Writers of the same file run one after another
+        last_writer = {"kdeglobals": "kwriteconfig5"}
+        changes = set()
+        for setting, value in sorted(delta.items()):
+            config_file, group, key = setting
+            tool = APPLY_TOOLS.get(setting)
+            if tool:
+                name, command = tool, [tool, value]
+            else:
+                name = f"kwriteconfig5 {key}"
+                command = ["kwriteconfig5", "--file", config_file, "--group", group]
+                command += ["--key", key, value]
+                changes.add(WRITTEN_SETTINGS[setting])
+            after = [last_writer[config_file]] if config_file in last_writer else []
+            last_writer[config_file] = name
+            steps.append(self._step(name, command, after))
+
+        # Running applications reload what was written behind their back
+        for change in sorted(changes):
+            steps.append(
+                self._step(
+                    f"notify change {change}",
+                    [
+                        "dbus-send",
+                        "--session",
+                        "--type=signal",
+                        "/KGlobalSettings",
+                        "org.kde.KGlobalSettings.notifyChange",
+                        f"int32:{change}",
+                        "int32:0",
+                    ],
+                    after=[last_writer["kdeglobals"]],
+                )
+            )
+        return steps
+
     def set_theme(self, theme_name):
         """Set the KDE theme"""
-        try:
-            # Change the look and feel package
-            subprocess.run(
-                [
-                    "kwriteconfig5",
-                    "--file",
-                    "kdeglobals",
-                    "--group",
-                    "KDE",
-                    "--key",
-                    "LookAndFeelPackage",
-                    theme_name,
-                ],
-                check=True,
+        mode, steps = "full", None
+        if self.apply_mode == "partial":
+            steps = self._partial_apply_steps(theme_name)
+            if steps is None:
+                metrics.inc("apply_fallbacks_total", reason="structural")
+                self.logger.debug(
+                    "Themes differ beyond colors and styles, applying in full"
+                )
+            else:
+                mode = "partial"
+        result = self.apply_pipeline.run(steps or self._full_apply_steps(theme_name))
+        if mode == "partial" and not result.ok:
+            metrics.inc("apply_fallbacks_total", reason="failed")
+            self.logger.warning(
+                "Partial apply failed (%s), applying the whole theme",
+                ", ".join(step.name for step in result.failed),
             )
+            mode = "full"
+            result = self.apply_pipeline.run(self._full_apply_steps(theme_name))
+        self.last_apply_result = result
+        self.last_apply_mode = mode
+        metrics.observe("apply_seconds", result.duration, mode=mode)
 
-            # Apply the theme using lookandfeeltool
-            subprocess.run(["lookandfeeltool", "--apply", theme_name], check=True)
+        if not result.ok:
+            for step in result.failed:
+                if step.error and step.error.endswith("not found"):
+                    self.logger.error(
+                        "KDE tools not found. Are you running KDE Plasma?"
+                    )
+                else:
+                    self.logger.error(
+                        "Error setting theme: %s failed (%s)",
+                        step.name,
+                        step.error or f"exit status {step.returncode}",
+                    )
+            return False
 
-            self.logger.info(f"Successfully changed theme to: {theme_name}")
+        self.logger.info("Successfully changed theme to: %s", theme_name)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Apply latencies (%s): %s",
+                mode,
+                ", ".join(
+                    f"{name} {seconds * 1000:.0f} ms"
+                    for name, seconds in result.latencies().items()
+                ),
+            )
 
-            # Send system notification
-            self._send_notification(theme_name)
+        # Send system notification without holding up the switch
+        self.apply_pipeline.submit(self._send_notification, theme_name)
 
-            return True
-        except subprocess.CalledProcessError as e:
-            self.logger.error(f"Error setting theme: {e}")
-            return False
-        except FileNotFoundError:
-            self.logger.error("KDE tools not found. Are you running KDE Plasma?")
-            return False
+        return True
 
     def _send_notification(self, theme_name):
         """Send a system notification about theme change"""
@@ -88,6 +308,10 @@ class ThemeManager:
             title = "KDE Theme Changed"
             message = f"Switched to {theme_type} theme"
 
+            # Replace the previous theme toast rather than stacking them
+            if self.notifier.notify(title, message, kind="theme"):
+                return
+
             subprocess.run(
                 [
                     "notify-send",
@@ -100,11 +324,13 @@ class ThemeManager:
                 ],
                 check=False,
                 stderr=subprocess.DEVNULL,
+                timeout=Config.NOTIFICATION_TIMEOUT,
+                **self._subprocess_kwargs(),
             )  # Suppress libnotify portal messages
         except FileNotFoundError:
             self.logger.debug("notify-send not found, skipping notification")
         except Exception as e:
-            self.logger.debug(f"Could not send notification: {e}")
+            self.logger.debug("Could not send notification: %s", e)
 
     def _send_startup_notification(self, mode="manual"):
         """Send a system notification when the app starts"""
@@ -115,6 +341,9 @@ class ThemeManager:
             else:
                 message = "Theme update completed"
 
+            if self.notifier.notify(title, message, kind="startup"):
+                return
+
             subprocess.run(
                 [
                     "notify-send",
@@ -127,12 +356,28 @@ class ThemeManager:
                 ],
                 check=False,
                 stderr=subprocess.DEVNULL,
+                timeout=Config.NOTIFICATION_TIMEOUT,
+                **self._subprocess_kwargs(),
             )  # Suppress libnotify portal messages
         except FileNotFoundError:
             self.logger.debug("notify-send not found, skipping startup notification")
         except Exception as e:
-            self.logger.debug(f"Could not send startup notification: {e}")
+            self.logger.debug("Could not send startup notification: %s", e)
 
     def get_target_theme(self, is_daylight):
         """Get the target theme based on daylight status"""
         return self.light_theme if is_daylight else self.dark_theme
+
+    def get_phase_theme(self, phase):
+        """Get the target theme for a sun phase
+
+        Phases without a theme of their own use the light theme between
+        sunrise and sunset and the dark theme otherwise; "light" and "dark"
+        refer to those two themes.
+        """
+        theme = self.phase_themes.get(phase)
+        if theme is None:
+            return self.get_target_theme(phase in DAYLIGHT_PHASES)
+        if theme in ("light", "dark"):
+            return self.get_target_theme(theme == "light")
+        return theme
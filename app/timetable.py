@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Timetable module for KDE Theme Auto-Changer
+
+Generates sun phase timetables for fleets of hosts that are not allowed to
+reach the geolocation APIs. A list of hosts with coordinates (or cities) is
+turned into every phase transition over a date range on a process pool and
+streamed out as JSONL and/or a fixed-width binary timetable. Daemons load
+their host's schedule straight from the binary file (--timetable) instead of
+computing it.
+"""
+
+import csv
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import date as date_type
+from pathlib import Path
+
+from .phases import PHASES
+from .sun_table import SunTimeTable, read_transitions
+
+# magic, version, first day (proleptic Gregorian ordinal), number of days,
+# number of hosts
+FILE_HEADER = struct.Struct("<4sH2xIII4x")
+# host name (UTF-8, NUL padded), latitude, longitude, offset and size of the
+# host's sun table (see app.sun_table); entries are sorted by name
+HOST_ENTRY = struct.Struct("<64sddQQ")
+
+MAGIC = b"KTTB"
+VERSION = 1
+HOST_NAME_SIZE = 64
+
+
+class Host:
+    """A host of the fleet and where it is"""
+
+    def __init__(self, name, latitude=None, longitude=None, city=None):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.city = city
+
+    def __repr__(self):
+        return f"Host({self.name!r}, {self.latitude}, {self.longitude})"
+
+
+def _parse_host(record, where):
+    """Build a Host from a CSV row or JSON object"""
+    name = str(record.get("host") or "").strip()
+    if not name:
+        raise ValueError(f"{where}: missing host name")
+    if len(name.encode("utf-8")) > HOST_NAME_SIZE or "\0" in name:
+        raise ValueError(f"{where}: invalid host name {name!r}")
+
+    latitude, longitude = record.get("latitude"), record.get("longitude")
+    city = str(record.get("city") or "").strip() or None
+    if latitude in (None, "") or longitude in (None, ""):
+        if city is None:
+            raise ValueError(f"{where}: {name} needs latitude and longitude or a city")
+        return Host(name, city=city)
+
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: invalid coordinates for {name}")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"{where}: coordinates out of range for {name}")
+    return Host(name, latitude, longitude, city)
+
+
+def read_hosts(path):
+    """Read hosts from a CSV file with a header row, or a JSONL file
+
+    Each host has a "host" name and either "latitude" and "longitude" or a
+    "city". Raises ValueError on malformed input or duplicate names.
+    """
+    path = Path(path)
+    hosts = []
+    with open(path, newline="") as f:
+        if path.suffix in (".jsonl", ".ndjson", ".json"):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{number}: {e}")
+                if not isinstance(record, dict):
+                    raise ValueError(f"{path}:{number}: expected a JSON object")
+                hosts.append(_parse_host(record, f"{path}:{number}"))
+        else:
+            for number, row in enumerate(csv.DictReader(f), 2):
+                hosts.append(_parse_host(row, f"{path}:{number}"))
+
+    seen = set()
+    for host in hosts:
+        if host.name in seen:
+            raise ValueError(f"{path}: duplicate host {host.name}")
+        seen.add(host.name)
+    return hosts
+
+
+def resolve_cities(hosts):
+    """Geocode the hosts given by city, once per city
+
+    Raises ValueError naming the host if a city cannot be found; guessing
+    from this machine's IP would give the host someone else's sun.
+    """
+    from .location_manager import LocationManager
+
+    locations = {}
+    for host in hosts:
+        if host.latitude is not None:
+            continue
+        if host.city not in locations:
+            try:
+                manager = LocationManager(city=host.city, fallback=False)
+            except ValueError as e:
+                raise ValueError(f"{host.name}: {e}") from None
+            locations[host.city] = manager.location
+        host.latitude = locations[host.city].latitude
+        host.longitude = locations[host.city].longitude
+
+
+def compute_table(job):
+    """Compute one host's sun table, runs in the worker processes
+
+    Takes (name, latitude, longitude, start date, days) and returns
+    (name, latitude, longitude, table bytes).
+    """
+    from .tz_grid import timezone_at
+
+    name, latitude, longitude, start_date, days = job
+    # Local dates in the zone the host's daemon resolves its coordinates to
+    table = SunTimeTable(
+        latitude, longitude, days=days, timezone_name=timezone_at(latitude, longitude)
+    )
+    return name, latitude, longitude, bytes(table.build(start_date))
+
+
+class JsonlWriter:
+    """Streams timetables as one JSON object per host"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "w")
+
+    def write(self, name, latitude, longitude, table):
+        start, days, initial_phase, times, phases = read_transitions(table)
+        record = {
+            "host": name,
+            "latitude": latitude,
+            "longitude": longitude,
+            "start": date_type.fromordinal(start).isoformat(),
+            "days": days,
+            "initial_phase": PHASES[initial_phase],
+            "transitions": [
+                [timestamp, PHASES[phase]] for timestamp, phase in zip(times, phases)
+            ],
+        }
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class BinaryWriter:
+    """Streams timetables into the binary format read by Timetable
+
+    The host tables are appended as they come in; the host index in front of
+    them is written last, sorted by name. The file is replaced atomically.
+    """
+
+    def __init__(self, path, host_count, start_date, days):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.host_count = host_count
+        self.start = start_date.toordinal()
+        self.days = days
+        self.entries = []
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}."
+        )
+        os.fchmod(fd, 0o644)  # the timetable is meant to be shipped to other hosts
+        self._file = os.fdopen(fd, "wb")
+        self._offset = FILE_HEADER.size + host_count * HOST_ENTRY.size
+        self._file.seek(self._offset)
+
+    def write(self, name, latitude, longitude, table):
+        padding = -len(table) % 8  # keep every table 8-byte aligned
+        self._file.write(table + bytes(padding))
+        self.entries.append(
+            (name.encode("utf-8"), latitude, longitude, self._offset, len(table))
+        )
+        self._offset += len(table) + padding
+
+    def close(self):
+        if len(self.entries) != self.host_count:
+            raise ValueError(
+                f"expected {self.host_count} hosts, got {len(self.entries)}"
+            )
+        self._file.seek(0)
+        self._file.write(
+            FILE_HEADER.pack(MAGIC, VERSION, self.start, self.days, self.host_count)
+        )
+        for entry in sorted(self.entries):
+            self._file.write(HOST_ENTRY.pack(*entry))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.unlink(self._tmp_path)
+
+
+def generate_timetable(
+    hosts, start_date, days, jsonl_path=None, binary_path=None, workers=None
+):
+    """Compute the timetables of all hosts and write them out
+
+    Tables are computed on a pool of worker processes and written in input
+    order as they complete. Returns a stats dict, including the throughput in
+    location-days per second.
+    """
+    logger = logging.getLogger(__name__)
+    workers = workers or os.cpu_count() or 1
+    writers = []
+    if jsonl_path:
+        writers.append(JsonlWriter(jsonl_path))
+    if binary_path:
+        writers.append(BinaryWriter(binary_path, len(hosts), start_date, days))
+
+    start = time.perf_counter()
+    try:
+        resolve_cities(hosts)
+        jobs = [
+            (host.name, host.latitude, host.longitude, start_date, days)
+            for host in hosts
+        ]
+        if workers == 1 or len(jobs) < 2:
+            results = map(compute_table, jobs)
+            pool = None
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # Hand out several hosts at a time, but keep every worker busy
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = pool.map(compute_table, jobs, chunksize=chunksize)
+
+        try:
+            for result in results:
+                for writer in writers:
+                    writer.write(*result)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        for writer in writers:
+            writer.close()
+    except BaseException:
+        for writer in writers:
+            try:
+                writer.abort()
+            except OSError:
+                pass
+        raise
+
+    seconds = time.perf_counter() - start
+    location_days = len(hosts) * days
+    stats = {
+        "hosts": len(hosts),
+        "days": days,
+        "workers": workers,
+        "location_days": location_days,
+        "seconds": round(seconds, 3),
+        "location_days_per_second": round(location_days / seconds, 1),
+    }
+    logger.info(
+        "Generated timetables for %d hosts x %d days in %.2fs (%.0f location-days/s)",
+        len(hosts),
+        days,
+        seconds,
+        stats["location_days_per_second"],
+    )
+    return stats
+
+
+class TimetableEntry:
+    """One host's schedule in a timetable"""
+
+    def __init__(self, name, latitude, longitude, table):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.table = table  # a sun table, see app.sun_table
+
+    def __repr__(self):
+        return f"TimetableEntry({self.name!r}, {self.latitude}, {self.longitude})"
+
+
+class Timetable:
+    """Memory-mapped binary timetable written by generate_timetable()"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._buffer) < FILE_HEADER.size:
+            raise ValueError(f"{self.path} is not a timetable")
+        magic, version, start, days, count = FILE_HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} timetable")
+        if len(self._buffer) < FILE_HEADER.size + count * HOST_ENTRY.size:
+            raise ValueError(f"{self.path} is truncated")
+        self.start = date_type.fromordinal(start)
+        self.days = days
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, index):
+        return HOST_ENTRY.unpack_from(
+            self._buffer, FILE_HEADER.size + index * HOST_ENTRY.size
+        )
+
+    def hosts(self):
+        """Get the host names, sorted"""
+        return [
+            self._entry(index)[0].rstrip(b"\0").decode("utf-8")
+            for index in range(self.count)
+        ]
+
+    def lookup(self, name):
+        """Find a host's schedule by binary search, None if it is not listed"""
+        key = name.encode("utf-8").ljust(HOST_NAME_SIZE, b"\0")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.count:
+            return None
+        stored, latitude, longitude, offset, size = self._entry(low)
+        if stored != key:
+            return None
+        if offset + size > len(self._buffer):
+            raise ValueError(f"{self.path} is truncated")
+        table = memoryview(self._buffer)[offset : offset + size]
+        return TimetableEntry(name, latitude, longitude, table)
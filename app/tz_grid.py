@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Time zone grid module for KDE Theme Auto-Changer
+
+Resolves coordinates to an IANA time zone without the network. The world is
+cut into a grid of cells (a quarter degree by default), each holding the time
+zone whose boundary polygons cover it, rasterized at build time from
+timezone-boundary-builder data, or the nautical Etc/GMT±N zone of its
+longitude where no polygon does. Neighbouring cells mostly share a zone, so
+each row is stored run-length encoded in a small memory-mapped file; a row
+is expanded on its first lookup and kept, making lookups amortized O(1).
+"""
+
+import logging
+import math
+import mmap
+import struct
+from array import array
+from collections import Counter
+from datetime import timezone
+from pathlib import Path
+
+from .config import Config
+from .fileutil import atomic_write
+
+# magic, version, cells per degree, number of time zones, number of runs
+HEADER = struct.Struct("<4sHHH2xI")
+# then one uint32 per row and one at the end: index of the row's first run
+ROW = struct.Struct("<I")
+# then the runs: column after the run, time zone index
+RUN = struct.Struct("<HH")
+# then the time zone names, newline separated
+
+MAGIC = b"KTZG"
+VERSION = 1
+# Sample points along each side of a cell, when building
+SAMPLES = 3
+# First parts of the IANA Area/Location names; others (US/Pacific) are legacy
+ZONE_AREAS = (
+    "Africa",
+    "America",
+    "Antarctica",
+    "Arctic",
+    "Asia",
+    "Atlantic",
+    "Australia",
+    "Europe",
+    "Indian",
+    "Pacific",
+    "Etc",
+)
+
+
+def nautical_zone(longitude):
+    """Get the Etc/GMT±N zone of a longitude (its sign is inverted by POSIX)"""
+    offset = round(longitude / 15)
+    return f"Etc/GMT{-offset:+d}" if offset else "Etc/GMT"
+
+
+def zone_info(name):
+    """Get the tzinfo of an IANA time zone name, UTC if it is unknown here"""
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        logging.getLogger(__name__).warning("Unknown time zone %s: %s", name, e)
+        return timezone.utc
+
+
+def zone_links():
+    """Get {link: target} of the IANA links in the system's tzdata.zi
+
+    Empty if no tzdata.zi is found.
+    """
+    import zoneinfo
+
+    paths = [Path(directory) / "tzdata.zi" for directory in zoneinfo.TZPATH]
+    try:
+        import tzdata
+
+        paths.append(Path(tzdata.__file__).parent / "zoneinfo" / "tzdata.zi")
+    except ImportError:
+        pass
+    for path in paths:
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            continue
+        return {
+            fields[2]: fields[1]
+            for fields in (line.split() for line in lines)
+            if len(fields) >= 3 and fields[0] == "L"
+        }
+    return {}
+
+
+def canonical_zone(name, links):
+    """Follow a legacy zone name (US/Pacific, GB, ...) to its IANA target
+
+    Only names outside the Area/Location scheme are followed: tzdata also
+    links country zones (Europe/Bratislava) to the zone they share rules
+    with, and those keep their name.
+    """
+    while name.split("/")[0] not in ZONE_AREAS and name in links:
+        name = links[name]
+    return name
+
+
+def read_boundaries(path):
+    """Read time zone polygons from timezone-boundary-builder GeoJSON
+
+    path is a GeoJSON file or a release .zip holding one. Returns a list of
+    (tzid, rings), each ring a list of [longitude, latitude] points; the
+    rings of a zone's polygons and their holes are kept together.
+    """
+    import json
+    import zipfile
+
+    path = Path(path)
+    try:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                names = [n for n in archive.namelist() if n.endswith("json")]
+                if len(names) != 1:
+                    raise ValueError("expected one GeoJSON file in the archive")
+                data = json.loads(archive.read(names[0]))
+        else:
+            with open(path, "rb") as f:
+                data = json.load(f)
+
+        boundaries = []
+        for feature in data["features"]:
+            geometry = feature["geometry"]
+            if geometry["type"] == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry["type"] == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                raise ValueError(f"unexpected geometry {geometry['type']}")
+            rings = [ring for polygon in polygons for ring in polygon]
+            boundaries.append((feature["properties"]["tzid"], rings))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{path} is not a time zone boundary file: {e}") from e
+    return boundaries
+
+
+def _rasterize(boundaries, cells_per_degree):
+    """Get the boundary covering each cell centre, as 1-based index (0: none)
+
+    Cells are in rows from the north-west corner. Rings are filled with the
+    even-odd rule, so holes stay uncovered. Sea zones (Etc/GMT±N) are filled
+    first, so land they overlap keeps its zone.
+    """
+    rows, columns = 180 * cells_per_degree, 360 * cells_per_degree
+    cells = array("H", bytes(2 * rows * columns))
+    order = sorted(
+        enumerate(boundaries, 1), key=lambda item: not item[1][0].startswith("Etc/")
+    )
+    for index, (_, rings) in order:
+        crossings = {}
+        for ring in rings:
+            for start, end in zip(ring, ring[1:] + ring[:1]):
+                x1, y1, x2, y2 = start[0], start[1], end[0], end[1]
+                if y1 == y2:
+                    continue
+                low, high = (y1, y2) if y1 < y2 else (y2, y1)
+                slope = (x2 - x1) / (y2 - y1)
+                # Rows whose centre latitude lies in [low, high)
+                first = max(math.floor((90 - high) * cells_per_degree - 0.5) + 1, 0)
+                last = min(math.floor((90 - low) * cells_per_degree - 0.5), rows - 1)
+                for row in range(first, last + 1):
+                    latitude = 90 - (row + 0.5) / cells_per_degree
+                    crossings.setdefault(row, []).append(x1 + (latitude - y1) * slope)
+        for row, xs in crossings.items():
+            xs.sort()
+            base = row * columns
+            for west, east in zip(xs[::2], xs[1::2]):
+                # Columns whose centre longitude lies in [west, east)
+                first = max(math.ceil((west + 180) * cells_per_degree - 0.5), 0)
+                stop = min(math.ceil((east + 180) * cells_per_degree - 0.5), columns)
+                if first < stop:
+                    cells[base + first : base + stop] = array("H", [index]) * (
+                        stop - first
+                    )
+    return cells
+
+
+def build_timezone_grid(boundaries, path, cells_per_degree=4, cities=()):
+    """Write a time zone grid from time zone polygons, returns the number of runs
+
+    boundaries are (tzid, rings) as from read_boundaries. Each cell is
+    sampled at SAMPLES x SAMPLES points and takes the land zone covering the
+    most of them, so coasts and small islands keep their zone; cells without
+    land take the sea zone (Etc/GMT±N) covering the most, or the nautical
+    zone of their longitude. Cells holding one of cities, (latitude,
+    longitude, zone) triples, take that city's zone, which is more reliable
+    than its rounded coordinates near a border. Legacy zone names are
+    replaced by their IANA targets (see canonical_zone).
+    """
+    links = zone_links()
+    names = [canonical_zone(tzid, links) for tzid, _ in boundaries]
+    at_sea = [name.startswith("Etc/") for name in names]
+    rows, columns = 180 * cells_per_degree, 360 * cells_per_degree
+    samples = _rasterize(boundaries, cells_per_degree * SAMPLES)
+    sample_columns = columns * SAMPLES
+
+    cells = []
+    for row in range(rows):
+        sample_rows = [
+            samples[offset : offset + sample_columns]
+            for offset in range(
+                row * SAMPLES * sample_columns,
+                (row + 1) * SAMPLES * sample_columns,
+                sample_columns,
+            )
+        ]
+        for column in range(columns):
+            span = slice(column * SAMPLES, (column + 1) * SAMPLES)
+            found = [index for line in sample_rows for index in line[span] if index]
+            land = [index for index in found if not at_sea[index - 1]]
+            if land or found:
+                index = Counter(land or found).most_common(1)[0][0]
+                cells.append(names[index - 1])
+            else:
+                longitude = -180 + (column + 0.5) / cells_per_degree
+                cells.append(nautical_zone(longitude))
+
+    for latitude, longitude, zone in cities:
+        row = min(int((90 - latitude) * cells_per_degree), rows - 1)
+        column = int((longitude + 180) * cells_per_degree) % columns
+        cells[row * columns + column] = canonical_zone(zone, links)
+
+    timezones = {}
+    row_index = array("I")
+    runs = bytearray()
+    count = 0
+    for row in range(rows):
+        row_index.append(count)
+        previous = None
+        for column in range(columns):
+            zone = timezones.setdefault(cells[row * columns + column], len(timezones))
+            if zone != previous:
+                if previous is not None:
+                    runs += RUN.pack(column, previous)
+                    count += 1
+                previous = zone
+        runs += RUN.pack(columns, previous)
+        count += 1
+    row_index.append(count)
+
+    data = bytearray(
+        HEADER.pack(MAGIC, VERSION, cells_per_degree, len(timezones), count)
+    )
+    for start in row_index:
+        data += ROW.pack(start)
+    data += runs
+    data += "\n".join(timezones).encode("utf-8")
+    atomic_write(Path(path), bytes(data))
+    return count
+
+
+class TimezoneGrid:
+    """Memory-mapped, run-length encoded time zone grid"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or Config.TIMEZONE_GRID_FILE)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except (ValueError, struct.error, UnicodeDecodeError):
+            self._buffer.close()
+            raise
+        self._rows = {}
+
+    def _open(self):
+        """Check the header and read the time zone names"""
+        buffer = self._buffer
+        if len(buffer) < HEADER.size:
+            raise ValueError(f"{self.path} is not a time zone grid")
+        magic, version, cells_per_degree, timezones, runs = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION or not cells_per_degree:
+            raise ValueError(f"{self.path} is not a version {VERSION} time zone grid")
+        self.cells_per_degree = cells_per_degree
+        self.rows = 180 * cells_per_degree
+        self.columns = 360 * cells_per_degree
+        self._runs_offset = HEADER.size + (self.rows + 1) * ROW.size
+        names_offset = self._runs_offset + runs * RUN.size
+        if len(buffer) < names_offset:
+            raise ValueError(f"{self.path} is truncated")
+        self.timezones = buffer[names_offset:].decode("utf-8").split("\n")
+        if len(self.timezones) != timezones:
+            raise ValueError(f"{self.path} is truncated")
+
+    def _row(self, row):
+        """Expand a row into one time zone index per column"""
+        start, end = (
+            ROW.unpack_from(self._buffer, HEADER.size + (row + index) * ROW.size)[0]
+            for index in (0, 1)
+        )
+        cells = array("H")
+        for run in range(start, end):
+            stop, zone = RUN.unpack_from(
+                self._buffer, self._runs_offset + run * RUN.size
+            )
+            cells.extend([zone] * (stop - len(cells)))
+        if len(cells) != self.columns:
+            raise ValueError(f"{self.path}: row {row} is corrupt")
+        self._rows[row] = cells
+        return cells
+
+    def timezone_at(self, latitude, longitude):
+        """Get the IANA time zone name at a point"""
+        row = min(max(int((90 - latitude) * self.cells_per_degree), 0), self.rows - 1)
+        column = int((longitude + 180) * self.cells_per_degree) % self.columns
+        cells = self._rows.get(row) or self._row(row)
+        return self.timezones[cells[column]]
+
+    def close(self):
+        """Unmap the file and drop the expanded rows"""
+        self._rows.clear()
+        self._buffer.close()
+
+
+_grids = {}
+
+
+def open_timezone_grid(path=None):
+    """Get the shared TimezoneGrid for path (default: Config.TIMEZONE_GRID_FILE)
+
+    Returns None if the file is missing or unreadable.
+    """
+    path = path or Config.TIMEZONE_GRID_FILE
+    if path not in _grids:
+        logger = logging.getLogger(__name__)
+        try:
+            _grids[path] = TimezoneGrid(path)
+        except FileNotFoundError:
+            logger.debug("No time zone grid at %s", path)
+            _grids[path] = None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable time zone grid: %s", e)
+            _grids[path] = None
+    return _grids[path]
+
+
+def timezone_at(latitude, longitude):
+    """Get the IANA time zone name at a point, nautical without the grid"""
+    grid = open_timezone_grid()
+    if grid is not None:
+        try:
+            return grid.timezone_at(latitude, longitude)
+        except ValueError as e:
+            logging.getLogger(__name__).warning("Time zone lookup failed: %s", e)
+    return nautical_zone(longitude)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Wall-clock timer module for KDE Theme Auto-Changer
+
+Sleeping for a duration follows a monotonic clock: it stops during suspend and
+ignores NTP steps and manual clock changes, so after a resume the daemon would
+wake late. A Linux timerfd on CLOCK_REALTIME armed for an absolute time with
+TFD_TIMER_CANCEL_ON_SET instead fires at the wall-clock deadline, also right
+after a resume that slept past it, and is cancelled as soon as the wall clock
+is set, so the schedule can be re-evaluated immediately.
+
+timerfd is called through ctypes; where it is unavailable open_wall_timer()
+returns None and callers fall back to sleeping.
+"""
+
+import ctypes
+import errno
+import logging
+import math
+import os
+
+CLOCK_REALTIME = 0
+TFD_NONBLOCK = os.O_NONBLOCK
+TFD_CLOEXEC = os.O_CLOEXEC
+TFD_TIMER_ABSTIME = 1
+TFD_TIMER_CANCEL_ON_SET = 2
+
+# What read() reports
+EXPIRED = "expired"
+CLOCK_CHANGED = "clock_changed"
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _Timespec), ("it_value", _Timespec)]
+
+
+_libc = None
+
+
+def _load_libc():
+    """Get libc with the timerfd functions declared"""
+    global _libc
+
+    if _libc is None:
+        # The running interpreter already links libc, no need to search for it
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.timerfd_create.argtypes = [ctypes.c_int, ctypes.c_int]
+        libc.timerfd_create.restype = ctypes.c_int
+        libc.timerfd_settime.argtypes = [
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.POINTER(_Itimerspec),
+            ctypes.POINTER(_Itimerspec),
+        ]
+        libc.timerfd_settime.restype = ctypes.c_int
+        _libc = libc
+    return _libc
+
+
+def _os_error():
+    """Build an OSError from ctypes' saved errno"""
+    error = ctypes.get_errno()
+    return OSError(error, os.strerror(error))
+
+
+class WallClockTimer:
+    """timerfd firing at an absolute wall-clock time, or when the clock is set"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._libc = _load_libc()
+        self.fd = self._libc.timerfd_create(CLOCK_REALTIME, TFD_NONBLOCK | TFD_CLOEXEC)
+        if self.fd < 0:
+            raise _os_error()
+
+    def fileno(self):
+        return self.fd
+
+    def arm(self, deadline):
+        """Fire at deadline, a Unix timestamp; a past deadline fires at once"""
+        seconds = math.floor(deadline)
+        spec = _Itimerspec()
+        spec.it_value.tv_sec = seconds
+        # An all-zero time would disarm the timer instead
+        spec.it_value.tv_nsec = max(int((deadline - seconds) * 1e9), 1)
+        flags = TFD_TIMER_ABSTIME | TFD_TIMER_CANCEL_ON_SET
+        if self._libc.timerfd_settime(self.fd, flags, ctypes.byref(spec), None) < 0:
+            raise _os_error()
+
+    def disarm(self):
+        """Stop the timer and drop an expiry that was not read yet"""
+        spec = _Itimerspec()
+        if self._libc.timerfd_settime(self.fd, 0, ctypes.byref(spec), None) < 0:
+            raise _os_error()
+
+    def read(self):
+        """Get EXPIRED, CLOCK_CHANGED, or None if the timer has not fired"""
+        try:
+            os.read(self.fd, 8)
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            if e.errno == errno.ECANCELED:
+                return CLOCK_CHANGED
+            raise
+        return EXPIRED
+
+    def close(self):
+        """Release the timerfd"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_wall_timer():
+    """Create a WallClockTimer, or None if timerfd is unavailable"""
+    try:
+        return WallClockTimer()
+    except (OSError, AttributeError) as e:
+        # AttributeError: no timerfd_create in this libc (not Linux)
+        logging.getLogger(__name__).debug(
+            "timerfd unavailable, sleeping instead: %s", e
+        )
+        return None
@@ -0,0 +1 @@
+# Benchmarks for KDE Theme Auto-Changer
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Control socket benchmark for KDE Theme Auto-Changer
+
+Starts a daemon with a control socket in a fake KDE environment and compares
+what a command line call costs with and without it:
+
+- status request round trip from a connected client (in-process)
+- `main.py ctl status` and `main.py`, answered by the daemon (new process)
+- `main.py --latitude ... --longitude ...`, a cold run_once (new process)
+
+    python3 -m benchmarks.bench_control [--runs 10] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from app.async_daemon import AsyncDaemon
+from app.config import Config
+from app.control import request
+
+from .bench_hot_path import LATITUDE, LONGITUDE, measure
+from .fake_kde import FakeKDEEnvironment
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def start_daemon(changer, path):
+    """Run an AsyncDaemon in a thread, returns (daemon, thread, loop)"""
+    daemon = AsyncDaemon(changer, control_socket=path)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(
+        target=loop.run_until_complete, args=(daemon.run(),), daemon=True
+    )
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not path.exists():
+        if time.monotonic() > deadline:
+            raise RuntimeError("daemon did not start")
+        time.sleep(0.01)
+    return daemon, thread, loop
+
+
+def time_process(args, runs):
+    """Time a main.py process, returns a stats dict in microseconds"""
+    command = [sys.executable, "main.py", *args]
+    return measure(
+        lambda: subprocess.run(command, cwd=REPO_ROOT, capture_output=True, check=True),
+        runs,
+    )
+
+
+def run_benchmarks(runs=10, requests=2000):
+    """Run every benchmark, returns {name: stats}"""
+    from app.kde_theme_changer import KDEThemeChanger
+
+    results = {}
+    with FakeKDEEnvironment() as env, patch.object(
+        Config, "CACHE_DIR", env.cache_home
+    ), patch.object(Config, "LOG_FILE", env.log_file):
+        # The processes must find the daemon and keep their logs in here too
+        os.environ["XDG_RUNTIME_DIR"] = str(env.runtime_root)
+        os.environ["HOME"] = str(env.homes)
+        path = env.runtime_root / Config.CONTROL_SOCKET_NAME
+        env.set_theme(Config.DEFAULT_DARK_THEME)
+        changer = KDEThemeChanger(LATITUDE, LONGITUDE)
+        logging.getLogger().setLevel(logging.WARNING)
+        daemon, thread, loop = start_daemon(changer, path)
+        try:
+            results["status_round_trip"] = measure(
+                lambda: request("status", path), requests
+            )
+            results["ctl_status_process"] = time_process(["ctl", "status"], runs)
+            results["run_once_via_daemon"] = time_process([], runs)
+            results["run_once_cold"] = time_process(
+                ["--latitude", str(LATITUDE), "--longitude", str(LONGITUDE)], runs
+            )
+        finally:
+            loop.call_soon_threadsafe(daemon.stop)
+            thread.join(10)
+            changer.theme_manager.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control socket benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Process runs each")
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="In-process status requests"
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.runs, args.requests)
+
+    cold = results["run_once_cold"]["median_us"]
+    print(f"{'benchmark':<24} {'median':>10} {'p95':>10} {'vs cold':>8}")
+    for name, stats in results.items():
+        print(
+            f"{name:<24} {stats['median_us'] / 1000:>8.2f}ms "
+            f"{stats['p95_us'] / 1000:>8.2f}ms {cold / stats['median_us']:>7.1f}x"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
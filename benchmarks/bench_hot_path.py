@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Hot path benchmark suite for KDE Theme Auto-Changer
+
+Times the code that runs on every check and every switch, against stub KDE
+tools (see fake_kde.py):
+
+- LocationManager.get_sun_times / is_daylight / get_next_transition
+- LocationManager.get_phase / next_transitions, bisect lookups in the sun table
+- offline gazetteer city name and nearest-city lookups, time zone grid lookups
+- ThemeManager.get_current_theme, in-process and through kreadconfig5
+- ThemeManager.set_theme
+- complete KDEThemeChanger.update_theme cycles, with and without a switch
+
+Results are written as JSON and compared against a stored baseline:
+
+    python3 -m benchmarks.bench_hot_path [--output results.json]
+        [--baseline benchmarks/baseline.json] [--tolerance 2.0]
+        [--update-baseline]
+
+Exits with status 1 when a benchmark is slower than tolerance x baseline.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+
+from .fake_kde import FakeKDEEnvironment
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+LATITUDE, LONGITUDE = 52.52, 13.405  # Berlin
+
+
+def measure(fn, iterations, setup=None):
+    """Time fn() per call, returns a stats dict in microseconds"""
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "median_us": round(statistics.median(samples), 2),
+        "p95_us": round(samples[int(len(samples) * 0.95) - 1], 2),
+        "mean_us": round(statistics.fmean(samples), 2),
+    }
+
+
+def run_benchmarks(scale=1.0):
+    """Run every benchmark, returns {name: stats}"""
+    from app.kde_theme_changer import KDEThemeChanger
+
+    def n(count):
+        return max(5, int(count * scale))
+
+    results = {}
+    with FakeKDEEnvironment() as env, patch.object(
+        Config, "CACHE_DIR", env.cache_home
+    ), patch.object(Config, "LOG_FILE", env.log_file):
+        changer = KDEThemeChanger(LATITUDE, LONGITUDE)
+        logging.getLogger().setLevel(logging.WARNING)
+        location_manager = changer.location_manager
+        theme_manager = changer.theme_manager
+        today = date.today()
+
+        # Warm up the sun table so lookups measure the steady state
+        location_manager.get_sun_times(today)
+
+        def astral_sun_times():
+            from astral.sun import sun
+
+            sun(location_manager.location.observer, date=today)
+
+        results["astral_sun_uncached"] = measure(astral_sun_times, n(2000))
+        results["get_sun_times"] = measure(
+            lambda: location_manager.get_sun_times(today), n(20000)
+        )
+        results["is_daylight"] = measure(location_manager.is_daylight, n(20000))
+        results["get_next_transition"] = measure(
+            location_manager.get_next_transition, n(5000)
+        )
+        results["get_phase"] = measure(location_manager.get_phase, n(20000))
+        results["next_transitions_10"] = measure(
+            lambda: location_manager.next_transitions(10), n(20000)
+        )
+
+        from app.gazetteer import open_gazetteer
+
+        gazetteer = open_gazetteer()
+        results["gazetteer_lookup"] = measure(
+            lambda: gazetteer.lookup("Berlin"), n(20000)
+        )
+        results["gazetteer_nearest"] = measure(
+            lambda: gazetteer.nearest(LATITUDE, LONGITUDE), n(20000)
+        )
+        from app.tz_grid import timezone_at
+
+        results["timezone_at"] = measure(
+            lambda: timezone_at(LATITUDE, LONGITUDE), n(20000)
+        )
+
+        env.set_theme(Config.DEFAULT_LIGHT_THEME)
+        theme_manager.get_current_theme()
+        results["get_current_theme"] = measure(
+            theme_manager.get_current_theme, n(20000)
+        )
+        results["get_current_theme_kreadconfig5"] = measure(
+            theme_manager._get_current_theme_kreadconfig, n(100)
+        )
+
+        themes = [Config.DEFAULT_LIGHT_THEME, Config.DEFAULT_DARK_THEME]
+        alternating = itertools.cycle(themes)
+        results["set_theme"] = measure(
+            lambda: theme_manager.set_theme(next(alternating)), n(100)
+        )
+
+        target = theme_manager.get_target_theme(location_manager.is_daylight())
+        wrong = themes[0] if target == themes[1] else themes[1]
+
+        env.set_theme(target)
+        results["update_theme_no_switch"] = measure(changer.update_theme, n(5000))
+        results["update_theme_switch"] = measure(
+            changer.update_theme, n(100), setup=lambda: env.set_theme(wrong)
+        )
+        theme_manager.apply_pipeline.shutdown()
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table, returns the names of regressed benchmarks"""
+    regressions = []
+    print(f"{'benchmark':<32} {'median':>12} {'baseline':>12} {'ratio':>7}")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<32} {stats['median_us']:>10.1f}us {'-':>12} {'-':>7}")
+            continue
+        ratio = stats["median_us"] / base["median_us"]
+        flag = " REGRESSION" if ratio > tolerance else ""
+        print(
+            f"{name:<32} {stats['median_us']:>10.1f}us "
+            f"{base['median_us']:>10.1f}us {ratio:>6.2f}x{flag}"
+        )
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path benchmark suite")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="Allowed slowdown factor against the baseline (default: 2.0)",
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply iteration counts"
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Store results as baseline"
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scale)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())["benchmarks"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if regressions:
+        print(f"FAIL: slower than {args.tolerance}x baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
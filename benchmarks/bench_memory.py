@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for KDE Theme Auto-Changer
+
+Runs theme checks the way the long-running daemon does, in a child process
+on a fake KDE desktop (see fake_kde.py) and a virtual clock advancing ten
+minutes per check, so the sun table is generated, the theme switches at every
+transition and the daemon's modules are loaded. Checks the child's memory
+against the budget in memory_budget.json:
+
+- RSS: resident memory after all checks, at most daemon_rss_mb
+- RSS growth: from the end of the warmup checks to the last check
+- retained: Python memory allocated after the warmup and still held at the
+  end (tracemalloc), which grows with every check if anything leaks
+
+    python3 -m benchmarks.bench_memory [--cycles N] [--output results.json]
+
+Exits with status 1 when the budget is exceeded.
+"""
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BUDGET_FILE = Path(__file__).with_name("memory_budget.json")
+REPO_ROOT = Path(__file__).resolve().parent.parent
+LATITUDE, LONGITUDE = 52.52, 13.405  # Berlin
+CHECK_INTERVAL = 600  # virtual seconds between checks
+
+
+def run_child(warmup, cycles):
+    """Entry point of the child process, prints its measurements as JSON"""
+    import time
+    import tracemalloc
+    from unittest.mock import patch
+
+    # Loaded by the daemon on top of run_once
+    import app.async_daemon  # noqa: F401
+    from app.config import Config
+    from app.kde_theme_changer import KDEThemeChanger
+    from app.logging_setup import stop_logging
+    from app.profiling import rss_kib
+
+    from .fake_kde import FakeKDEEnvironment
+
+    with FakeKDEEnvironment() as env, patch.object(
+        Config, "CACHE_DIR", env.cache_home
+    ), patch.object(Config, "LOG_FILE", env.log_file):
+        now = [time.time()]
+        changer = KDEThemeChanger(LATITUDE, LONGITUDE, clock=lambda: now[0])
+
+        def check():
+            if not changer.update_theme():
+                raise RuntimeError("theme check failed")
+            now[0] += CHECK_INTERVAL
+
+        for _ in range(warmup):
+            check()
+        gc.collect()
+        warm_rss = rss_kib()
+        tracemalloc.start()
+        for _ in range(cycles - warmup):
+            check()
+        # Records waiting for the log writer thread are not held for good
+        stop_logging()
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {
+            "cycles": cycles,
+            "rss_mb": round(rss_kib() / 1024, 1),
+            "rss_growth_kb": rss_kib() - warm_rss,
+            "retained_kb": round(retained / 1024, 1),
+        }
+        changer.theme_manager.apply_pipeline.shutdown()
+    print(json.dumps(result))
+
+
+def measure_daemon_memory(warmup, cycles):
+    """Run the checks in a child process, returns its measurements"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_memory",
+            "--child",
+            str(warmup),
+            str(cycles),
+        ],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"memory child failed: {result.stderr.strip()}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def over_budget(results, budget):
+    """Describe every measurement over the budget, an empty list if none is"""
+    problems = []
+    if results["rss_mb"] > budget["daemon_rss_mb"]:
+        problems.append(
+            f"RSS {results['rss_mb']} MB over budget ({budget['daemon_rss_mb']} MB)"
+        )
+    for key, label in (("rss_growth_kb", "RSS growth"), ("retained_kb", "retained")):
+        if results[key] > budget[key]:
+            problems.append(
+                f"{label} {results[key]} KiB over budget ({budget[key]} KiB)"
+            )
+    return problems
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(int(sys.argv[2]), int(sys.argv[3]))
+        return 0
+
+    budget = json.loads(BUDGET_FILE.read_text())
+    parser = argparse.ArgumentParser(description="Daemon memory benchmark")
+    parser.add_argument(
+        "--cycles",
+        type=int,
+        default=budget["cycles"],
+        help=f"Theme checks to run (default: {budget['cycles']})",
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    args = parser.parse_args()
+
+    warmup = min(budget["warmup_cycles"], args.cycles // 2)
+    results = measure_daemon_memory(warmup, args.cycles)
+    print(
+        f"{results['cycles']} checks: RSS {results['rss_mb']} MB "
+        f"(budget {budget['daemon_rss_mb']} MB), RSS growth "
+        f"{results['rss_growth_kb']} KiB, retained {results['retained_kb']} KiB "
+        f"after {warmup} warmup checks"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    problems = over_budget(results, budget)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: memory within budget")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Multi-user daemon benchmark for KDE Theme Auto-Changer
+
+Runs the multi-user daemon over growing numbers of synthetic sessions (see
+fake_kde.py), spread over a handful of locations, and compares its cost with
+one KDEThemeChanger daemon per session:
+
+- setup: discovering the sessions and building their managers
+- switch cycle: one update_all() where every session needs a switch
+- steady cycle: update_all() when every session is already correct
+- heap: Python allocations held by the daemon per session (tracemalloc)
+- RSS: peak resident memory of a child process running the daemon, against
+  the peak of one single-user daemon process times the number of sessions
+
+    python3 -m benchmarks.bench_multi_user [--users 1 10 50 200]
+        [--locations 8] [--output results.json] [--no-rss]
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+
+from .fake_kde import FakeKDEEnvironment, lookup_user
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+LATITUDE, LONGITUDE = 52.52, 13.405  # Berlin
+
+
+def add_users(env, count, locations):
+    """Create synthetic users, all showing the wrong theme, over some locations"""
+    for i in range(count):
+        settings = {"latitude": LATITUDE + i % locations, "longitude": LONGITUDE}
+        env.add_user(10000 + i, "wrong.theme", settings=settings)
+
+
+def make_daemon(runtime_root, homes):
+    """Create a multi-user daemon over the synthetic users"""
+    from app.multi_user import MultiUserDaemon
+
+    return MultiUserDaemon(
+        LATITUDE,
+        LONGITUDE,
+        runtime_root=runtime_root,
+        lookup_user=functools.partial(lookup_user, homes),
+    )
+
+
+def child_peak_rss(mode, runtime_root, homes):
+    """Peak RSS in KiB of a child process running one daemon cycle"""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_multi_user",
+            "--child",
+            mode,
+            str(runtime_root),
+            str(homes),
+        ],
+        cwd=REPO_ROOT,
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{mode} child failed with status {process.returncode}")
+    return usage.ru_maxrss
+
+
+def run_child(mode, runtime_root, homes):
+    """Entry point of the child processes measured by child_peak_rss"""
+    logging.disable(logging.CRITICAL)
+    Config.LOG_FILE = Path(homes).parent / "kde_theme_changer.log"
+    if mode == "single":
+        from app.kde_theme_changer import KDEThemeChanger
+
+        changer = KDEThemeChanger(LATITUDE, LONGITUDE)
+        changer.update_theme()
+        changer.theme_manager.apply_pipeline.shutdown()
+    else:
+        daemon = make_daemon(runtime_root, homes)
+        daemon.refresh_sessions()
+        daemon.update_all()
+        daemon.update_all()
+        daemon.close()
+
+
+def run_benchmarks(user_counts=(1, 10, 50, 200), locations=8, steady_runs=20, rss=True):
+    """Run the benchmark for each number of users, returns a list of result dicts"""
+    results = []
+    for count in user_counts:
+        with FakeKDEEnvironment() as env, patch.object(
+            Config, "CACHE_DIR", env.cache_home
+        ), patch.object(Config, "LOG_FILE", env.log_file):
+            logging.getLogger().setLevel(logging.WARNING)
+            distinct = min(count, locations)
+            add_users(env, count, distinct)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            daemon = make_daemon(env.runtime_root, env.homes)
+            daemon.refresh_sessions()
+            setup_s = time.perf_counter() - start
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            checked, switched, failed = daemon.update_all()
+            switch_s = time.perf_counter() - start
+            if (checked, switched, failed) != (count, count, 0):
+                raise RuntimeError(
+                    f"expected {count} switches, got {(checked, switched, failed)}"
+                )
+
+            samples = []
+            for _ in range(steady_runs):
+                start = time.perf_counter()
+                daemon.update_all()
+                samples.append(time.perf_counter() - start)
+            steady_s = statistics.median(samples)
+            scheduled_locations = len(daemon.schedulers)
+            daemon.close()
+
+            result = {
+                "users": count,
+                "locations": scheduled_locations,
+                "setup_ms": round(setup_s * 1000, 2),
+                "switch_cycle_ms": round(switch_s * 1000, 2),
+                "steady_cycle_ms": round(steady_s * 1000, 3),
+                "steady_per_user_us": round(steady_s * 1e6 / count, 2),
+                "heap_kb": round(heap / 1024, 1),
+                "heap_per_user_kb": round(heap / 1024 / count, 1),
+            }
+
+            if rss:
+                for uid in range(10000, 10000 + count):
+                    env.set_user_theme(uid, "wrong.theme")
+                single = child_peak_rss("single", env.runtime_root, env.homes)
+                multi = child_peak_rss("multi", env.runtime_root, env.homes)
+                result["rss_multi_user_mb"] = round(multi / 1024, 1)
+                result["rss_separate_daemons_mb"] = round(single * count / 1024, 1)
+
+            results.append(result)
+    return results
+
+
+def print_table(results):
+    """Print the results as a table"""
+    columns = list(results[0])
+    print(" ".join(f"{column:>{max(len(column), 8)}}" for column in columns))
+    for result in results:
+        print(
+            " ".join(f"{result[column]:>{max(len(column), 8)}}" for column in columns)
+        )
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:])
+        return 0
+
+    parser = argparse.ArgumentParser(description="Multi-user daemon benchmark")
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="+",
+        default=[1, 10, 50, 200],
+        help="Numbers of synthetic sessions to run (default: 1 10 50 200)",
+    )
+    parser.add_argument(
+        "--locations",
+        type=int,
+        default=8,
+        help="Distinct locations the sessions are spread over (default: 8)",
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument(
+        "--no-rss", action="store_true", help="Skip the child process RSS runs"
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.users, args.locations, rss=not args.no_rss)
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
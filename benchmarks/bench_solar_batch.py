@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized batch sun time engine
+
+Compares app.solar_batch.sun_times_batch against looping astral over the same
+(location, date) pairs. Run from the repository root:
+
+    python3 -m benchmarks.bench_solar_batch
+"""
+
+import sys
+import time
+
+import numpy as np
+from astral import Observer
+from astral.sun import sunrise, sunset
+
+from app.solar_batch import sun_times_batch
+
+SIZES = [10_000, 1_000_000]
+# Looping astral over a million pairs takes minutes; time a sample instead
+ASTRAL_SAMPLE = 10_000
+
+
+def make_pairs(count, seed=0):
+    """Generate random (date, latitude, longitude) arrays"""
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2024-01-01") + rng.integers(0, 3650, count).astype(
+        "timedelta64[D]"
+    )
+    latitudes = rng.uniform(-60.0, 60.0, count)
+    longitudes = rng.uniform(-180.0, 180.0, count)
+    return dates, latitudes, longitudes
+
+
+def time_astral(dates, latitudes, longitudes):
+    """Seconds per pair for the astral loop"""
+    start = time.perf_counter()
+    for day, lat, lon in zip(dates.tolist(), latitudes, longitudes):
+        observer = Observer(lat, lon)
+        try:
+            sunrise(observer, day)
+            sunset(observer, day)
+        except ValueError:
+            pass
+    return (time.perf_counter() - start) / len(dates)
+
+
+def time_batch(dates, latitudes, longitudes):
+    """Seconds for one vectorized pass"""
+    start = time.perf_counter()
+    sun_times_batch(dates, latitudes, longitudes)
+    return time.perf_counter() - start
+
+
+def main():
+    sample = make_pairs(ASTRAL_SAMPLE, seed=1)
+    astral_per_pair = time_astral(*sample)
+
+    print(f"{'pairs':>10} {'astral (s)':>12} {'batch (s)':>10} {'speedup':>9}")
+    for size in SIZES:
+        batch = time_batch(*make_pairs(size))
+        astral = astral_per_pair * size
+        estimated = "*" if size > ASTRAL_SAMPLE else " "
+        print(
+            f"{size:>10} {astral:>11.3f}{estimated} {batch:>10.3f} {astral / batch:>8.0f}x"
+        )
+
+    print(f"* extrapolated from {ASTRAL_SAMPLE} astral calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
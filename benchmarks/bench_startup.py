@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for KDE Theme Auto-Changer
+
+Measures the import time of the application entry point with
+`python -X importtime` and checks it against the tracked budget in
+startup_budget.json. Modules listed as forbidden must not be imported at
+startup at all; they are loaded lazily when a code path needs them.
+
+Imports are timed with compiled bytecode, as an installed copy starts: the
+.pyc files go to a temporary PYTHONPYCACHEPREFIX written by a first, untimed
+import, even where PYTHONDONTWRITEBYTECODE is set.
+
+    python3 -m benchmarks.bench_startup [--runs N]
+
+Exits with status 1 when the budget is exceeded.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BUDGET_FILE = Path(__file__).with_name("startup_budget.json")
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def bytecode_env(pycache_prefix):
+    """Environment that writes and uses .pyc files under pycache_prefix"""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=str(pycache_prefix))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_import(module, env=None):
+    """Return (cumulative import time in ms, imported module names)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+
+    cumulative_us = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name)
+        if name == module:
+            cumulative_us = int(cumulative)
+
+    return cumulative_us / 1000.0, modules
+
+
+def measure_startup(module, runs):
+    """Import module runs times with warm bytecode
+
+    Returns (import times in ms, names of all modules imported).
+    """
+    timings = []
+    imported = set()
+    with tempfile.TemporaryDirectory() as pycache_prefix:
+        env = bytecode_env(pycache_prefix)
+        measure_import(module, env)
+        for _ in range(runs):
+            milliseconds, modules = measure_import(module, env)
+            timings.append(milliseconds)
+            imported |= modules
+    return timings, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Number of cold starts")
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILE.read_text())
+    module = budget["import_module"]
+
+    timings, imported = measure_startup(module, args.runs)
+    median = statistics.median(timings)
+    print(
+        f"import {module}: median {median:.1f} ms, min {min(timings):.1f} ms, "
+        f"max {max(timings):.1f} ms over {args.runs} runs "
+        f"(budget {budget['import_time_ms']} ms)"
+    )
+
+    failed = False
+    if median > budget["import_time_ms"]:
+        print(
+            f"FAIL: import time over budget by {median - budget['import_time_ms']:.1f} ms"
+        )
+        failed = True
+
+    forbidden = sorted(imported & set(budget["forbidden_modules"]))
+    if forbidden:
+        print(f"FAIL: modules imported at startup: {', '.join(forbidden)}")
+        failed = True
+
+    if not failed:
+        print("OK: startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
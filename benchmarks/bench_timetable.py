@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fleet timetable benchmark for KDE Theme Auto-Changer
+
+Generates timetables (see app/timetable.py) for synthetic hosts spread over
+the globe with growing numbers of worker processes, and reports the
+throughput in location-days per second.
+
+    python3 -m benchmarks.bench_timetable [--hosts 200] [--days 400]
+        [--workers 1 2 4] [--output results.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+from app.timetable import Host, generate_timetable
+
+
+def make_hosts(count):
+    """Create hosts on a spiral from 60S to 60N"""
+    return [
+        Host(
+            f"host-{i:05d}", -60 + 120 * i / max(count - 1, 1), (i * 137.5) % 360 - 180
+        )
+        for i in range(count)
+    ]
+
+
+def run_benchmarks(hosts=200, days=400, worker_counts=(1, 2, 4)):
+    """Generate the timetables with each number of workers, returns result dicts"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in worker_counts:
+            stats = generate_timetable(
+                make_hosts(hosts),
+                date.today(),
+                days,
+                jsonl_path=Path(tmp) / "fleet.jsonl",
+                binary_path=Path(tmp) / "fleet.bin",
+                workers=workers,
+            )
+            stats["binary_kb"] = round((Path(tmp) / "fleet.bin").stat().st_size / 1024)
+            stats["jsonl_kb"] = round((Path(tmp) / "fleet.jsonl").stat().st_size / 1024)
+            results.append(stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet timetable benchmark")
+    parser.add_argument("--hosts", type=int, default=200, help="Synthetic hosts")
+    parser.add_argument("--days", type=int, default=400, help="Days per host")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, os.cpu_count() or 1}),
+        help="Worker process counts to run (default: 1, 2 and the CPU count)",
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmarks(args.hosts, args.days, args.workers)
+
+    print(f"{'workers':>8} {'seconds':>9} {'location-days/s':>16} {'binary KiB':>11}")
+    for result in results:
+        print(
+            f"{result['workers']:>8} {result['seconds']:>9.2f} "
+            f"{result['location_days_per_second']:>16.0f} {result['binary_kb']:>11}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
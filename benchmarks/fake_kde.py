@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Fake KDE environment for benchmarks
+
+Creates stub kreadconfig5/kwriteconfig5/lookandfeeltool/notify-send scripts
+that read and write a private kdeglobals, so the theme code paths can be timed
+without a Plasma session. The apply tools record their calls, and look-and-feel
+packages can be installed into a private data directory.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.config import Config
+
+KREADCONFIG5 = """#!/bin/sh
+sed -n 's/^LookAndFeelPackage=//p' "$XDG_CONFIG_HOME/kdeglobals"
+"""
+
+# kwriteconfig5 --file kdeglobals --group KDE --key LookAndFeelPackage THEME
+# sets the theme, other writes are only recorded
+KWRITECONFIG5 = """#!/bin/sh
+if [ "$6" != LookAndFeelPackage ]; then
+    echo "kwriteconfig5 $*" >> "{calls}"
+    exit 0
+fi
+printf '[KDE]\\nLookAndFeelPackage=%s\\n' "$7" > "$XDG_CONFIG_HOME/kdeglobals.tmp"
+mv "$XDG_CONFIG_HOME/kdeglobals.tmp" "$XDG_CONFIG_HOME/kdeglobals"
+"""
+
+# lookandfeeltool, plasma-apply-* and dbus-send
+RECORDING_TOOL = """#!/bin/sh
+echo "$(basename "$0") $*" >> "{calls}"
+"""
+RECORDING_TOOLS = (
+    "lookandfeeltool",
+    "plasma-apply-colorscheme",
+    "plasma-apply-desktoptheme",
+    "plasma-apply-cursortheme",
+    "dbus-send",
+)
+
+BROKEN_TOOL = """#!/bin/sh
+echo "$(basename "$0") failed" >&2
+exit 1
+"""
+
+# contents/defaults of the Breeze look-and-feel packages
+BREEZE_DEFAULTS = """[kdeglobals][KDE]
+widgetStyle=Breeze
+
+[kdeglobals][General]
+ColorScheme=BreezeLight
+
+[kdeglobals][Icons]
+Theme=breeze
+
+[plasmarc][Theme]
+name=default
+
+[Wallpaper]
+Image=Next
+"""
+BREEZE_DARK_DEFAULTS = (
+    BREEZE_DEFAULTS.replace("BreezeLight", "BreezeDark")
+    .replace("name=default", "name=breeze-dark")
+    .replace("Theme=breeze\n", "Theme=breeze-dark\n")
+)
+
+NOTIFY_SEND = """#!/bin/sh
+exit 0
+"""
+
+
+def lookup_user(homes, uid):
+    """pwd.getpwuid() for synthetic users, who all map to the current user"""
+    home = Path(homes) / f"user{uid}"
+    if not home.exists():
+        raise KeyError(uid)
+    return SimpleNamespace(
+        pw_uid=os.geteuid(), pw_gid=os.getegid(), pw_name=home.name, pw_dir=home
+    )
+
+
+class FakeKDEEnvironment:
+    """Temporary PATH, config and cache directories with stub KDE tools"""
+
+    def __init__(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix="kde-bench-")
+        root = Path(self._tmp.name)
+        self.bin_dir = root / "bin"
+        self.config_home = root / "config"
+        self.cache_home = root / "cache"
+        self.config_dirs = root / "xdg"
+        self.log_file = root / "kde_theme_changer.log"
+        self.data_home = root / "data"
+        self.calls_file = root / "calls.log"
+        # Synthetic users for the multi-user daemon
+        self.runtime_root = root / "run"
+        self.homes = root / "home"
+        for directory in (
+            self.bin_dir,
+            self.config_home,
+            self.config_dirs,
+            self.cache_home,
+            self.runtime_root,
+            self.homes,
+            self.data_home,
+        ):
+            directory.mkdir()
+
+        tools = {
+            "kreadconfig5": KREADCONFIG5,
+            "kwriteconfig5": KWRITECONFIG5.replace("{calls}", str(self.calls_file)),
+            "notify-send": NOTIFY_SEND,
+        }
+        for name in RECORDING_TOOLS:
+            tools[name] = RECORDING_TOOL.replace("{calls}", str(self.calls_file))
+        for name, script in tools.items():
+            self._install_tool(name, script)
+
+        self._saved_env = None
+
+    def _install_tool(self, name, script):
+        path = self.bin_dir / name
+        path.write_text(script)
+        path.chmod(0o755)
+
+    def break_tool(self, name):
+        """Make a stub tool fail"""
+        self._install_tool(name, BROKEN_TOOL)
+
+    def calls(self):
+        """Get the recorded tool calls, one "tool args..." string each"""
+        try:
+            return self.calls_file.read_text().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def add_package(self, package, defaults):
+        """Install a look-and-feel package with the given contents/defaults"""
+        contents = self.data_home / "plasma" / "look-and-feel" / package / "contents"
+        contents.mkdir(parents=True, exist_ok=True)
+        (contents / "defaults").write_text(defaults)
+
+    def set_theme(self, theme):
+        """Write the current theme straight into kdeglobals"""
+        path = self.config_home / "kdeglobals"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(f"[KDE]\nLookAndFeelPackage={theme}\n")
+        os.replace(tmp, path)
+
+    def add_user(self, uid, theme, settings=None, bus=True):
+        """Create a logged-in user with a kdeglobals and optional settings"""
+        runtime_dir = self.runtime_root / str(uid)
+        runtime_dir.mkdir()
+        if bus:
+            (runtime_dir / "bus").touch()
+        config_home = self.homes / f"user{uid}" / ".config"
+        config_home.mkdir(parents=True)
+        self.set_user_theme(uid, theme)
+        if settings is not None:
+            path = config_home / Config.USER_SETTINGS_FILE
+            path.write_text(json.dumps(settings))
+
+    def set_user_theme(self, uid, theme):
+        """Write a synthetic user's current theme"""
+        path = self.homes / f"user{uid}" / ".config" / "kdeglobals"
+        path.write_text(f"[KDE]\nLookAndFeelPackage={theme}\n")
+
+    def get_user_theme(self, uid):
+        """Read a synthetic user's current theme"""
+        path = self.homes / f"user{uid}" / ".config" / "kdeglobals"
+        return path.read_text().split("=", 1)[1].strip()
+
+    def lookup_user(self, uid):
+        """pwd.getpwuid() for the synthetic users"""
+        return lookup_user(self.homes, uid)
+
+    def __enter__(self):
+        self._saved_env = dict(os.environ)
+        os.environ["PATH"] = f"{self.bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+        os.environ["XDG_CONFIG_HOME"] = str(self.config_home)
+        os.environ["XDG_CONFIG_DIRS"] = str(self.config_dirs)
+        os.environ["XDG_CACHE_HOME"] = str(self.cache_home)
+        os.environ["XDG_DATA_HOME"] = str(self.data_home)
+        os.environ["XDG_DATA_DIRS"] = str(self.data_home)
+        os.environ.pop("DBUS_SESSION_BUS_ADDRESS", None)
+        return self
+
+    def __exit__(self, *exc_info):
+        os.environ.clear()
+        os.environ.update(self._saved_env)
+        self._tmp.cleanup()
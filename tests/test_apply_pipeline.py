@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for apply_pipeline module
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.apply_pipeline import ApplyPipeline, ApplyStep
+from app.theme_manager import ThemeManager
+
+
+class FakeToolsTestCase(unittest.TestCase):
+    """Base class putting fake executables first on PATH"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.bin = Path(self.tmp.name)
+        self.log = self.bin / "calls.log"
+        path = str(self.bin) + os.pathsep + os.environ.get("PATH", "")
+        env_patch = patch.dict(os.environ, {"PATH": path})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+
+    def make_tool(self, name, sleep=0.0, exit_code=0):
+        """Create a fake executable that logs its arguments"""
+        script = self.bin / name
+        script.write_text(
+            f"#!{sys.executable}\n"
+            "import os, sys, time\n"
+            f"time.sleep({sleep})\n"
+            f"with open({str(self.log)!r}, 'a') as f:\n"
+            "    args = [os.path.basename(sys.argv[0])] + sys.argv[1:]\n"
+            "    f.write(' '.join(args) + '\\n')\n"
+            f"sys.exit({exit_code})\n"
+        )
+        script.chmod(0o755)
+
+    def calls(self):
+        return self.log.read_text().splitlines() if self.log.exists() else []
+
+
+class TestApplyPipeline(FakeToolsTestCase):
+    """Test cases for ApplyPipeline class"""
+
+    def setUp(self):
+        super().setUp()
+        self.pipeline = ApplyPipeline(max_workers=4)
+        self.addCleanup(self.pipeline.shutdown)
+
+    def test_independent_steps_run_in_parallel(self):
+        """Test steps without dependencies overlap"""
+        self.make_tool("slow-a", sleep=0.5)
+        self.make_tool("slow-b", sleep=0.5)
+
+        result = self.pipeline.run(
+            [ApplyStep("a", ["slow-a", "x"]), ApplyStep("b", ["slow-b", "y"])]
+        )
+
+        self.assertTrue(result.ok)
+        self.assertLess(result.duration, 0.9)
+        self.assertEqual(set(result.latencies()), {"a", "b"})
+
+    def test_dependencies_run_in_order(self):
+        """Test a step waits for the step it depends on"""
+        self.make_tool("first", sleep=0.2)
+        self.make_tool("second")
+
+        result = self.pipeline.run(
+            [
+                ApplyStep("first", ["first", "1"]),
+                ApplyStep("second", ["second", "2"], after=["first"]),
+            ]
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual(self.calls(), ["first 1", "second 2"])
+
+    def test_failed_dependency_skips_step(self):
+        """Test a failing step skips its dependents"""
+        self.make_tool("broken", exit_code=1)
+        self.make_tool("second")
+
+        result = self.pipeline.run(
+            [
+                ApplyStep("broken", ["broken", "1"]),
+                ApplyStep("second", ["second", "2"], after=["broken"]),
+            ]
+        )
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.steps[0].returncode, 1)
+        self.assertEqual(result.steps[1].error, "skipped")
+        self.assertEqual(self.calls(), ["broken 1"])
+
+    def test_step_timeout(self):
+        """Test a hanging step is stopped at its timeout"""
+        self.make_tool("hang", sleep=5)
+
+        result = self.pipeline.run([ApplyStep("hang", ["hang", "x"], timeout=0.3)])
+
+        self.assertFalse(result.ok)
+        self.assertIn("timed out", result.steps[0].error)
+        self.assertLess(result.duration, 2)
+
+    def test_missing_executable(self):
+        """Test a missing executable is reported as a failed step"""
+        result = self.pipeline.run([ApplyStep("missing", ["no-such-tool-xyz"])])
+        self.assertEqual(result.steps[0].error, "no-such-tool-xyz not found")
+
+
+class TestThemeManagerApply(FakeToolsTestCase):
+    """Test cases for ThemeManager.set_theme with fake KDE tools"""
+
+    def test_set_theme_does_not_wait_for_notification(self):
+        """Test a slow notify-send does not delay the switch"""
+        self.make_tool("kwriteconfig5")
+        self.make_tool("lookandfeeltool")
+        self.make_tool("notify-send", sleep=1.0)
+        theme_manager = ThemeManager()
+
+        start = time.monotonic()
+        self.assertTrue(theme_manager.set_theme("org.kde.breezedark.desktop"))
+        elapsed = time.monotonic() - start
+        theme_manager.apply_pipeline.shutdown()
+
+        self.assertLess(elapsed, 0.9)
+        calls = self.calls()
+        self.assertEqual(calls[0].split()[0], "kwriteconfig5")
+        self.assertEqual(calls[1], "lookandfeeltool --apply org.kde.breezedark.desktop")
+        self.assertEqual(calls[2].split()[0], "notify-send")
+        self.assertEqual(
+            set(theme_manager.last_apply_result.latencies()),
+            {"kwriteconfig5", "lookandfeeltool"},
+        )
+
+    def test_set_theme_reports_failure(self):
+        """Test a failing lookandfeeltool makes set_theme return False"""
+        self.make_tool("kwriteconfig5")
+        self.make_tool("lookandfeeltool", exit_code=2)
+        theme_manager = ThemeManager()
+
+        self.assertFalse(theme_manager.set_theme("org.kde.breezedark.desktop"))
+        self.assertEqual(theme_manager.last_apply_result.failed[0].returncode, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Tests for async_daemon module
+"""
+
+import asyncio
+import os
+import signal
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+from app.async_daemon import AsyncDaemon
+from app.config import Config
+from app.metrics import MetricsRegistry
+from app.wall_timer import CLOCK_CHANGED, EXPIRED
+
+
+class FakeChanger:
+    """Stand-in for KDEThemeChanger recording what the daemon does"""
+
+    def __init__(self, check_delay=0.0, change_in=3600):
+        self.check_delay = check_delay
+        self.checks = 0
+        # Most checks ever running at once
+        self.running = self.max_running = 0
+        self.reloads = 0
+        self.theme_manager = Mock()
+        self.location_manager = Mock()
+        self.light_sensor = None
+        self.profiler = None
+        # Next theme change an hour away, so only early wakeups cause checks
+        self.location_manager.next_phase_change.side_effect = lambda key, now: (
+            datetime.fromtimestamp(now.timestamp() + change_in, timezone.utc),
+            "civil_dusk",
+        )
+        self.location_manager.detect_location.return_value = None
+
+    def update_theme(self):
+        self.checks += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        time.sleep(self.check_delay)
+        self.running -= 1
+        return True
+
+    def export_metrics(self):
+        pass
+
+    def reload(self):
+        self.reloads += 1
+
+    def force_theme(self, theme):
+        # Checks that were running when the theme was forced
+        self.forced = (theme, self.running)
+
+
+class FakeWallTimer:
+    """WallClockTimer stand-in that fires when told to"""
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        self.deadline = None
+
+    def fileno(self):
+        return self._read_fd
+
+    def arm(self, deadline):
+        self.deadline = deadline
+
+    def disarm(self):
+        self.deadline = None
+
+    def fire(self, result=EXPIRED):
+        os.write(self._write_fd, b"c" if result == CLOCK_CHANGED else b"e")
+
+    def read(self):
+        try:
+            data = os.read(self._read_fd, 1)
+        except BlockingIOError:
+            return None
+        return CLOCK_CHANGED if data == b"c" else EXPIRED
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+async def wait_until(condition, timeout=2.0):
+    """Poll until condition() holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.005)
+
+
+class TestAsyncDaemon(unittest.TestCase):
+    """Test cases for AsyncDaemon"""
+
+    def run_daemon(self, changer, scenario, **options):
+        """Run the daemon while scenario(daemon) drives it"""
+        daemon = AsyncDaemon(changer, **options)
+
+        async def main():
+            task = asyncio.create_task(daemon.run())
+            try:
+                await scenario(daemon)
+            finally:
+                daemon.stop()
+            await asyncio.wait_for(task, 2.0)
+
+        asyncio.run(main())
+        return daemon
+
+    def test_stop_after_first_check(self):
+        """Test that the daemon checks once, then sleeps until stopped"""
+        changer = FakeChanger()
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            await asyncio.sleep(0.05)
+
+        self.run_daemon(changer, scenario)
+        self.assertEqual(changer.checks, 1)
+
+    def test_sigterm_stops(self):
+        """Test that SIGTERM ends the daemon"""
+        changer = FakeChanger()
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            os.kill(os.getpid(), signal.SIGTERM)
+            await wait_until(daemon._stopping.is_set)
+
+        self.run_daemon(changer, scenario)
+
+    def test_sighup_reloads_and_rechecks(self):
+        """Test that SIGHUP reloads the settings and re-checks right away"""
+        changer = FakeChanger()
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            os.kill(os.getpid(), signal.SIGHUP)
+            await wait_until(lambda: changer.checks == 2)
+
+        self.run_daemon(changer, scenario)
+        self.assertEqual(changer.reloads, 1)
+
+    @patch.object(Config, "DEFAULT_CHECK_INTERVAL", 0.01)
+    @patch.object(Config, "UPDATE_TIMEOUT", 0.05)
+    def test_check_timeout_retries(self):
+        """Test that a hanging check times out and is retried"""
+        changer = FakeChanger(check_delay=0.2)
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 2)
+
+        with self.assertLogs("app.async_daemon", level="ERROR") as logs:
+            self.run_daemon(changer, scenario)
+        self.assertIn("timed out", logs.output[0])
+
+    @patch.object(Config, "DEFAULT_CHECK_INTERVAL", 0.01)
+    @patch.object(Config, "UPDATE_TIMEOUT", 0.05)
+    def test_timed_out_check_blocks_others(self):
+        """Test no check runs alongside one that timed out but still runs"""
+        changer = FakeChanger(check_delay=0.3)
+
+        async def scenario(daemon):
+            await wait_until(lambda: daemon._timed_out is not None)
+            self.assertFalse(await daemon.check_now())
+            self.assertFalse(await daemon.reload_now())
+            await wait_until(lambda: changer.checks == 2)
+
+        with self.assertLogs("app.async_daemon", level="INFO") as logs:
+            self.run_daemon(changer, scenario)
+        self.assertEqual(changer.max_running, 1)
+        self.assertEqual(changer.reloads, 0)
+        self.assertTrue(any("still running" in line for line in logs.output))
+
+    def test_cancelled_check_blocks_others(self):
+        """Test a check cancelled by its caller still blocks the next one"""
+        changer = FakeChanger(check_delay=0.3)
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1 and changer.running == 0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(daemon.check_now(), 0.05)
+            self.assertIsNotNone(daemon._timed_out)
+            self.assertFalse(await daemon.check_now())
+            await wait_until(lambda: daemon._timed_out is None)
+
+        with self.assertLogs("app.async_daemon", level="INFO"):
+            self.run_daemon(changer, scenario)
+        self.assertEqual(changer.max_running, 1)
+
+    def test_force_waits_for_running_check(self):
+        """Test a theme is only forced once a running check has finished"""
+        changer = FakeChanger(check_delay=0.2)
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.running == 1)
+            self.assertTrue(await daemon.force_now("dark"))
+
+        self.run_daemon(changer, scenario)
+        self.assertEqual(changer.forced, ("dark", 0))
+        self.assertEqual(changer.checks, 2)
+
+    @patch.object(Config, "LOCATION_REFRESH_INTERVAL", 0.01)
+    def test_location_move_rechecks(self):
+        """Test that a moved location triggers an early check"""
+        changer = FakeChanger()
+        changer.location_manager.detect_location.side_effect = [Mock()] + [None] * 1000
+        changer.location_manager.move_to.return_value = True
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 2)
+
+        self.run_daemon(changer, scenario)
+
+    @patch.object(Config, "LOCATION_REFRESH_INTERVAL", 0.01)
+    def test_location_moves_between_checks(self):
+        """Test a refreshed location is only switched to while no check runs"""
+        changer = FakeChanger(check_delay=0.2)
+        changer.location_manager.detect_location.side_effect = [Mock()] + [None] * 1000
+        moves = []
+        changer.location_manager.move_to.side_effect = lambda location: moves.append(
+            changer.running
+        )
+
+        async def scenario(daemon):
+            await wait_until(lambda: moves)
+
+        self.run_daemon(changer, scenario)
+        self.assertEqual(moves, [0])
+
+    @patch.object(Config, "LOCATION_REFRESH_INTERVAL", 0.01)
+    @patch.object(Config, "API_TIMEOUT", 0.01)
+    def test_timed_out_refresh_is_not_repeated(self):
+        """Test no detection starts while one that timed out still runs"""
+        changer = FakeChanger()
+        active = []  # detections already running when each one started
+        started = []
+
+        def detect_location():
+            started.append(len(active))
+            active.append(True)
+            time.sleep(0.2)
+            active.pop()
+
+        changer.location_manager.detect_location.side_effect = detect_location
+
+        async def scenario(daemon):
+            await wait_until(lambda: len(started) == 2)
+
+        with self.assertLogs("app.async_daemon", level="WARNING"):
+            self.run_daemon(changer, scenario)
+        self.assertEqual(started, [0, 0])
+
+    @patch.object(Config, "LOCATION_REFRESH_INTERVAL", 0.01)
+    def test_slow_refresh_does_not_block_checks(self):
+        """Test that a hanging location refresh does not delay theme checks"""
+        changer = FakeChanger()
+        changer.location_manager.detect_location.side_effect = lambda: time.sleep(0.5)
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            start = time.monotonic()
+            os.kill(os.getpid(), signal.SIGHUP)
+            await wait_until(lambda: changer.checks == 2)
+            self.assertLess(time.monotonic() - start, 0.3)
+
+        self.run_daemon(changer, scenario)
+
+    @patch.object(Config, "TRANSITION_GRACE", 0)
+    def test_wall_timer_wakes_at_transition(self):
+        """Test the daemon wakes on the timerfd at the next theme change"""
+        changer = FakeChanger(change_in=0.05)
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks >= 3)
+            if daemon.wall_timer is None:
+                self.skipTest("timerfd is not available")
+
+        self.run_daemon(changer, scenario)
+
+    def test_clock_change_rechecks(self):
+        """Test a clock change or resume re-checks at once, without waiting"""
+        changer = FakeChanger()
+        timer = FakeWallTimer()
+        self.addCleanup(timer.close)
+        registry = MetricsRegistry()
+
+        async def scenario(daemon):
+            await wait_until(lambda: timer.deadline is not None)
+            self.assertAlmostEqual(timer.deadline, time.time() + 3600, delta=10)
+            timer.fire(CLOCK_CHANGED)
+            await wait_until(lambda: changer.checks == 2)
+
+        with patch("app.async_daemon.metrics", registry):
+            self.run_daemon(changer, scenario, wall_timer=timer)
+        self.assertIn("clock_changes_total 1", registry.to_prometheus())
+
+    def test_injected_clock_sleeps_without_timer(self):
+        """Test a daemon on an injected clock does not use the timerfd"""
+        changer = FakeChanger()
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            self.assertIsNone(daemon.wall_timer)
+
+        self.run_daemon(changer, scenario, clock=lambda: time.time() + 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
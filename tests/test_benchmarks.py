@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Smoke tests for the benchmark suite
+"""
+
+import unittest
+
+from benchmarks import bench_control, bench_multi_user, bench_timetable
+from benchmarks.bench_hot_path import compare, run_benchmarks
+
+
+class TestHotPathBenchmarks(unittest.TestCase):
+    """Test cases keeping the hot path benchmarks runnable"""
+
+    def test_run_and_compare(self):
+        """Test a minimal run produces stats and flags regressions"""
+        results = run_benchmarks(scale=0.001)
+
+        self.assertIn("update_theme_no_switch", results)
+        self.assertIn("set_theme", results)
+        for stats in results.values():
+            self.assertGreater(stats["median_us"], 0)
+
+        baseline = {
+            name: {"median_us": stats["median_us"] / 10}
+            for name, stats in results.items()
+        }
+        self.assertEqual(sorted(compare(results, baseline, 2.0)), sorted(results))
+
+
+class TestMultiUserBenchmark(unittest.TestCase):
+    """Test cases keeping the multi-user benchmark runnable"""
+
+    def test_run(self):
+        """Test a minimal run shares schedules between synthetic users"""
+        results = bench_multi_user.run_benchmarks(
+            user_counts=(4,), locations=2, steady_runs=1, rss=False
+        )
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["users"], 4)
+        self.assertEqual(results[0]["locations"], 2)
+        self.assertGreater(results[0]["heap_kb"], 0)
+
+
+class TestTimetableBenchmark(unittest.TestCase):
+    """Test cases keeping the fleet timetable benchmark runnable"""
+
+    def test_run(self):
+        """Test a minimal run reports throughput in location-days per second"""
+        results = bench_timetable.run_benchmarks(hosts=3, days=5, worker_counts=(1,))
+
+        self.assertEqual(results[0]["location_days"], 15)
+        self.assertGreater(results[0]["location_days_per_second"], 0)
+
+
+class TestControlBenchmark(unittest.TestCase):
+    """Test cases keeping the control socket benchmark runnable"""
+
+    def test_run(self):
+        """Test a minimal run times the socket and the cold run_once"""
+        results = bench_control.run_benchmarks(runs=1, requests=5)
+
+        self.assertEqual(
+            sorted(results),
+            [
+                "ctl_status_process",
+                "run_once_cold",
+                "run_once_via_daemon",
+                "status_round_trip",
+            ],
+        )
+        self.assertLess(
+            results["status_round_trip"]["median_us"],
+            results["run_once_cold"]["median_us"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,11 @@
 Tests for config module
 """
 
+import tempfile
 import unittest
-from app.config import Config
+from pathlib import Path
+
+from app.config import Config, load_user_settings
 
 
 class TestConfig(unittest.TestCase):
@@ -26,5 +29,51 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(Config.DEFAULT_CHECK_INTERVAL, 300)
 
 
+class TestUserSettings(unittest.TestCase):
+    """Test cases for the user settings file"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / Config.USER_SETTINGS_FILE
+
+    def test_missing_file(self):
+        """Test that no settings file means no overrides"""
+        self.assertEqual(load_user_settings(self.tmp.name), {})
+
+    def test_known_keys_only(self):
+        """Test that unknown keys are dropped"""
+        self.path.write_text('{"city": "Vienna", "dark_theme": "x", "colour": "red"}')
+        self.assertEqual(
+            load_user_settings(self.tmp.name), {"city": "Vienna", "dark_theme": "x"}
+        )
+
+    def test_broken_file(self):
+        """Test that a broken settings file is ignored"""
+        for text in ("{not json", "[1, 2]"):
+            self.path.write_text(text)
+            with self.assertLogs("app.config", level="WARNING"):
+                self.assertEqual(load_user_settings(self.tmp.name), {})
+
+    def test_malformed_values(self):
+        """Test that values of the wrong type are dropped, usable ones kept"""
+        self.path.write_text(
+            '{"phase_themes": ["dark"], "latitude": "north", "longitude": "13.4",'
+            ' "city": 7, "light_theme": "", "dark_theme": "x"}'
+        )
+        with self.assertLogs("app.config", level="WARNING") as logs:
+            settings = load_user_settings(self.tmp.name)
+        self.assertEqual(settings, {"longitude": 13.4, "dark_theme": "x"})
+        self.assertEqual(len(logs.output), 4)
+
+    def test_coordinates_in_range(self):
+        """Test that coordinates off the globe are dropped"""
+        self.path.write_text('{"latitude": 91, "longitude": -180, "city": "Quito"}')
+        with self.assertLogs("app.config", level="WARNING"):
+            settings = load_user_settings(self.tmp.name)
+        self.assertEqual(settings, {"longitude": -180.0, "city": "Quito"})
+
+
 if __name__ == "__main__":
     unittest.main()
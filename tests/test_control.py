@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Tests for the control socket (control and control_server modules)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import socket
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.async_daemon import AsyncDaemon
+from app.config import Config
+from app.control import ControlError, format_status, request
+from app.control_server import ControlServer
+from app.kde_theme_changer import KDEThemeChanger, _ask_daemon
+from benchmarks.fake_kde import FakeKDEEnvironment
+
+LIGHT = Config.DEFAULT_LIGHT_THEME
+DARK = Config.DEFAULT_DARK_THEME
+# Midday in Berlin, when the light theme is due
+NOON = datetime(2026, 6, 21, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+class ControlTestCase(unittest.TestCase):
+    """Base class running a daemon with a control socket in a fake KDE environment"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        for target, value in (
+            ("CACHE_DIR", self.env.cache_home),
+            ("LOG_FILE", self.env.log_file),
+        ):
+            config_patch = patch.object(Config, target, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+        self.path = self.env.runtime_root / Config.CONTROL_SOCKET_NAME
+        self.env.set_theme(DARK)
+
+    def make_changer(self):
+        """Create a changer in Berlin at midday"""
+        changer = KDEThemeChanger(52.52, 13.405, clock=lambda: NOON)
+        self.addCleanup(changer.theme_manager.apply_pipeline.shutdown)
+        self.addCleanup(changer.theme_manager.close)
+        return changer
+
+    def ask(self, command, **params):
+        """Send a request from a worker thread, as a separate client would"""
+        return asyncio.to_thread(request, command, self.path, 5, **params)
+
+    def run_daemon(self, scenario):
+        """Run a daemon serving the control socket while scenario(daemon) drives it"""
+        daemon = AsyncDaemon(self.make_changer(), control_socket=self.path)
+
+        async def main():
+            task = asyncio.create_task(daemon.run())
+            try:
+                while daemon.next_check is None:
+                    await asyncio.sleep(0.005)
+                await scenario(daemon)
+            finally:
+                daemon.stop()
+            await asyncio.wait_for(task, 5.0)
+
+        asyncio.run(main())
+        return daemon
+
+    def current_theme(self):
+        return (self.env.config_home / "kdeglobals").read_text().split("=")[1].strip()
+
+
+class TestControlSocket(ControlTestCase):
+    """Test cases for the control commands"""
+
+    def test_status_and_next(self):
+        """Test status and next are answered from the running daemon"""
+
+        async def scenario(daemon):
+            status = await self.ask("status")
+            self.assertEqual(status["current_theme"], LIGHT)
+            self.assertEqual(status["phase"], "day")
+            self.assertEqual(status["location"]["latitude"], 52.52)
+            self.assertFalse(status["paused"])
+            self.assertIsNotNone(status["next_check"])
+            self.assertIn("Theme:     " + LIGHT, format_status(status))
+
+            transitions = await self.ask("next", count=3)
+            self.assertEqual(len(transitions), 3)
+            self.assertGreater(transitions[0]["timestamp"], NOON)
+
+        self.run_daemon(scenario)
+        self.assertFalse(self.path.exists())
+
+    def test_force_and_resume(self):
+        """Test forcing a theme applies it until resume brings back the schedule"""
+
+        async def scenario(daemon):
+            status = await self.ask("force", theme="dark")
+            self.assertEqual(status["current_theme"], DARK)
+            self.assertEqual(status["forced"]["theme"], DARK)
+            self.assertEqual(
+                status["forced"]["until"], status["next_change"]["timestamp"]
+            )
+            self.assertEqual(self.current_theme(), DARK)
+
+            # A scheduled check keeps the forced theme
+            await daemon.check_now()
+            self.assertEqual(self.current_theme(), DARK)
+
+            status = await self.ask("resume")
+            self.assertIsNone(status["forced"])
+            self.assertEqual(self.current_theme(), LIGHT)
+
+        self.run_daemon(scenario)
+
+    def test_pause(self):
+        """Test pause is reported until resume"""
+
+        async def scenario(daemon):
+            self.assertTrue((await self.ask("pause"))["paused"])
+            self.assertTrue(daemon.paused)
+            self.assertFalse((await self.ask("resume"))["paused"])
+
+        self.run_daemon(scenario)
+
+    def test_errors(self):
+        """Test bad requests get an error answer and keep the connection usable"""
+
+        async def scenario(daemon):
+            with self.assertRaisesRegex(ControlError, "Unknown command"):
+                await self.ask("reboot")
+            with self.assertRaisesRegex(ControlError, "needs a theme"):
+                await self.ask("force")
+            with self.assertRaisesRegex(ControlError, "count"):
+                await self.ask("next", count=0)
+
+            reader, writer = await asyncio.open_unix_connection(str(self.path))
+            writer.write(b"not json\n")
+            self.assertIn(b"Invalid request", await reader.readline())
+            writer.write(b'{"command": "status"}\n')
+            self.assertIn(b'"ok": true', await reader.readline())
+            writer.close()
+
+        self.run_daemon(scenario)
+
+    def test_no_daemon(self):
+        """Test the client fails with OSError when no daemon is listening"""
+        with self.assertRaises(OSError):
+            request("status", self.path, 1)
+
+        # A socket left behind by a crashed daemon
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(str(self.path))
+        with self.assertRaises(OSError):
+            request("status", self.path, 1)
+
+    def test_stale_socket_is_replaced(self):
+        """Test a leftover socket is taken over but a live one is left alone"""
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(str(self.path))
+
+        async def scenario(daemon):
+            self.assertEqual((await self.ask("status"))["phase"], "day")
+            second = ControlServer(daemon, self.path)
+            with self.assertLogs("app.control_server", "WARNING"):
+                self.assertFalse(await second.start())
+
+        self.run_daemon(scenario)
+
+
+class TestAskDaemon(ControlTestCase):
+    """Test cases for handing one-shot runs to a running daemon"""
+
+    def one_shot_args(self, **options):
+        """Command line arguments of a one-shot run with the given options"""
+        args = argparse.Namespace(
+            latitude=None,
+            longitude=None,
+            city=None,
+            light_theme=None,
+            dark_theme=None,
+            phase_theme=[],
+            timetable=None,
+            apply_mode=None,
+            light_sensor=False,
+            metrics_file=None,
+            stats_file=None,
+            log_json=False,
+            profile=None,
+            next_transitions=None,
+        )
+        vars(args).update(options)
+        return args
+
+    def test_own_options_run_here(self):
+        """Test runs with options the daemon would ignore are not handed over"""
+
+        def ask_daemon(args):
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                return _ask_daemon(args), out.getvalue()
+
+        async def scenario(daemon):
+            answered, out = await asyncio.to_thread(ask_daemon, self.one_shot_args())
+            self.assertTrue(answered)
+            self.assertIn("checked by the running daemon", out)
+
+            for option, value in (
+                ("apply_mode", "partial"),
+                ("light_sensor", True),
+                ("log_json", True),
+                ("profile", "/tmp/profile"),
+                ("city", "Berlin"),
+            ):
+                args = self.one_shot_args(**{option: value})
+                answered, out = await asyncio.to_thread(ask_daemon, args)
+                self.assertFalse(answered, option)
+                self.assertEqual(out, "")
+
+        runtime_dir = {"XDG_RUNTIME_DIR": str(self.path.parent)}
+        with patch.dict("os.environ", runtime_dir):
+            self.run_daemon(scenario)
+
+
+class TestForcedTheme(ControlTestCase):
+    """Test cases for KDEThemeChanger.force_theme"""
+
+    def test_forced_theme_expires_at_next_change(self):
+        """Test a forced theme gives way to the schedule at the next theme change"""
+        changer = self.make_changer()
+        until = changer.force_theme("dark")
+        self.assertGreater(until, NOON)
+
+        self.assertEqual(changer._target_theme("day", until - 1), DARK)
+        self.assertEqual(changer._target_theme("day", until), LIGHT)
+        self.assertIsNone(changer.forced)
+
+    def test_forced_package_name(self):
+        """Test any theme package can be forced"""
+        changer = self.make_changer()
+        changer.force_theme("org.kde.custom.desktop")
+        self.assertTrue(changer.update_theme())
+        self.assertEqual(self.current_theme(), "org.kde.custom.desktop")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for gazetteer module
+"""
+
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.gazetteer import (
+    City,
+    Gazetteer,
+    _unit_vector,
+    astral_cities,
+    build_gazetteer,
+    normalize,
+    open_gazetteer,
+    read_geonames,
+)
+from app.location_manager import LocationManager
+
+
+def geonames_line(name, aliases, latitude, longitude, country, population, timezone):
+    """Format a line of a GeoNames export, leaving most columns empty"""
+    fields = [""] * 19
+    fields[1], fields[2] = name, normalize(name).title()
+    fields[3], fields[4], fields[5] = aliases, latitude, longitude
+    fields[8], fields[14], fields[17] = country, population, timezone
+    return "\t".join(fields)
+
+
+GEONAMES = "\n".join(
+    geonames_line(*city)
+    for city in (
+        ("Zürich", "Zurigo,Züri", "47.36667", "8.55", "CH", "341730", "Europe/Zurich"),
+        ("London", "Londres", "51.50853", "-0.12574", "GB", "8961989", "Europe/London"),
+        ("London", "", "42.98339", "-81.23304", "CA", "346765", "America/Toronto"),
+        ("Hamlet", "", "10.0", "10.0", "XX", "12", "Africa/Lagos"),
+    )
+)
+
+
+class TestGazetteer(unittest.TestCase):
+    """Test cases for building and searching gazetteer files"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def build(self, cities):
+        path = self.dir / "gazetteer.bin"
+        build_gazetteer(cities, path)
+        gazetteer = Gazetteer(path)
+        self.addCleanup(gazetteer.close)
+        return gazetteer
+
+    def build_geonames(self, min_population=0):
+        source = self.dir / "cities.txt"
+        source.write_text(GEONAMES + "\n", encoding="utf-8")
+        return self.build(read_geonames(source, min_population))
+
+    def test_normalize(self):
+        """Test case, accents, punctuation and spacing are folded"""
+        self.assertEqual(normalize("  São-Paulo "), "sao paulo")
+        self.assertEqual(normalize("St. John's"), "st john s")
+        self.assertEqual(normalize("ZÜRICH"), "zurich")
+
+    def test_lookup_names_and_aliases(self):
+        """Test cities are found by folded names and aliases"""
+        gazetteer = self.build_geonames()
+        for name in ("Zürich", "zurich", "ZURIGO", "Züri"):
+            location = gazetteer.lookup(name)
+            self.assertEqual(location.name, "Zürich")
+            self.assertEqual(location.timezone, "Europe/Zurich")
+        self.assertIsNone(gazetteer.lookup("Zur"))
+        self.assertIsNone(gazetteer.lookup("Atlantis"))
+
+    def test_most_populous_and_region(self):
+        """Test the largest city of a name wins unless a region is given"""
+        gazetteer = self.build_geonames()
+        self.assertEqual(gazetteer.lookup("London").region, "GB")
+        canada = gazetteer.lookup("London, CA")
+        self.assertEqual(canada.timezone, "America/Toronto")
+        self.assertAlmostEqual(canada.latitude, 42.98339)
+        self.assertIsNone(gazetteer.lookup("London, FR"))
+
+    def test_min_population(self):
+        """Test small places can be left out of a GeoNames build"""
+        self.assertEqual(len(self.build_geonames()), 4)
+        self.assertEqual(len(self.build_geonames(min_population=1000)), 3)
+
+    def test_complete(self):
+        """Test prefix search lists each city once"""
+        gazetteer = self.build_geonames()
+        names = [location.region for location in gazetteer.complete("lond")]
+        self.assertEqual(sorted(names), ["CA", "GB"])
+        self.assertEqual(len(gazetteer.complete("l", limit=1)), 1)
+        self.assertEqual(gazetteer.complete(" "), [])
+
+    def test_nearest_matches_brute_force(self):
+        """Test the k-d tree finds the same city as comparing with every city"""
+        cities = astral_cities()
+        gazetteer = self.build(cities)
+        rng = random.Random(7)
+
+        def chord(city, point):
+            other = _unit_vector(city.latitude, city.longitude)
+            return sum((a - b) ** 2 for a, b in zip(point, other))
+
+        for _ in range(300):
+            latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            point = _unit_vector(latitude, longitude)
+            expected = min(cities, key=lambda city: chord(city, point))
+            location, _ = gazetteer.nearest(latitude, longitude)
+            self.assertEqual(
+                (location.latitude, location.longitude),
+                (expected.latitude, expected.longitude),
+            )
+
+    def test_nearest_distance(self):
+        """Test the distance to the nearest city is the great-circle distance"""
+        gazetteer = self.build([City("Null Island", "Atlantic", "UTC", 0.0, 0.0)])
+        location, kilometers = gazetteer.nearest(0.0, 1.0)
+        self.assertEqual(location.name, "Null Island")
+        self.assertAlmostEqual(kilometers, 111.2, places=1)
+
+        empty = self.build([])
+        self.assertIsNone(empty.nearest(0.0, 0.0))
+        self.assertIsNone(empty.lookup("Null Island"))
+
+    def test_bundled_file_is_current(self):
+        """Test the bundled gazetteer matches astral's city list"""
+        path = self.dir / "astral.bin"
+        build_gazetteer(astral_cities(), path)
+        self.assertEqual(path.read_bytes(), Config.GAZETTEER_FILE.read_bytes())
+
+    def test_unreadable_file(self):
+        """Test a missing or corrupt file gives None instead of failing"""
+        self.assertIsNone(open_gazetteer(self.dir / "missing.bin"))
+
+        corrupt = self.dir / "corrupt.bin"
+        corrupt.write_bytes(b"KGAZ" + b"\0" * 40)
+        with self.assertLogs("app.gazetteer", "WARNING"):
+            self.assertIsNone(open_gazetteer(corrupt))
+        with self.assertRaises(ValueError):
+            Gazetteer(corrupt)
+
+
+class TestLocationManagerGazetteer(unittest.TestCase):
+    """Test cases for resolving --city offline"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, value in (
+            ("CACHE_DIR", Path(self.tmp.name)),
+            ("GEOCODING_API", "http://127.0.0.1:9/"),
+            ("PHOTON_API", "http://127.0.0.1:9/"),
+        ):
+            config_patch = patch.object(Config, name, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+
+    def test_city_resolved_offline(self):
+        """Test a known city is taken from the gazetteer without the network"""
+        location_manager = LocationManager(city="berlin")
+
+        self.assertEqual(location_manager.location.name, "Berlin")
+        self.assertEqual(location_manager.location.timezone, "Europe/Berlin")
+        self.assertNotIn("geo_client", vars(location_manager))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Tests for geo_providers module
+"""
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.geo_providers import (
+    GeoClient,
+    Provider,
+    _parse_ip_api,
+    _parse_nominatim,
+)
+from app.location_manager import LocationManager
+
+
+def ip_answer(city, lat, lon):
+    return {
+        "status": "success",
+        "query": "203.0.113.7",
+        "lat": lat,
+        "lon": lon,
+        "city": city,
+        "country": "Somewhere",
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local location API answering after a delay, optionally failing first"""
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, body, delay=0.0, status=200, failures=0):
+        self.body = json.dumps(body).encode("utf-8")
+        self.delay = delay
+        self.status = status
+        self.failures = failures
+        self.requests = 0
+        self.client_ports = set()
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        server.client_ports.add(self.client_address[1])
+        time.sleep(server.delay)
+        status = server.status
+        if server.failures:
+            server.failures -= 1
+            status = 500
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestGeoClient(unittest.TestCase):
+    """Test cases for racing location providers"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.stats_path = Path(self.tmp.name) / "providers.json"
+        for name, value in (
+            ("CACHE_DIR", Path(self.tmp.name)),
+            ("API_TIMEOUT", 3),
+            ("GEO_HEDGE_MIN_DELAY", 0.05),
+            ("GEO_DEFAULT_LATENCY", 0.05),
+        ):
+            config_patch = patch.object(Config, name, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+
+    def serve(self, body, **options):
+        """Start a stub server"""
+        server = StubServer(body, **options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_client(self, *servers, parse=_parse_ip_api):
+        """Create a client with one provider per stub server, in order"""
+        providers = [
+            Provider(f"stub{index}", server.url, parse)
+            for index, server in enumerate(servers)
+        ]
+        client = GeoClient(providers, providers, self.stats_path)
+        self.addCleanup(client.close)
+        return client
+
+    def test_first_valid_answer_wins(self):
+        """Test the fastest provider answers without waiting for the slow one"""
+        slow = self.serve(ip_answer("Slow", 1.0, 1.0), delay=1.0)
+        fast = self.serve(ip_answer("Fast", 2.0, 2.0), delay=0.02)
+        client = self.make_client(slow, fast)
+
+        start = time.monotonic()
+        answer = client.locate_ip()
+
+        self.assertEqual(answer["name"], "Fast")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((slow.requests, fast.requests), (1, 1))
+
+    def test_invalid_answer_is_skipped(self):
+        """Test an error answer loses against a slower valid one"""
+        failing = self.serve({"status": "fail", "message": "reserved range"})
+        valid = self.serve(ip_answer("Valid", 3.0, 3.0), delay=0.1)
+        out_of_range = self.serve(ip_answer("Nowhere", 200.0, 3.0))
+        client = self.make_client(failing, out_of_range, valid)
+
+        self.assertEqual(client.locate_ip()["name"], "Valid")
+        self.assertLess(client.stats["stub0"].success, 1.0)
+        self.assertLess(client.stats["stub1"].success, 1.0)
+
+    @patch.object(Config, "GEO_RACE_WIDTH", 1)
+    def test_hedges_slow_provider(self):
+        """Test the next provider is asked when the first one is unusually slow"""
+        hanging = self.serve(ip_answer("Hanging", 1.0, 1.0), delay=2.0)
+        backup = self.serve(ip_answer("Backup", 4.0, 4.0))
+        client = self.make_client(hanging, backup)
+
+        start = time.monotonic()
+        self.assertEqual(client.locate_ip()["name"], "Backup")
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_failed_provider_is_retried(self):
+        """Test a provider that failed once is asked again"""
+        flaky = self.serve(ip_answer("Flaky", 5.0, 5.0), failures=1)
+        client = self.make_client(flaky)
+
+        self.assertEqual(client.locate_ip()["name"], "Flaky")
+        self.assertEqual(flaky.requests, 2)
+
+    def test_all_failing_gives_none(self):
+        """Test None is returned once every provider has failed twice"""
+        broken = self.serve({}, status=503)
+        client = self.make_client(broken)
+
+        self.assertIsNone(client.locate_ip())
+        self.assertEqual(broken.requests, Config.GEO_MAX_ATTEMPTS)
+
+    def test_ranking_learns_and_persists(self):
+        """Test a failing provider drops behind, also for a new client"""
+        broken = self.serve({}, status=500)
+        working = self.serve(ip_answer("Working", 6.0, 6.0), delay=0.05)
+        client = self.make_client(broken, working)
+        self.assertEqual(client.ranked(client.ip_providers)[0].name, "stub0")
+
+        for _ in range(2):
+            self.assertEqual(client.locate_ip()["name"], "Working")
+        self.assertEqual(client.ranked(client.ip_providers)[0].name, "stub1")
+
+        fresh = self.make_client(broken, working)
+        self.assertEqual(fresh.ranked(fresh.ip_providers)[0].name, "stub1")
+
+    def test_connections_are_reused(self):
+        """Test lookups share one keep-alive connection per provider"""
+        server = self.serve(ip_answer("Pooled", 7.0, 7.0))
+        client = self.make_client(server)
+
+        for _ in range(3):
+            self.assertEqual(client.locate_ip()["name"], "Pooled")
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(len(server.client_ports), 1)
+
+    def test_city_not_found(self):
+        """Test a city nobody knows gives None without counting failures"""
+        empty = self.serve([])
+        client = self.make_client(empty, empty, parse=_parse_nominatim)
+
+        self.assertIsNone(client.geocode("Atlantis"))
+        self.assertEqual(client.stats["stub0"].success, 1.0)
+
+    def test_location_manager_geocodes_through_client(self):
+        """Test LocationManager resolves a city with the built-in providers"""
+        nominatim = self.serve(
+            [{"lat": "48.2082", "lon": "16.3738", "display_name": "Wien, Österreich"}]
+        )
+        with patch.object(Config, "GEOCODING_API", nominatim.url), patch.object(
+            Config, "PHOTON_API", "http://127.0.0.1:9/"
+        ), patch.object(Config, "GAZETTEER_FILE", self.stats_path.with_name("none")):
+            location_manager = LocationManager(city="Vienna")
+            self.addCleanup(location_manager.geo_client.close)
+
+        self.assertEqual(location_manager.location.name, "Vienna")
+        self.assertEqual(location_manager.location.region, "Wien, Österreich")
+        self.assertAlmostEqual(location_manager.location.latitude, 48.2082)
+
+
+if __name__ == "__main__":
+    unittest.main()
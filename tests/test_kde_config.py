@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for kde_config module
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.kde_config import KConfigReader, parse_kconfig
+
+
+class TestParseKConfig(unittest.TestCase):
+    """Test cases for the KDE config parser"""
+
+    def test_groups_and_escapes(self):
+        """Test plain, nested and escaped entries"""
+        entries, _, _ = parse_kconfig(
+            "# comment\n"
+            "[KDE]\n"
+            "LookAndFeelPackage=org.kde.breeze.desktop\n"
+            "Name[de]=Hell\n"
+            "[kdeglobals][General]\n"
+            "ColorScheme = Breeze\\sLight\n"
+        )
+
+        self.assertEqual(
+            entries[("KDE",)], {"LookAndFeelPackage": "org.kde.breeze.desktop"}
+        )
+        self.assertEqual(
+            entries[("kdeglobals", "General")]["ColorScheme"], "Breeze Light"
+        )
+
+    def test_immutable_key_blocks_override(self):
+        """Test a `[$i]` key from a lower file cannot be overridden"""
+        entries, locked, _ = parse_kconfig("[KDE]\nLookAndFeelPackage[$i]=locked\n")
+        entries, _, _ = parse_kconfig(
+            "[KDE]\nLookAndFeelPackage=user\nwidgetStyle=Fusion\n", entries, locked
+        )
+
+        self.assertEqual(entries[("KDE",)]["LookAndFeelPackage"], "locked")
+        self.assertEqual(entries[("KDE",)]["widgetStyle"], "Fusion")
+
+    def test_immutable_group_blocks_override(self):
+        """Test a `[Group][$i]` from a lower file locks every key in it"""
+        entries, locked, _ = parse_kconfig("[KDE][$i]\nLookAndFeelPackage=locked\n")
+        entries, _, _ = parse_kconfig(
+            "[KDE]\nLookAndFeelPackage=user\nwidgetStyle=Fusion\n", entries, locked
+        )
+
+        self.assertEqual(entries[("KDE",)], {"LookAndFeelPackage": "locked"})
+
+    def test_immutable_file(self):
+        """Test a leading `[$i]` marks the whole file immutable"""
+        _, _, file_immutable = parse_kconfig("[$i]\n[KDE]\nLookAndFeelPackage=x\n")
+        self.assertTrue(file_immutable)
+
+
+class TestKConfigReader(unittest.TestCase):
+    """Test cases for KConfigReader class"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        self.home = root / "home"
+        self.system = root / "xdg"
+        self.home.mkdir()
+        self.system.mkdir()
+        (self.system / "kdeglobals").write_text(
+            "[KDE]\nLookAndFeelPackage=org.kde.breeze.desktop\nwidgetStyle=Breeze\n"
+        )
+
+    def make_reader(self):
+        reader = KConfigReader("kdeglobals", str(self.home), [str(self.system)])
+        self.addCleanup(reader.close)
+        return reader
+
+    def write_user(self, text):
+        path = self.home / "kdeglobals"
+        path.write_text(text)
+        # Make sure the change is visible even on coarse mtime filesystems
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_user_overrides_system(self):
+        """Test the user's file overrides the system defaults"""
+        self.write_user("[KDE]\nLookAndFeelPackage=org.kde.breezedark.desktop\n")
+        reader = self.make_reader()
+
+        self.assertEqual(
+            reader.read_entry("KDE", "LookAndFeelPackage"), "org.kde.breezedark.desktop"
+        )
+        self.assertEqual(reader.read_entry("KDE", "widgetStyle"), "Breeze")
+        self.assertIsNone(reader.read_entry("KDE", "missing"))
+
+    def test_cached_until_file_changes(self):
+        """Test the cascade is parsed once and re-parsed after a change"""
+        self.write_user("[KDE]\nLookAndFeelPackage=org.kde.breeze.desktop\n")
+        reader = self.make_reader()
+
+        with patch.object(reader, "_load", wraps=reader._load) as load:
+            reader.read_entry("KDE", "LookAndFeelPackage")
+            reader.read_entry("KDE", "LookAndFeelPackage")
+            self.assertEqual(load.call_count, 1)
+
+            self.write_user("[KDE]\nLookAndFeelPackage=org.kde.breezedark.desktop\n")
+            self.assertEqual(
+                reader.read_entry("KDE", "LookAndFeelPackage"),
+                "org.kde.breezedark.desktop",
+            )
+            self.assertEqual(load.call_count, 2)
+
+    def test_unchanged_files_skip_stat_with_inotify(self):
+        """Test an idle inotify watch answers from cache without stat calls"""
+        reader = self.make_reader()
+        if reader._watch is None:
+            self.skipTest("inotify not available")
+
+        reader.read_entry("KDE", "LookAndFeelPackage")
+        with patch("app.kde_config.os.stat") as stat:
+            reader.read_entry("KDE", "LookAndFeelPackage")
+        stat.assert_not_called()
+
+    def test_fingerprint_cached_with_inotify(self):
+        """Test the fingerprint is reused while idle, shared with the entries"""
+        reader = self.make_reader()
+        if reader._watch is None:
+            self.skipTest("inotify not available")
+
+        fingerprint = reader.fingerprint()
+        with patch("app.kde_config.os.stat") as stat:
+            self.assertIs(reader.fingerprint(), fingerprint)
+        stat.assert_not_called()
+
+        self.write_user("[KDE]\nLookAndFeelPackage=org.kde.breezedark.desktop\n")
+        self.assertNotEqual(reader.fingerprint(), fingerprint)
+        # The fingerprint consumed the change, the entries must still see it
+        self.assertEqual(
+            reader.read_entry("KDE", "LookAndFeelPackage"), "org.kde.breezedark.desktop"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Tests for light_sensor module
+"""
+
+import asyncio
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from app.async_daemon import AsyncDaemon
+from app.config import Config
+from app.control import format_status
+from app.kde_theme_changer import KDEThemeChanger
+from app.light_sensor import LightSensor, open_channels, open_light_sensor
+from app.metrics import MetricsRegistry
+from benchmarks.fake_kde import FakeKDEEnvironment
+from tests.test_async_daemon import FakeChanger, wait_until
+
+LIGHT = Config.DEFAULT_LIGHT_THEME
+DARK = Config.DEFAULT_DARK_THEME
+# Midday in Berlin, when the sun calls for the light theme
+NOON = datetime(2026, 6, 21, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+class FakeSysfsTestCase(unittest.TestCase):
+    """Base class with a fake /sys/bus/iio/devices tree"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        root_patch = patch.object(Config, "LIGHT_SENSOR_ROOT", self.root)
+        root_patch.start()
+        self.addCleanup(root_patch.stop)
+
+    def add_device(self, name, **attributes):
+        """Create an IIO device with the given in_illuminance_* attributes"""
+        device = self.root / name
+        device.mkdir()
+        (device / "name").write_text("als\n")
+        for attribute, value in attributes.items():
+            (device / f"in_illuminance{attribute}").write_text(f"{value}\n")
+        return device
+
+    def set_lux(self, device, lux, attribute="_input"):
+        """Change a reading in place, as the kernel would"""
+        (device / f"in_illuminance{attribute}").write_text(f"{lux}\n")
+
+    def make_sensor(self, **options):
+        sensor = LightSensor(**options)
+        self.addCleanup(sensor.close)
+        return sensor
+
+
+class TestLightSensor(FakeSysfsTestCase):
+    """Test cases for reading and smoothing the sensors"""
+
+    def test_channels(self):
+        """Test processed values are preferred and raw ones scaled"""
+        self.add_device("iio:device0", _input=120, _raw=9999)
+        self.add_device("iio:device1", _raw=200, _scale=0.5, _offset=-20)
+        self.add_device("iio:device2", _ir_raw=500)
+        self.add_device("iio:device3", **{"0_raw": 40, "0_scale": 2, "_scale": 100})
+
+        channels = open_channels(self.root)
+        self.addCleanup(lambda: [channel.close() for channel in channels])
+        self.assertEqual(
+            [channel.path.name for channel in channels],
+            ["in_illuminance_input", "in_illuminance_raw", "in_illuminance0_raw"],
+        )
+        self.assertEqual([channel.read() for channel in channels], [120, 90, 80])
+
+    def test_smoothing_and_hysteresis(self):
+        """Test the level must cross a threshold to turn bright or dark"""
+        device = self.add_device("iio:device0", _input=500)
+        sensor = self.make_sensor(alpha=0.5, dark_below=50, bright_above=200)
+
+        self.assertTrue(sensor.sample())
+        self.assertTrue(sensor.bright)
+        # A short shadow is smoothed away, a dim spell between the thresholds
+        # keeps the decision
+        for lux, expected in ((0, 250), (100, 175), (100, 137.5), (100, 118.75)):
+            self.set_lux(device, lux)
+            self.assertFalse(sensor.sample())
+            self.assertEqual(sensor.lux, expected)
+            self.assertTrue(sensor.bright)
+
+        self.set_lux(device, 0)
+        changes = [sensor.sample() for _ in range(2)]
+        self.assertEqual(changes, [False, True])
+        self.assertFalse(sensor.bright)
+
+    def test_undecided_between_thresholds(self):
+        """Test the sun decides until a threshold is crossed"""
+        self.add_device("iio:device0", _input=100)
+        sensor = self.make_sensor()
+        self.assertFalse(sensor.sample())
+        self.assertEqual(sensor.lux, 100)
+        self.assertIsNone(sensor.bright)
+
+    def test_failure_falls_back_to_the_sun(self):
+        """Test a failing sensor is closed and reopened on a later sample"""
+        device = self.add_device("iio:device0", _input=1000)
+        sensor = self.make_sensor()
+        self.assertTrue(sensor.sample())
+
+        registry = MetricsRegistry()
+        self.set_lux(device, "not a number")
+        with patch("app.light_sensor.metrics", registry), self.assertLogs(
+            "app.light_sensor", "WARNING"
+        ):
+            self.assertTrue(sensor.sample())
+        self.assertIsNone(sensor.bright)
+        self.assertEqual(sensor.channels, [])
+        self.assertIn("light_sensor_errors_total 1", registry.to_prometheus())
+
+        self.set_lux(device, 1000)
+        self.assertTrue(sensor.sample())
+        self.assertTrue(sensor.bright)
+
+    def test_close_waits_for_sample(self):
+        """Test closing from another thread waits for a sample in progress"""
+        self.add_device("iio:device0", _input=1000)
+        sensor = self.make_sensor()
+        channel = sensor.channels[0]
+        reading, release = threading.Event(), threading.Event()
+        read = channel.read
+
+        def slow_read():
+            reading.set()
+            release.wait(2)
+            return read()
+
+        with patch.object(channel, "read", slow_read):
+            sampler = threading.Thread(target=sensor.sample)
+            sampler.start()
+            reading.wait(2)
+            closer = threading.Thread(target=sensor.close)
+            closer.start()
+            closer.join(0.05)
+            self.assertTrue(closer.is_alive())
+            release.set()
+            sampler.join(2)
+            closer.join(2)
+
+        self.assertEqual(sensor.lux, 1000)
+        self.assertEqual(sensor.channels, [])
+
+    def test_no_sensor(self):
+        """Test hosts without a light sensor get None"""
+        self.add_device("iio:device0", _ir_raw=10)
+        with self.assertLogs("app.light_sensor", "WARNING"):
+            self.assertIsNone(open_light_sensor())
+
+
+class TestAmbientThemes(FakeSysfsTestCase):
+    """Test cases for the light sensor deciding the theme"""
+
+    def setUp(self):
+        super().setUp()
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        for target, value in (
+            ("CACHE_DIR", self.env.cache_home),
+            ("LOG_FILE", self.env.log_file),
+        ):
+            config_patch = patch.object(Config, target, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+        self.env.set_theme(LIGHT)
+
+    def current_theme(self):
+        text = (self.env.config_home / "kdeglobals").read_text()
+        return DARK if DARK in text else LIGHT
+
+    def make_changer(self):
+        """Create a changer in Berlin at midday using the light sensor"""
+        changer = KDEThemeChanger(52.52, 13.405, clock=lambda: NOON, light_sensor=True)
+        self.addCleanup(changer.theme_manager.apply_pipeline.shutdown)
+        self.addCleanup(changer.theme_manager.close)
+        if changer.light_sensor is not None:
+            self.addCleanup(changer.light_sensor.close)
+        return changer
+
+    def test_dark_room_at_midday(self):
+        """Test a dark reading overrides the sun"""
+        self.add_device("iio:device0", _input=5)
+        changer = self.make_changer()
+
+        self.assertTrue(changer.update_theme())
+        self.assertEqual(self.current_theme(), DARK)
+        status = changer.status()
+        self.assertEqual(status["scheduled_theme"], LIGHT)
+        self.assertEqual(status["ambient_light"], {"lux": 5, "bright": False})
+        self.assertIn("Light:     5 lux (dark)", format_status(status))
+
+    def test_undecided_follows_the_sun(self):
+        """Test a level between the thresholds leaves the sun in charge"""
+        self.add_device("iio:device0", _input=100)
+        changer = self.make_changer()
+        self.env.set_theme(DARK)
+
+        self.assertTrue(changer.update_theme())
+        self.assertEqual(self.current_theme(), LIGHT)
+
+    def test_daemon_rechecks_when_it_turns_dark(self):
+        """Test the daemon samples periodically and re-checks on a change only"""
+        device = self.add_device("iio:device0", _input=1000)
+        changer = FakeChanger()
+        changer.light_sensor = self.make_sensor(alpha=1.0)
+        changer.light_sensor.sample()
+
+        async def scenario(daemon):
+            await wait_until(lambda: changer.checks == 1)
+            await asyncio.sleep(0.05)
+            self.assertEqual(changer.checks, 1)
+            self.set_lux(device, 0)
+            await wait_until(lambda: changer.checks == 2)
+
+        daemon = AsyncDaemon(changer)
+
+        async def main():
+            task = asyncio.create_task(daemon.run())
+            try:
+                await scenario(daemon)
+            finally:
+                daemon.stop()
+            await asyncio.wait_for(task, 2.0)
+
+        with patch.object(Config, "LIGHT_SENSOR_INTERVAL", 0.005):
+            asyncio.run(main())
+        self.assertFalse(changer.light_sensor.bright)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for location_cache module
+"""
+
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+from astral import LocationInfo
+
+from app.config import Config
+from app.location_cache import LocationCache
+from app.location_manager import LocationManager
+
+LONDON = LocationInfo("London", "UK", "UTC", 51.5074, -0.1278)
+PARIS = LocationInfo("Paris", "France", "UTC", 48.8566, 2.3522)
+
+
+class FakeGeolocationHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the IP geolocation API"""
+
+    response = {
+        "status": "success",
+        "query": "203.0.113.7",
+        "lat": 48.8566,
+        "lon": 2.3522,
+        "city": "Paris",
+        "country": "France",
+    }
+
+    def do_GET(self):
+        body = json.dumps(self.response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLocationCache(unittest.TestCase):
+    """Test cases for LocationCache class"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "locations.json"
+        self.now = [1000.0]
+        self.cache = LocationCache(self.path, max_entries=2, clock=lambda: self.now[0])
+
+    def test_persists_entries(self):
+        """Test entries survive a new cache instance"""
+        self.cache.put("city:london", LONDON, ttl=60)
+        location, is_stale = LocationCache(self.path, clock=lambda: 1010.0).get(
+            "city:london"
+        )
+
+        self.assertEqual(location.name, "London")
+        self.assertAlmostEqual(location.latitude, 51.5074)
+        self.assertFalse(is_stale)
+
+    def test_stale_after_ttl(self):
+        """Test entries are still returned but marked stale after their TTL"""
+        self.cache.put("city:london", LONDON, ttl=60)
+        self.now[0] += 61
+
+        location, is_stale = self.cache.get("city:london")
+
+        self.assertEqual(location.name, "London")
+        self.assertTrue(is_stale)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full"""
+        self.cache.put("city:london", LONDON, ttl=60)
+        self.now[0] += 1
+        self.cache.put("city:paris", PARIS, ttl=60)
+        self.now[0] += 1
+        self.cache.get("city:london")
+        self.now[0] += 1
+        self.cache.put("ip:203.0.113.7", PARIS, ttl=60)
+
+        self.assertIsNone(self.cache.get("city:paris"))
+        self.assertIsNotNone(self.cache.get("city:london"))
+        self.assertEqual(self.cache.most_recent("ip:"), "ip:203.0.113.7")
+
+    def test_lru_order_persists(self):
+        """Test a hit in one run protects the entry from eviction in the next"""
+        self.cache.put("city:london", LONDON, ttl=60)
+        self.now[0] += 1
+        self.cache.put("city:paris", PARIS, ttl=60)
+        self.now[0] += Config.LOCATION_CACHE_TOUCH_INTERVAL
+        cache = LocationCache(self.path, max_entries=2, clock=lambda: self.now[0])
+        self.assertIsNotNone(cache.get("city:london"))
+
+        self.now[0] += 1
+        cache = LocationCache(self.path, max_entries=2, clock=lambda: self.now[0])
+        cache.put("ip:203.0.113.7", PARIS, ttl=60)
+        self.assertIsNone(cache.get("city:paris"))
+        self.assertIsNotNone(cache.get("city:london"))
+
+    def test_malformed_entries_are_dropped(self):
+        """Test entries of older versions or of the wrong type are misses"""
+        self.cache.put("city:london", LONDON, ttl=60)
+        entries = json.loads(self.path.read_text())["entries"]
+        old = {k: v for k, v in entries["city:london"].items() if k != "last_used"}
+        entries.update({"city:old": old, "ip:1": "Paris", "ip:2": None})
+        self.path.write_text(json.dumps({"entries": entries}))
+
+        with self.assertLogs("app.location_cache", "WARNING"):
+            cache = LocationCache(self.path, clock=lambda: self.now[0])
+        for key in ("city:old", "ip:1", "ip:2"):
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.most_recent("ip:"), None)
+        self.assertEqual(cache.most_recent("city:"), "city:london")
+
+        cache.put("city:paris", PARIS, ttl=60)
+        entries = json.loads(self.path.read_text())["entries"]
+        self.assertEqual(sorted(entries), ["city:london", "city:paris"])
+
+    def test_corrupt_file_is_ignored(self):
+        """Test an unreadable cache file starts an empty cache"""
+        self.path.write_text("{not json")
+        self.assertIsNone(LocationCache(self.path).get("city:london"))
+
+
+class TestLocationManagerCache(unittest.TestCase):
+    """Test cases for LocationManager startup from the location cache"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cache_patch = patch.object(Config, "CACHE_DIR", Path(self.tmp.name))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+        self.server = HTTPServer(("127.0.0.1", 0), FakeGeolocationHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = f"http://127.0.0.1:{self.server.server_port}/json/"
+        # The other IP geolocation providers are unreachable
+        for api, value in (
+            ("IP_GEOLOCATION_API", url),
+            ("IPWHOIS_API", "http://127.0.0.1:9/"),
+            ("IPAPI_CO_API", "http://127.0.0.1:9/"),
+        ):
+            api_patch = patch.object(Config, api, value)
+            api_patch.start()
+            self.addCleanup(api_patch.stop)
+
+    def test_fresh_cache_skips_network(self):
+        """Test a fresh cached IP location is used without any request"""
+        LocationCache().put("ip:198.51.100.1", LONDON, ttl=3600)
+
+        with patch.object(LocationManager, "_auto_detect_location") as detect:
+            location_manager = LocationManager()
+
+        detect.assert_not_called()
+        self.assertEqual(location_manager.location.name, "London")
+
+    def test_stale_cache_refreshes_in_background(self):
+        """Test a stale cached location is used, then refreshed from the API"""
+        LocationCache().put("ip:198.51.100.1", LONDON, ttl=-1)
+
+        location_manager = LocationManager()
+        self.assertEqual(location_manager.location.name, "London")
+
+        location_manager._refresh_thread.join(timeout=5)
+        self.assertEqual(location_manager.location.name, "Paris")
+        self.assertEqual(LocationCache().most_recent("ip:"), "ip:203.0.113.7")
+
+    def test_cold_cache_resolves_and_stores(self):
+        """Test an empty cache resolves through the API and stores the result"""
+        location_manager = LocationManager()
+
+        self.assertEqual(location_manager.location.name, "Paris")
+        location, is_stale = LocationCache().get("ip:203.0.113.7")
+        self.assertEqual(location.region, "France")
+        self.assertFalse(is_stale)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Tests for location_manager module
+"""
+
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from astral import LocationInfo
+
+from app.config import Config
+from app.location_manager import LocationManager
+
+
+class TestLocationManager(unittest.TestCase):
+    """Test cases for LocationManager class"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        cache_patch = patch.object(Config, "CACHE_DIR", Path(self.tmp.name))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+        # Los Angeles: the local evening sunset falls on the next UTC date
+        self.location_manager = LocationManager(34.05, -118.24)
+
+    def test_custom_coordinates(self):
+        """Test LocationManager with custom coordinates"""
+        self.assertAlmostEqual(self.location_manager.location.latitude, 34.05)
+        self.assertAlmostEqual(self.location_manager.location.longitude, -118.24)
+
+    @patch("astral.sun.sun")
+    def test_sun_times_come_from_table(self, mock_sun):
+        """Test get_sun_times reads the precomputed table instead of astral"""
+        sunrise, sunset = self.location_manager.get_sun_times(
+            datetime(2024, 6, 1).date()
+        )
+
+        mock_sun.assert_not_called()
+        self.assertLess(sunrise, sunset.replace(day=2))
+        self.assertEqual(sunrise.hour, 12)
+
+    def test_next_transition_is_sunset_during_day(self):
+        """Test next transition during the day is the evening sunset"""
+        now = datetime(2024, 6, 1, 20, 0, tzinfo=timezone.utc)  # 13:00 local
+        when, is_day_after = self.location_manager.get_next_transition(now)
+
+        self.assertFalse(is_day_after)
+        # Sunset is just before 20:00 local, 03:00 UTC on the next date
+        self.assertEqual(when.date().isoformat(), "2024-06-02")
+        self.assertIn(when.hour, (2, 3))
+
+    def test_next_transition_is_sunrise_at_night(self):
+        """Test next transition at night is the following sunrise"""
+        now = datetime(2024, 6, 2, 6, 0, tzinfo=timezone.utc)  # 23:00 local
+        when, is_day_after = self.location_manager.get_next_transition(now)
+
+        self.assertTrue(is_day_after)
+        self.assertGreater(when, now)
+        self.assertEqual(when.date().isoformat(), "2024-06-02")
+        self.assertEqual(when.hour, 12)
+
+    def test_get_phase(self):
+        """Test the sun phase at a few times of a Los Angeles day"""
+        for hour, phase in ((20, "day"), (8, "night"), (3, "civil_dusk")):
+            now = datetime(2024, 6, 1, hour, 0, tzinfo=timezone.utc)
+            self.assertEqual(self.location_manager.get_phase(now), phase)
+
+    def test_next_transitions(self):
+        """Test the upcoming transitions come in time and phase order"""
+        now = datetime(2024, 6, 1, 20, 0, tzinfo=timezone.utc)  # 13:00 local
+
+        transitions = self.location_manager.next_transitions(10, now)
+
+        self.assertEqual(len(transitions), 10)
+        times = [when for when, _ in transitions]
+        self.assertEqual(times, sorted(times))
+        self.assertGreater(times[0], now)
+        self.assertEqual(
+            [phase for _, phase in transitions[:5]],
+            [
+                "evening_golden_hour",
+                "civil_dusk",
+                "nautical_dusk",
+                "astronomical_dusk",
+                "night",
+            ],
+        )
+
+    def test_next_phase_change(self):
+        """Test skipping transitions that keep the theme"""
+        now = datetime(2024, 6, 1, 20, 0, tzinfo=timezone.utc)
+        themes = {"nautical_dusk": "dark"}
+
+        when, phase = self.location_manager.next_phase_change(
+            lambda phase: themes.get(phase, "light"), now
+        )
+
+        self.assertEqual(phase, "nautical_dusk")
+        self.assertEqual(
+            (when, phase), self.location_manager.next_transitions(3, now)[2]
+        )
+
+    def test_fixed_location_is_not_refreshed(self):
+        """Test that given coordinates are never re-detected"""
+        with patch.object(LocationManager, "_auto_detect_location") as mock_detect:
+            self.assertFalse(self.location_manager.refresh_location())
+        mock_detect.assert_not_called()
+
+    def test_zero_coordinate_is_given(self):
+        """Test that a 0.0 coordinate counts as a given location"""
+        with patch.object(LocationManager, "_auto_detect_location") as mock_detect:
+            manager = LocationManager(latitude=51.48, longitude=0.0)
+            self.assertFalse(manager.refresh_location())
+        mock_detect.assert_not_called()
+
+        self.assertEqual(manager.location.name, "Custom")
+        self.assertEqual(manager.location.longitude, 0.0)
+
+    def test_refresh_detected_location(self):
+        """Test that a moved IP location replaces the sun table"""
+        with patch.object(LocationManager, "_setup_location") as mock_setup:
+            mock_setup.return_value = LocationInfo("A", "X", "UTC", 34.05, -118.24)
+            manager = LocationManager()
+
+        moved = LocationInfo("B", "Y", "UTC", 52.52, 13.405)
+        with patch.object(LocationManager, "_auto_detect_location", return_value=moved):
+            self.assertTrue(manager.refresh_location())
+            self.assertFalse(manager.refresh_location())
+
+        self.assertEqual(manager.location.name, "B")
+        self.assertEqual(manager.sun_table.lat_key, 5252)
+
+    def test_injected_clock(self):
+        """Test the current time comes from the injected clock"""
+        noon = datetime(2024, 6, 21, 20, tzinfo=timezone.utc)  # LA local noon
+        manager = LocationManager(34.05, -118.24, clock=noon.timestamp)
+
+        self.assertTrue(manager.is_daylight())
+        self.assertEqual(manager.get_phase(), "day")
+        sunrise, _ = manager.get_sun_times()
+        self.assertEqual(sunrise.date(), noon.date())
+
+        manager.clock = lambda: noon.timestamp() + 12 * 3600
+        self.assertFalse(manager.is_daylight())
+
+    def test_set_location(self):
+        """Test moving to new coordinates switches the sun table"""
+        self.assertTrue(self.location_manager.set_location(52.52, 13.405))
+        self.assertFalse(self.location_manager.set_location(52.52, 13.405))
+        self.assertEqual(self.location_manager.sun_table.lat_key, 5252)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Tests for logging_setup module
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.logging_setup import (
+    CompressingRotatingFileHandler,
+    DroppingQueueHandler,
+    JsonFormatter,
+    setup_logging,
+    stop_logging,
+)
+from app.metrics import MetricsRegistry
+
+
+def make_record(message, *args, level=logging.INFO):
+    return logging.LogRecord("app.test", level, __file__, 1, message, args, None)
+
+
+class TestLogging(unittest.TestCase):
+    """Test cases for the queued, rotating log setup"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.log_file = Path(self.tmp.name) / "test.log"
+
+    def test_size_rotation_compresses(self):
+        """Test full log files are rotated into numbered gzip files"""
+        handler = CompressingRotatingFileHandler(self.log_file, 200, 2)
+        self.addCleanup(handler.close)
+
+        for i in range(30):
+            handler.handle(make_record("line %d of the log", i))
+
+        rotated = sorted(path.name for path in Path(self.tmp.name).iterdir())
+        self.assertEqual(rotated, ["test.log", "test.log.1.gz", "test.log.2.gz"])
+        with gzip.open(self.log_file.with_name("test.log.1.gz"), "rt") as f:
+            self.assertIn("line", f.read())
+        self.assertLessEqual(self.log_file.stat().st_size, 200)
+
+    def test_age_rotation(self):
+        """Test the log file is rotated once it is older than max_age"""
+        handler = CompressingRotatingFileHandler(self.log_file, 0, 1, max_age=60)
+        self.addCleanup(handler.close)
+        handler.handle(make_record("first"))
+
+        with patch("app.logging_setup.time.time", return_value=handler.rollover_at):
+            handler.handle(make_record("second"))
+
+        self.assertTrue(self.log_file.with_name("test.log.1.gz").exists())
+        self.assertEqual(self.log_file.read_text().strip(), "second")
+
+    def test_age_counts_from_last_rotation(self):
+        """Test a restarted writer keeps the age of the current log file"""
+        self.log_file.write_text("old\n")
+        newest = self.log_file.with_name("test.log.1.gz")
+        newest.write_bytes(gzip.compress(b"older\n"))
+        rotated_at = time.time() - 3600
+        os.utime(newest, (rotated_at, rotated_at))
+
+        handler = CompressingRotatingFileHandler(self.log_file, 0, 2, max_age=7200)
+        self.addCleanup(handler.close)
+        self.assertAlmostEqual(handler.rollover_at, rotated_at + 7200, places=3)
+
+        handler.max_age = 60
+        handler.rollover_at = handler.file_started() + handler.max_age
+        handler.handle(make_record("new"))
+        self.assertTrue(self.log_file.with_name("test.log.2.gz").exists())
+        self.assertEqual(self.log_file.read_text().strip(), "new")
+
+    def test_never_rotated_log_counts_as_old(self):
+        """Test a log file of unknown age is rotated, a new one is not"""
+        handler = CompressingRotatingFileHandler(self.log_file, 0, 1, max_age=60)
+        self.addCleanup(handler.close)
+        self.assertGreater(handler.rollover_at, time.time())
+
+        self.log_file.write_text("from an earlier run\n")
+        handler = CompressingRotatingFileHandler(self.log_file, 0, 1, max_age=60)
+        self.addCleanup(handler.close)
+        handler.handle(make_record("first"))
+        self.assertTrue(self.log_file.with_name("test.log.1.gz").exists())
+
+    def test_json_format(self):
+        """Test JSON records carry the level, logger and merged message"""
+        entry = json.loads(JsonFormatter().format(make_record("a %s b", "x")))
+
+        self.assertEqual(entry["message"], "a x b")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "app.test")
+        self.assertIn("time", entry)
+
+    def test_json_exception_through_queue(self):
+        """Test tracebacks logged through the queue fill the JSON exception field"""
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+
+        with patch.object(root, "handlers", []), patch.object(
+            Config, "LOG_MAX_AGE", None
+        ), patch("sys.stderr", io.StringIO()):
+            setup_logging(json_format=True, log_file=self.log_file)
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logging.getLogger("app.test").exception("failed %s", "here")
+            stop_logging()
+
+        entry = json.loads(self.log_file.read_text())
+        self.assertEqual(entry["message"], "failed here")
+        self.assertIn("ZeroDivisionError: division by zero", entry["exception"])
+
+    def test_text_exception_through_queue(self):
+        """Test the text log still ends a record with its traceback"""
+        handler = DroppingQueueHandler(queue.Queue())
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            record = make_record("failed")
+            record.exc_info = sys.exc_info()
+        prepared = handler.prepare(record)
+
+        self.assertIsNone(prepared.exc_info)
+        text = logging.Formatter(Config.LOG_FORMAT).format(prepared)
+        self.assertTrue(text.endswith("ZeroDivisionError: division by zero"))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test records are dropped and counted when the writer falls behind"""
+        registry = MetricsRegistry()
+        handler = DroppingQueueHandler(queue.Queue(1))
+
+        with patch("app.logging_setup.metrics", registry):
+            for i in range(3):
+                handler.handle(make_record("record %d", i))
+
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertIn("log_records_dropped_total 2", registry.to_prometheus())
+
+    def test_one_shot_follows_daemon_rotation(self):
+        """Test a one-shot run appends without rotating, into the current file"""
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+        daemon = CompressingRotatingFileHandler(self.log_file, 0, 2)
+        self.addCleanup(daemon.close)
+        daemon.handle(make_record("daemon started"))
+
+        with patch.object(root, "handlers", []), patch.object(
+            Config, "LOG_MAX_BYTES", 1
+        ), patch("sys.stderr", io.StringIO()):
+            listener = setup_logging(log_file=self.log_file)
+            logging.getLogger("app.test").info("one-shot before")
+            listener.queue.join()
+            daemon.doRollover()
+            logging.getLogger("app.test").info("one-shot after")
+            stop_logging()
+
+        self.assertEqual(
+            sorted(path.name for path in Path(self.tmp.name).iterdir()),
+            ["test.log", "test.log.1.gz"],
+        )
+        self.assertIn("one-shot after", self.log_file.read_text())
+        with gzip.open(self.log_file.with_name("test.log.1.gz"), "rt") as f:
+            self.assertIn("one-shot before", f.read())
+
+    def test_verbose_survives_later_setup(self):
+        """Test a later default setup does not lower the --verbose level"""
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+
+        with patch.object(root, "handlers", []), patch.object(
+            Config, "LOG_MAX_AGE", None
+        ):
+            self.assertIsNotNone(setup_logging(verbose=True, log_file=self.log_file))
+            self.assertIsNone(setup_logging())
+            self.assertEqual(root.level, logging.DEBUG)
+
+            logging.getLogger("app.test").debug("lazy %s", "message")
+            stop_logging()
+            self.assertEqual(root.handlers, [])
+
+        self.assertIn("DEBUG - lazy message", self.log_file.read_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tests for look_and_feel module and the partial apply mode
+"""
+
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.look_and_feel import (
+    package_dirs,
+    read_defaults,
+    settings_delta,
+)
+from app.metrics import MetricsRegistry
+from app.theme_manager import ThemeManager
+from benchmarks.fake_kde import (
+    BREEZE_DARK_DEFAULTS,
+    BREEZE_DEFAULTS,
+    FakeKDEEnvironment,
+)
+
+LIGHT = Config.DEFAULT_LIGHT_THEME
+DARK = Config.DEFAULT_DARK_THEME
+
+
+class LookAndFeelTestCase(unittest.TestCase):
+    """Base class with Breeze and Breeze Dark installed in a fake KDE environment"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.env.add_package(LIGHT, BREEZE_DEFAULTS)
+        self.env.add_package(DARK, BREEZE_DARK_DEFAULTS)
+        self.env.set_theme(LIGHT)
+        self.directories = package_dirs()
+
+
+class TestSettingsDelta(LookAndFeelTestCase):
+    """Test cases for comparing look-and-feel packages"""
+
+    def test_package_dirs(self):
+        """Test the user's packages come before the system's"""
+        dirs = package_dirs(home="/home/ann", env={})
+        self.assertEqual(
+            dirs,
+            [
+                Path("/home/ann/.local/share/plasma/look-and-feel"),
+                Path("/usr/local/share/plasma/look-and-feel"),
+                Path("/usr/share/plasma/look-and-feel"),
+            ],
+        )
+
+    def test_read_defaults(self):
+        """Test package settings are keyed by file, group and key"""
+        defaults = read_defaults(DARK, self.directories)
+        self.assertEqual(
+            defaults[("kdeglobals", "General", "ColorScheme")], "BreezeDark"
+        )
+        self.assertEqual(defaults[("Wallpaper", "Image")], "Next")
+        self.assertIsNone(read_defaults("org.example.missing", self.directories))
+
+    def test_breeze_to_breeze_dark(self):
+        """Test only the differing colors, icons and desktop theme are planned"""
+        delta = settings_delta(
+            read_defaults(LIGHT, self.directories),
+            read_defaults(DARK, self.directories),
+        )
+        self.assertEqual(
+            delta,
+            {
+                ("kdeglobals", "General", "ColorScheme"): "BreezeDark",
+                ("kdeglobals", "Icons", "Theme"): "breeze-dark",
+                ("plasmarc", "Theme", "name"): "breeze-dark",
+            },
+        )
+
+    def test_structural_differences(self):
+        """Test other differing or missing settings need a full apply"""
+        light = read_defaults(LIGHT, self.directories)
+        wallpaper = {**light, ("Wallpaper", "Image"): "Mountain"}
+        missing = {k: v for k, v in light.items() if k[-1] != "widgetStyle"}
+
+        self.assertIsNone(settings_delta(light, wallpaper))
+        self.assertIsNone(settings_delta(light, missing))
+        self.assertIsNone(settings_delta(None, light))
+        self.assertEqual(
+            settings_delta(missing, light),
+            {("kdeglobals", "KDE", "widgetStyle"): "Breeze"},
+        )
+
+
+class TestPartialApply(LookAndFeelTestCase):
+    """Test cases for ThemeManager.set_theme in the partial apply mode"""
+
+    def setUp(self):
+        super().setUp()
+        self.registry = MetricsRegistry()
+        metrics_patch = patch("app.theme_manager.metrics", self.registry)
+        metrics_patch.start()
+        self.addCleanup(metrics_patch.stop)
+        self.manager = self.make_manager("partial")
+
+    def make_manager(self, apply_mode):
+        manager = ThemeManager(apply_mode=apply_mode)
+        self.addCleanup(manager.apply_pipeline.shutdown)
+        self.addCleanup(manager.close)
+        return manager
+
+    def apply_count(self, mode):
+        histogram = self.registry.to_dict()["histograms"].get(
+            f'apply_seconds{{mode="{mode}"}}'
+        )
+        return histogram["count"] if histogram else 0
+
+    def test_applies_only_the_delta(self):
+        """Test switching to Breeze Dark skips lookandfeeltool"""
+        self.assertTrue(self.manager.set_theme(DARK))
+
+        self.assertEqual(self.manager.last_apply_mode, "partial")
+        self.assertEqual(self.manager.get_current_theme(), DARK)
+        calls = self.env.calls()
+        self.assertIn("plasma-apply-colorscheme BreezeDark", calls)
+        self.assertIn("plasma-apply-desktoptheme breeze-dark", calls)
+        self.assertIn(
+            "kwriteconfig5 --file kdeglobals --group Icons --key Theme breeze-dark",
+            calls,
+        )
+        # The icon theme write is announced as IconChanged
+        self.assertIn(
+            "dbus-send --session --type=signal /KGlobalSettings "
+            "org.kde.KGlobalSettings.notifyChange int32:4 int32:0",
+            calls,
+        )
+        self.assertFalse(any(call.startswith("lookandfeeltool") for call in calls))
+        self.assertEqual(self.apply_count("partial"), 1)
+
+    def test_structural_change_applies_in_full(self):
+        """Test a package differing beyond colors and styles gets lookandfeeltool"""
+        self.env.add_package(
+            DARK, BREEZE_DARK_DEFAULTS.replace("Image=Next", "Image=Mountain")
+        )
+
+        self.assertTrue(self.manager.set_theme(DARK))
+
+        self.assertEqual(self.manager.last_apply_mode, "full")
+        self.assertEqual(self.env.calls(), [f"lookandfeeltool --apply {DARK}"])
+        counters = self.registry.to_dict()["counters"]
+        self.assertEqual(counters['apply_fallbacks_total{reason="structural"}'], 1)
+        self.assertEqual(self.apply_count("full"), 1)
+
+    def test_unknown_package_applies_in_full(self):
+        """Test a package that is not installed gets lookandfeeltool"""
+        self.assertTrue(self.manager.set_theme("org.example.desktop"))
+        self.assertEqual(self.manager.last_apply_mode, "full")
+
+    def test_failed_partial_apply_falls_back(self):
+        """Test a failing Plasma tool is followed by a full apply"""
+        self.env.break_tool("plasma-apply-colorscheme")
+
+        with self.assertLogs("app.theme_manager", "WARNING"):
+            self.assertTrue(self.manager.set_theme(DARK))
+
+        self.assertEqual(self.manager.last_apply_mode, "full")
+        self.assertIn(f"lookandfeeltool --apply {DARK}", self.env.calls())
+        counters = self.registry.to_dict()["counters"]
+        self.assertEqual(counters['apply_fallbacks_total{reason="failed"}'], 1)
+
+    def test_full_mode_is_default(self):
+        """Test the full apply stays the default"""
+        manager = self.make_manager(None)
+        self.assertEqual(manager.apply_mode, "full")
+        self.assertTrue(manager.set_theme(DARK))
+        self.assertEqual(self.env.calls(), [f"lookandfeeltool --apply {DARK}"])
+
+        with self.assertLogs("app.theme_manager", "WARNING"):
+            self.assertEqual(self.make_manager("fastest").apply_mode, "full")
+
+
+if __name__ == "__main__":
+    unittest.main()
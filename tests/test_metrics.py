@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Tests for metrics module
+"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.kde_theme_changer import KDEThemeChanger
+from app.metrics import PREFIX, Histogram, MetricsRegistry
+from benchmarks.fake_kde import FakeKDEEnvironment
+
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for Histogram"""
+
+    def test_observe_is_cumulative(self):
+        """Test that each bucket counts values up to its bound"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [1, 2])
+        self.assertEqual(histogram.count, 3)
+        self.assertAlmostEqual(histogram.sum, 5.55)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.registry = MetricsRegistry()
+
+    def test_counters_by_label(self):
+        """Test that counters are kept per label set"""
+        self.registry.inc("checks_total")
+        self.registry.inc("checks_total", 2)
+        self.registry.inc("location_cache_total", result="hit")
+
+        counters = self.registry.to_dict()["counters"]
+        self.assertEqual(counters["checks_total"], 3)
+        self.assertEqual(counters['location_cache_total{result="hit"}'], 1)
+
+    def test_timer_labels_added_late(self):
+        """Test that the timer records labels set inside the block"""
+        with self.registry.timer("sun_times_seconds") as labels:
+            labels["source"] = "table"
+
+        histograms = self.registry.to_dict()["histograms"]
+        self.assertEqual(histograms['sun_times_seconds{source="table"}']["count"], 1)
+
+    def test_timer_records_on_exception(self):
+        """Test that the timer still records when the block raises"""
+        with self.assertRaises(RuntimeError):
+            with self.registry.timer("update_seconds"):
+                raise RuntimeError("boom")
+
+        self.assertEqual(
+            self.registry.to_dict()["histograms"]["update_seconds"]["count"], 1
+        )
+
+    def test_prometheus_format(self):
+        """Test the text exposition output"""
+        self.registry.inc("switches_total")
+        self.registry.set("last_switch_timestamp_seconds", 1700000000)
+        self.registry.observe("apply_step_seconds", 0.2, step="lookandfeeltool")
+
+        text = self.registry.to_prometheus()
+        lines = text.splitlines()
+        self.assertIn(f"# TYPE {PREFIX}switches_total counter", lines)
+        self.assertIn(f"{PREFIX}switches_total 1", lines)
+        self.assertIn(f"# TYPE {PREFIX}last_switch_timestamp_seconds gauge", lines)
+        self.assertIn(f"# TYPE {PREFIX}apply_step_seconds histogram", lines)
+        self.assertIn(
+            f'{PREFIX}apply_step_seconds_bucket{{step="lookandfeeltool",le="0.1"}} 0',
+            lines,
+        )
+        self.assertIn(
+            f'{PREFIX}apply_step_seconds_bucket{{step="lookandfeeltool",le="0.5"}} 1',
+            lines,
+        )
+        self.assertIn(
+            f'{PREFIX}apply_step_seconds_bucket{{step="lookandfeeltool",le="+Inf"}} 1',
+            lines,
+        )
+        self.assertIn(
+            f'{PREFIX}apply_step_seconds_count{{step="lookandfeeltool"}} 1', lines
+        )
+        self.assertTrue(text.endswith("\n"))
+
+    def test_label_values_escaped(self):
+        """Test that quotes in label values are escaped"""
+        self.registry.inc("http_failures_total", api='a"b')
+        self.assertIn('api="a\\"b"', self.registry.to_prometheus())
+
+    def test_write_files(self):
+        """Test writing the textfile and the JSON dump"""
+        self.registry.inc("checks_total")
+        self.registry.observe("update_seconds", 0.01)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            prom = Path(tmp) / "kde_theme_changer.prom"
+            stats = Path(tmp) / "stats.json"
+            self.registry.write_textfile(prom)
+            self.registry.write_json(stats)
+
+            self.assertIn(f"{PREFIX}checks_total 1", prom.read_text())
+            data = json.loads(stats.read_text())
+            self.assertEqual(data["counters"]["checks_total"], 1)
+            self.assertAlmostEqual(data["histograms"]["update_seconds"]["mean"], 0.01)
+            self.assertIn("generated_at", data)
+
+    def test_reset(self):
+        """Test that reset drops all values"""
+        self.registry.inc("checks_total")
+        self.registry.reset()
+        self.assertEqual(self.registry.to_prometheus(), "\n")
+
+
+class TestLookupTiming(unittest.TestCase):
+    """Test cases for timing the per-call lookups"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.env.set_theme(Config.DEFAULT_LIGHT_THEME)
+        self.registry = MetricsRegistry()
+        for target in (
+            "app.kde_theme_changer.metrics",
+            "app.location_manager.metrics",
+            "app.theme_manager.metrics",
+        ):
+            metrics_patch = patch(target, self.registry)
+            metrics_patch.start()
+            self.addCleanup(metrics_patch.stop)
+        for target, value in (
+            ("CACHE_DIR", self.env.cache_home),
+            ("LOG_FILE", self.env.log_file),
+        ):
+            config_patch = patch.object(Config, target, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+
+    def make_changer(self, **options):
+        changer = KDEThemeChanger(52.52, 13.405, **options)
+        self.addCleanup(changer.theme_manager.apply_pipeline.shutdown)
+        self.addCleanup(changer.theme_manager.close)
+        return changer
+
+    def lookup(self, changer):
+        changer.location_manager.get_sun_times()
+        changer.theme_manager.get_current_theme()
+        return sorted(self.registry.to_dict()["histograms"])
+
+    def test_untimed_without_export(self):
+        """Test lookups are not timed when no metrics are written"""
+        changer = self.make_changer()
+        self.assertFalse(self.registry.time_lookups)
+        self.assertEqual(self.lookup(changer), [])
+
+    def test_timed_with_export(self):
+        """Test lookups are timed by source when the metrics are written"""
+        metrics_file = Path(self.env.cache_home) / "metrics.prom"
+        changer = self.make_changer(metrics_file=metrics_file)
+        self.assertTrue(self.registry.time_lookups)
+        self.assertEqual(
+            self.lookup(changer),
+            [
+                'current_theme_seconds{source="kdeglobals"}',
+                'sun_times_seconds{source="table"}',
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
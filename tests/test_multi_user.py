@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests for multi_user module
+"""
+
+import shutil
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.location_manager import LocationManager
+from app.multi_user import MultiUserDaemon, discover_sessions
+from benchmarks.fake_kde import FakeKDEEnvironment
+
+LIGHT = Config.DEFAULT_LIGHT_THEME
+DARK = Config.DEFAULT_DARK_THEME
+
+
+class MultiUserTestCase(unittest.TestCase):
+    """Base class with synthetic users in a fake KDE environment"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        self.runtime_root = self.env.runtime_root
+        self.homes = self.env.homes
+        for target, value in (
+            ("CACHE_DIR", self.env.cache_home),
+            ("LOG_FILE", self.env.log_file),
+        ):
+            config_patch = patch.object(Config, target, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+
+    def make_daemon(self):
+        """Create a daemon over the fake sessions"""
+        daemon = MultiUserDaemon(
+            52.52,
+            13.405,
+            runtime_root=self.runtime_root,
+            lookup_user=self.env.lookup_user,
+            max_workers=2,
+        )
+        self.addCleanup(daemon.close)
+        return daemon
+
+
+class TestDiscoverSessions(MultiUserTestCase):
+    """Test cases for session discovery"""
+
+    def test_only_plasma_sessions(self):
+        """Test that only users with a bus and a kdeglobals are found"""
+        self.env.add_user(1001, DARK)
+        self.env.add_user(1002, DARK, bus=False)
+        (self.runtime_root / "1003").mkdir()  # no such user
+        (self.runtime_root / "1003" / "bus").touch()
+        (self.runtime_root / "1004").mkdir()  # no kdeglobals
+        (self.runtime_root / "1004" / "bus").touch()
+        (self.homes / "user1004").mkdir()
+        (self.runtime_root / "systemd").mkdir()
+
+        sessions = discover_sessions(self.runtime_root, self.env.lookup_user)
+
+        self.assertEqual([session.name for session in sessions], ["user1001"])
+        session = sessions[0]
+        self.assertIsNone(session.user)
+        self.assertEqual(
+            session.env["XDG_CONFIG_HOME"], str(self.homes / "user1001" / ".config")
+        )
+        self.assertEqual(
+            session.env["DBUS_SESSION_BUS_ADDRESS"],
+            f"unix:path={self.runtime_root / '1001' / 'bus'}",
+        )
+
+    def test_missing_runtime_root(self):
+        """Test that a missing runtime root means no sessions"""
+        self.assertEqual(discover_sessions(self.runtime_root / "missing"), [])
+
+    def test_invalid_settings_ignored(self):
+        """Test that broken per-user settings fall back to the defaults"""
+        self.env.add_user(1001, DARK)
+        config = self.homes / "user1001" / ".config" / Config.USER_SETTINGS_FILE
+        config.write_text("{not json")
+
+        session = discover_sessions(self.runtime_root, self.env.lookup_user)[0]
+        self.assertEqual(session.load_settings(), {})
+
+
+class TestMultiUserDaemon(MultiUserTestCase):
+    """Test cases for MultiUserDaemon"""
+
+    def test_sessions_share_locations(self):
+        """Test that users at the same place share one schedule"""
+        self.env.add_user(1001, DARK)
+        self.env.add_user(
+            1002, DARK, settings={"latitude": 52.521, "longitude": 13.404}
+        )
+        self.env.add_user(1003, DARK, settings={"latitude": 48.14, "longitude": 11.58})
+        daemon = self.make_daemon()
+
+        daemon.refresh_sessions()
+
+        self.assertEqual(len(daemon.sessions), 3)
+        self.assertEqual(len(daemon.schedulers), 2)
+        managers = {
+            state.session.name: state.location_manager
+            for state in daemon.sessions.values()
+        }
+        self.assertIs(managers["user1001"], managers["user1002"])
+        self.assertIsNot(managers["user1001"], managers["user1003"])
+
+    def test_ended_sessions_dropped(self):
+        """Test that logging out drops the session and its unused schedule"""
+        self.env.add_user(1001, DARK)
+        self.env.add_user(1003, DARK, settings={"latitude": 48.14, "longitude": 11.58})
+        daemon = self.make_daemon()
+        daemon.refresh_sessions()
+
+        shutil.rmtree(self.runtime_root / "1003")
+        daemon.refresh_sessions()
+
+        self.assertEqual(
+            [state.session.name for state in daemon.sessions.values()], ["user1001"]
+        )
+        self.assertEqual(len(daemon.schedulers), 1)
+
+    @patch.object(LocationManager, "get_phase", return_value="day")
+    def test_update_all_switches_wrong_sessions(self, mock_phase):
+        """Test that only sessions with the wrong theme are switched"""
+        self.env.add_user(1001, theme=DARK)
+        self.env.add_user(1002, theme=LIGHT)
+        self.env.add_user(1003, theme=LIGHT, settings={"light_theme": "custom.light"})
+        daemon = self.make_daemon()
+        daemon.refresh_sessions()
+
+        self.assertEqual(daemon.update_all(), (3, 2, 0))
+        self.assertEqual(self.env.get_user_theme(1001), LIGHT)
+        self.assertEqual(self.env.get_user_theme(1002), LIGHT)
+        self.assertEqual(self.env.get_user_theme(1003), "custom.light")
+        # The phase is worked out once per location, not per session
+        self.assertEqual(mock_phase.call_count, 1)
+
+        self.assertEqual(daemon.update_all(), (3, 0, 0))
+
+    def test_malformed_settings(self):
+        """Test that settings of the wrong type fall back to the defaults"""
+        self.env.add_user(1001, DARK, settings={"phase_themes": ["dark"]})
+        self.env.add_user(1002, DARK, settings={"latitude": "north", "longitude": 1})
+        daemon = self.make_daemon()
+
+        with self.assertLogs("app.config", "WARNING"):
+            daemon.refresh_sessions()
+
+        self.assertEqual(len(daemon.sessions), 2)
+        self.assertEqual(len(daemon.schedulers), 1)
+
+    def test_broken_session_skipped(self):
+        """Test that a session failing to set up does not stop the others"""
+        self.env.add_user(1001, DARK)
+        self.env.add_user(1002, DARK, settings={"city": "Munich"})
+        daemon = self.make_daemon()
+        location_for = daemon._location_for
+
+        def failing_location_for(settings):
+            if settings.get("city") == "Munich":
+                raise RuntimeError("no such city")
+            return location_for(settings)
+
+        with patch.object(daemon, "_location_for", failing_location_for):
+            with self.assertLogs("app.multi_user", "ERROR"):
+                daemon.refresh_sessions()
+            self.assertEqual(
+                [state.session.name for state in daemon.sessions.values()],
+                ["user1001"],
+            )
+
+        # Retried at the next scan
+        daemon.refresh_sessions()
+        self.assertEqual(len(daemon.sessions), 2)
+
+    def test_next_wakeup_without_sessions(self):
+        """Test that an idle daemon wakes up to look for new sessions"""
+        daemon = self.make_daemon()
+        daemon.clock = lambda: 1000.0
+        daemon.refresh_sessions()
+
+        self.assertEqual(
+            daemon.next_wakeup(),
+            (1000.0 + Config.SESSION_SCAN_INTERVAL, "session scan"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for notifier module
+"""
+
+import shutil
+import subprocess
+import threading
+import unittest
+from unittest.mock import patch
+
+from app.notifier import HAS_JEEPNEY, DBusNotifier
+
+if HAS_JEEPNEY:
+    from jeepney import MessageType, new_method_return
+    from jeepney.bus_messages import message_bus
+    from jeepney.io.blocking import open_dbus_connection
+
+
+class StubNotificationServer:
+    """Minimal org.freedesktop.Notifications implementation on a private bus"""
+
+    def __init__(self, address):
+        self.connection = open_dbus_connection(bus=address)
+        self.connection.send_and_get_reply(
+            message_bus.RequestName("org.freedesktop.Notifications")
+        )
+        self.calls = []
+        self._next_id = 1
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                msg = self.connection.receive(timeout=0.1)
+            except TimeoutError:
+                continue
+            if msg.header.message_type != MessageType.method_call:
+                continue
+
+            app_name, replaces_id, _, title, body, _, _, _ = msg.body
+            notification_id = replaces_id or self._next_id
+            if not replaces_id:
+                self._next_id += 1
+            self.calls.append((app_name, replaces_id, title, body))
+            self.connection.send(new_method_return(msg, "u", (notification_id,)))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.connection.close()
+
+
+@unittest.skipIf(not HAS_JEEPNEY, "jeepney not installed")
+@unittest.skipIf(shutil.which("dbus-daemon") is None, "dbus-daemon not installed")
+class TestDBusNotifier(unittest.TestCase):
+    """Test cases for DBusNotifier against a private session bus"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.daemon = subprocess.Popen(
+            ["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.addCleanup(self.daemon.wait)
+        self.addCleanup(self.daemon.terminate)
+        self.address = self.daemon.stdout.readline().strip()
+        self.daemon.stdout.close()
+
+        self.server = StubNotificationServer(self.address)
+        self.addCleanup(self.server.stop)
+        self.notifier = DBusNotifier(self.address)
+        self.addCleanup(self.notifier.close)
+
+    def test_replaces_previous_notification(self):
+        """Test notifications of one kind reuse the returned notification ID"""
+        self.assertTrue(self.notifier.notify("Theme", "Dark", kind="theme"))
+        self.assertTrue(self.notifier.notify("Theme", "Light", kind="theme"))
+        self.assertTrue(self.notifier.notify("Started", "Daemon", kind="startup"))
+
+        replaces = [call[1] for call in self.server.calls]
+        self.assertEqual(replaces, [0, 1, 0])
+        self.assertEqual(self.server.calls[1][3], "Light")
+
+    def test_reuses_connection(self):
+        """Test one bus connection serves every notification"""
+        self.notifier.notify("Theme", "Dark", kind="theme")
+        connection = self.notifier._connection
+        self.notifier.notify("Theme", "Light", kind="theme")
+
+        self.assertIs(self.notifier._connection, connection)
+
+    def test_no_fork_when_bus_available(self):
+        """Test ThemeManager does not run notify-send when the bus works"""
+        from app.theme_manager import ThemeManager
+
+        theme_manager = ThemeManager()
+        theme_manager.notifier = self.notifier
+        with patch("app.theme_manager.subprocess.run") as run:
+            theme_manager._send_notification("org.kde.breezedark.desktop")
+
+        run.assert_not_called()
+        self.assertEqual(self.server.calls[-1][3], "Switched to Dark theme")
+
+    def test_falls_back_without_bus(self):
+        """Test notify returns False when the bus cannot be reached"""
+        notifier = DBusNotifier("unix:path=/nonexistent/bus")
+        self.assertFalse(notifier.notify("Theme", "Dark", kind="theme"))
+
+
+if __name__ == "__main__":
+    unittest.main()
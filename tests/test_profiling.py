@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for profiling module and the daemon's memory budget
+"""
+
+import json
+import logging
+import subprocess
+import tempfile
+import tracemalloc
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.kde_theme_changer import KDEThemeChanger
+from app.profiling import CycleProfiler, category_times, rss_kib
+from benchmarks.bench_memory import BUDGET_FILE, measure_daemon_memory, over_budget
+from benchmarks.fake_kde import FakeKDEEnvironment
+
+# Midday in Berlin, when the light theme is due
+NOON = datetime(2026, 6, 21, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+def work():
+    """Something for each summary category but astral and HTTP"""
+    import colorsys  # noqa: F401
+
+    logging.getLogger(__name__).info("working")
+    subprocess.run(["true"], check=True)
+    return [bytes(1000) for _ in range(100)]
+
+
+class TestCycleProfiler(unittest.TestCase):
+    """Test cases for the profiler reports"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.report_dir = Path(temp_dir.name) / "profile"
+        self.profiler = CycleProfiler(self.report_dir)
+        self.addCleanup(lambda: tracemalloc.is_tracing() and tracemalloc.stop())
+
+    def test_reports(self):
+        """Test each run leaves a CPU profile, allocations and an RSS row"""
+        result = self.profiler.run("cycle", work)
+        self.profiler.run("cycle", work)
+        self.profiler.stop()
+
+        self.assertEqual(len(result), 100)
+        self.assertFalse(tracemalloc.is_tracing())
+        for name in ("cycle-001.prof", "cycle-002.prof", "summary.txt"):
+            self.assertTrue((self.report_dir / name).exists(), name)
+
+        allocations = (self.report_dir / "cycle-001-alloc.txt").read_text()
+        self.assertRegex(allocations.splitlines()[0], r"cycle-001: \+\d+\.\d KiB")
+        self.assertIn("test_profiling.py", allocations)
+
+        rows = (self.report_dir / "rss.csv").read_text().splitlines()
+        self.assertEqual(rows[0], "seconds,label,rss_kib,traced_kib,cpu_seconds")
+        labels = [row.split(",")[1] for row in rows[1:]]
+        self.assertEqual(
+            labels, ["start", "cycle start", "cycle", "cycle start", "cycle", "stop"]
+        )
+
+    def test_summary_categories(self):
+        """Test time is attributed to imports, subprocesses and logging"""
+        self.profiler.run("cycle", work)
+        summary = self.profiler.summary()
+
+        self.assertIn("cycle: 1 run(s)", summary)
+        categories = [
+            line.split()[0]
+            for line in summary.splitlines()
+            if line.startswith("  ") and line.endswith("%")
+        ]
+        self.assertEqual(
+            categories, ["imports", "astral", "subprocesses", "http", "logging"]
+        )
+        # A disabled logger costs less than the summary's 0.1 ms resolution
+        times = category_times(self.profiler.stats["cycle"])
+        self.assertGreater(times["subprocesses"], 0)
+        self.assertGreater(times["logging"], 0)
+        self.assertEqual(times["http"], 0)
+
+    def test_failing_run_is_reported(self):
+        """Test a run that raises still writes its reports"""
+        with self.assertRaises(ZeroDivisionError):
+            self.profiler.run("cycle", lambda: 1 / 0)
+        self.assertTrue((self.report_dir / "cycle-001.prof").exists())
+
+    def test_changer_cycles(self):
+        """Test a changer with a profiler profiles each theme check"""
+        with FakeKDEEnvironment() as env, patch.object(
+            Config, "CACHE_DIR", env.cache_home
+        ), patch.object(Config, "LOG_FILE", env.log_file):
+            changer = KDEThemeChanger(52.52, 13.405, clock=lambda: NOON)
+            self.addCleanup(changer.theme_manager.apply_pipeline.shutdown)
+            self.addCleanup(changer.theme_manager.close)
+            changer.profiler = self.profiler
+
+            self.assertTrue(changer.update_theme())
+            self.assertTrue(changer.update_theme())
+
+        self.assertEqual(self.profiler.counts, {"cycle": 2})
+        self.assertIn("_update_theme", self.profiler.summary())
+
+    def test_rss(self):
+        """Test the resident memory is plausible"""
+        self.assertGreater(rss_kib(), 1024)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """Test cases enforcing the daemon's memory budget"""
+
+    def test_daemon_within_budget(self):
+        """Test theme checks stay within the RSS budget and leak nothing"""
+        budget = json.loads(BUDGET_FILE.read_text())
+        results = measure_daemon_memory(50, 300)
+        self.assertEqual(over_budget(results, budget), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
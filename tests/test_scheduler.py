@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for scheduler module
+"""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+from app.config import Config
+from app.scheduler import TransitionScheduler
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class TestTransitionScheduler(unittest.TestCase):
+    """Test cases for TransitionScheduler class"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.location_manager = Mock()
+        self.scheduler = TransitionScheduler(
+            self.location_manager, safety_interval=3600, clock=NOW.timestamp
+        )
+
+    def test_wakes_at_transition(self):
+        """Test wakeup lands just after an upcoming sunset"""
+        sunset = NOW + timedelta(minutes=20)
+        self.location_manager.get_next_transition.return_value = (sunset, False)
+
+        wakeup, reason = self.scheduler.next_wakeup()
+
+        self.assertEqual(reason, "sunset")
+        self.assertAlmostEqual(
+            wakeup, sunset.timestamp() + Config.TRANSITION_GRACE, places=3
+        )
+        self.location_manager.get_next_transition.assert_called_once_with(NOW)
+
+    def test_safety_interval_caps_wakeup(self):
+        """Test distant transitions are capped by the safety re-check"""
+        sunrise = NOW + timedelta(hours=10)
+        self.location_manager.get_next_transition.return_value = (sunrise, True)
+
+        wakeup, reason = self.scheduler.next_wakeup()
+
+        self.assertEqual(reason, "safety")
+        self.assertEqual(wakeup, NOW.timestamp() + 3600)
+
+    def test_no_transition_falls_back_to_safety(self):
+        """Test missing transitions fall back to the safety re-check"""
+        self.location_manager.get_next_transition.return_value = None
+
+        self.assertEqual(
+            self.scheduler.next_wakeup(), (NOW.timestamp() + 3600, "safety")
+        )
+
+    def test_phase_theme_wakes_at_theme_change(self):
+        """Test wakeups follow the phases that change the theme"""
+        dusk = NOW + timedelta(minutes=40)
+        self.location_manager.next_phase_change.return_value = (dusk, "civil_dusk")
+        scheduler = TransitionScheduler(
+            self.location_manager,
+            safety_interval=3600,
+            clock=NOW.timestamp,
+            phase_theme=str.upper,
+        )
+
+        wakeup, reason = scheduler.next_wakeup()
+
+        self.assertEqual(reason, "civil_dusk")
+        self.assertAlmostEqual(
+            wakeup, dusk.timestamp() + Config.TRANSITION_GRACE, places=3
+        )
+        self.location_manager.next_phase_change.assert_called_once_with(str.upper, NOW)
+        self.location_manager.get_next_transition.assert_not_called()
+
+    def test_wait_sleeps_until_deadline(self):
+        """Test wait keeps sleeping until the wall clock reaches the deadline"""
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            # Simulate sleep returning before the wall-clock deadline
+            now[0] += min(seconds, 0.6)
+
+        scheduler = TransitionScheduler(
+            self.location_manager, clock=lambda: now[0], sleep=sleep
+        )
+        scheduler.wait(101.0)
+
+        self.assertEqual(len(sleeps), 2)
+        self.assertAlmostEqual(sleeps[0], 1.0)
+        self.assertAlmostEqual(sleeps[1], 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()
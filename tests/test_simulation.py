@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Tests for simulation module
+"""
+
+import logging
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.metrics import MetricsRegistry
+from app.simulation import (
+    RecordingThemeManager,
+    VirtualClock,
+    make_changer,
+    simulate,
+)
+from app.state_journal import StateJournal
+
+DAY = 86400
+LIGHT, DARK = Config.DEFAULT_LIGHT_THEME, Config.DEFAULT_DARK_THEME
+
+
+class TestSimulation(unittest.TestCase):
+    """Test cases for replaying the daemon on a virtual clock"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, value in (
+            ("CACHE_DIR", Path(self.tmp.name)),
+            ("LOG_FILE", Path(self.tmp.name) / "test.log"),
+        ):
+            config_patch = patch.object(Config, name, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+        self.start = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    def run_simulation(self, days, latitude=52.52, longitude=13.405, **kwargs):
+        clock = VirtualClock(self.start)
+        changer = make_changer(
+            clock,
+            kwargs.pop("current_theme", None),
+            latitude=latitude,
+            longitude=longitude,
+            **kwargs.pop("options", {}),
+        )
+        return simulate(changer, clock, self.start + days * DAY, **kwargs)
+
+    def test_year_replay(self):
+        """Test a year follows every sunrise/sunset within the grace period"""
+        result = self.run_simulation(365)
+        stats = result.stats
+
+        # One apply at the start, then sunrise and sunset every day
+        self.assertEqual(stats["switches"], 1 + 2 * 365)
+        self.assertEqual(stats["switches"], stats["ideal_changes"])
+        self.assertEqual(stats["redundant_applies"], 0)
+        self.assertEqual(stats["missed_changes"], 0)
+        self.assertLessEqual(stats["max_lateness_seconds"], Config.TRANSITION_GRACE)
+        # Hourly safety checks plus one per transition
+        self.assertGreater(stats["checks"], 365 * 24)
+
+        timeline = result.timeline()
+        self.assertEqual(
+            [entry["theme"] for entry in timeline[:3]], [DARK, LIGHT, DARK]
+        )
+        self.assertEqual(timeline[1]["phase"], "morning_golden_hour")
+
+    def test_polar_night_and_day(self):
+        """Test months without sunrise or sunset neither miss nor repeat switches"""
+        result = self.run_simulation(365, latitude=78.22, longitude=15.65)
+        stats = result.stats
+
+        self.assertEqual(stats["missed_changes"], 0)
+        self.assertEqual(stats["redundant_applies"], 0)
+        # Far fewer than two switches a day
+        self.assertLess(stats["switches"], 365)
+
+    def test_phase_themes(self):
+        """Test phase themes add their own switches"""
+        result = self.run_simulation(
+            10, options={"phase_themes": {"civil_dusk": "dusk.theme"}}
+        )
+
+        themes = [entry["theme"] for entry in result.timeline()]
+        self.assertEqual(themes.count("dusk.theme"), 10)
+        self.assertEqual(result.stats["missed_changes"], 0)
+
+    def test_location_change(self):
+        """Test a move is followed by an immediate re-check"""
+        # Noon in Berlin is night in Los Angeles
+        move = self.start + 5 * DAY + 12 * 3600
+        result = self.run_simulation(10, moves=[(move, 34.05, -118.24)])
+
+        applies = [entry for entry in result.timeline() if entry["timestamp"] == move]
+        self.assertEqual([entry["theme"] for entry in applies], [DARK])
+        self.assertEqual(result.stats["missed_changes"], 0)
+        self.assertLessEqual(
+            result.stats["max_lateness_seconds"], Config.TRANSITION_GRACE
+        )
+
+    def test_correct_theme_at_start(self):
+        """Test no apply happens while the shown theme is already right"""
+        result = self.run_simulation(1, current_theme=DARK)
+
+        self.assertEqual(result.timeline()[0]["phase"], "morning_golden_hour")
+        self.assertEqual(result.stats["missed_changes"], 0)
+
+    def test_redundant_applies(self):
+        """Test applies of the theme already shown are counted"""
+
+        class ForgetfulThemeManager(RecordingThemeManager):
+            def get_current_theme(self):
+                return None
+
+        clock = VirtualClock(self.start)
+        with patch("app.simulation.RecordingThemeManager", ForgetfulThemeManager):
+            changer = make_changer(clock, latitude=52.52, longitude=13.405)
+        result = simulate(changer, clock, self.start + 2 * DAY)
+
+        self.assertEqual(
+            result.stats["redundant_applies"],
+            result.stats["applies"] - result.stats["switches"],
+        )
+        self.assertGreater(result.stats["redundant_applies"], 40)
+
+    def test_real_state_untouched(self):
+        """Test a replay neither trusts nor changes the daemon's journal and log"""
+        journal = StateJournal()
+        journal.record_applied(
+            "org.kde.other.desktop", self.start, "day", self.start, ((1, 2),)
+        )
+        stored = journal.path.read_bytes()
+        registry = MetricsRegistry()
+        root = logging.getLogger()
+
+        with patch("app.kde_theme_changer.metrics", registry), patch.object(
+            root, "handlers", []
+        ):
+            result = self.run_simulation(2)
+            self.assertEqual(root.handlers, [])
+
+        self.assertEqual(result.stats["missed_changes"], 0)
+        self.assertEqual(journal.path.read_bytes(), stored)
+        self.assertNotIn("manual_changes_total 1", registry.to_prometheus())
+        self.assertFalse(Config.LOG_FILE.exists())
+
+    def test_recorder_has_theme_manager_state(self):
+        """Test the recorder sets up what ThemeManager does, minus the desktop"""
+        changer = make_changer(
+            VirtualClock(self.start),
+            latitude=52.52,
+            longitude=13.405,
+            apply_mode="partial",
+        )
+        theme_manager = changer.theme_manager
+
+        self.assertIsInstance(theme_manager, RecordingThemeManager)
+        self.assertEqual(theme_manager.apply_mode, "partial")
+        self.assertIsNone(theme_manager.last_apply_mode)
+        self.assertIsNone(theme_manager.config_reader)
+        self.assertIsNone(theme_manager.notifier)
+
+
+if __name__ == "__main__":
+    unittest.main()
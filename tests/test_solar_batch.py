@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for solar_batch module
+"""
+
+import unittest
+from datetime import date, timedelta
+
+from astral import Observer
+from astral.sun import sunrise, sunset
+
+from app.solar_batch import SUN_TIME_TOLERANCE, np, sun_times_batch
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSunTimesBatch(unittest.TestCase):
+    """Test cases for the vectorized sun time engine"""
+
+    LOCATIONS = [
+        (40.7128, -74.0060),  # New York
+        (34.05, -118.24),  # Los Angeles: sunset on the next UTC date
+        (35.68, 139.69),  # Tokyo: sunrise on the previous UTC date
+        (-33.87, 151.21),  # Sydney
+        (64.15, -21.94),  # Reykjavik
+    ]
+
+    def test_agrees_with_astral(self):
+        """Test batch results agree with astral within the tolerance"""
+        dates = [date(2024, 1, 1) + timedelta(days=d) for d in range(0, 366, 15)]
+        for lat, lon in self.LOCATIONS:
+            rise, set_ = sun_times_batch(dates, lat, lon)
+            observer = Observer(lat, lon)
+            for i, day in enumerate(dates):
+                expected = (sunrise(observer, day), sunset(observer, day))
+                for actual, wanted in zip((rise[i], set_[i]), expected):
+                    seconds = actual.astype("int64") / 1000.0
+                    self.assertLess(
+                        abs(seconds - wanted.timestamp()), SUN_TIME_TOLERANCE
+                    )
+
+    def test_broadcasts_locations(self):
+        """Test one date is broadcast across many locations"""
+        lats, lons = zip(*self.LOCATIONS)
+        rise, set_ = sun_times_batch(np.datetime64("2024-06-01"), lats, lons)
+
+        self.assertEqual(rise.shape, (len(self.LOCATIONS),))
+        self.assertEqual(set_.dtype, np.dtype("datetime64[ms]"))
+
+    def test_polar_day_is_nat(self):
+        """Test days without sunrise/sunset are returned as NaT"""
+        rise, set_ = sun_times_batch(["2024-06-21", "2024-12-21"], 78.22, 15.65)
+
+        self.assertTrue(np.isnat(rise).all())
+        self.assertTrue(np.isnat(set_).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the startup import graph
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks.bench_startup import measure_startup
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BUDGET = json.loads((REPO_ROOT / "benchmarks" / "startup_budget.json").read_text())
+
+RUN_ONCE_SCRIPT = """
+import sys
+from app.location_manager import LocationManager
+
+location_manager = LocationManager(40.7128, -74.0060)
+location_manager.is_daylight()
+print(",".join(sorted(sys.modules)))
+"""
+
+
+class TestStartupImports(unittest.TestCase):
+    """Test cases for lazy loading of heavy dependencies"""
+
+    def run_python(self, code, env=None):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        )
+        return set(result.stdout.strip().split(","))
+
+    def test_entry_point_imports_nothing_heavy(self):
+        """Test importing the entry point loads none of the forbidden modules"""
+        modules = self.run_python(
+            f"import sys, {BUDGET['import_module']}; print(','.join(sys.modules))"
+        )
+        self.assertEqual(modules & set(BUDGET["forbidden_modules"]), set())
+
+    def test_import_time_within_budget(self):
+        """Test the entry point imports within the budget, with some tolerance"""
+        timings, _ = measure_startup(BUDGET["import_module"], 5)
+        # The fastest run is the least disturbed by other load on the machine
+        limit = BUDGET["import_time_ms"] * BUDGET["test_tolerance"]
+        self.assertLessEqual(min(timings), limit, timings)
+
+    def test_fixed_coordinates_run_avoids_network_and_astral(self):
+        """Test a run with fixed coordinates and a cached sun table stays lean"""
+        with tempfile.TemporaryDirectory() as cache_home:
+            env = dict(os.environ, XDG_CACHE_HOME=cache_home)
+            # The first run generates the sun table and may import astral.sun
+            self.run_python(RUN_ONCE_SCRIPT, env)
+            modules = self.run_python(RUN_ONCE_SCRIPT, env)
+
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("astral.sun", modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for state_journal module
+"""
+
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.config import Config
+from app.kde_theme_changer import KDEThemeChanger
+from app.metrics import MetricsRegistry
+from app.state_journal import StateJournal
+from benchmarks.fake_kde import FakeKDEEnvironment
+
+LIGHT = Config.DEFAULT_LIGHT_THEME
+DARK = Config.DEFAULT_DARK_THEME
+FINGERPRINT = ((1700000000000000000, 42, 1234), None)
+# Midday in Berlin, when the light theme is due
+NOON = datetime(2026, 6, 21, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+class JournalTestCase(unittest.TestCase):
+    """Base class with a fake KDE environment"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.env = FakeKDEEnvironment()
+        self.env.__enter__()
+        self.addCleanup(self.env.__exit__, None, None, None)
+        for target, value in (
+            ("CACHE_DIR", self.env.cache_home),
+            ("LOG_FILE", self.env.log_file),
+        ):
+            config_patch = patch.object(Config, target, value)
+            config_patch.start()
+            self.addCleanup(config_patch.stop)
+        self.path = self.env.cache_home / Config.STATE_JOURNAL_FILE
+
+
+class TestStateJournal(JournalTestCase):
+    """Test cases for the journal file"""
+
+    def test_round_trip(self):
+        """Test a record survives a restart and matches only its fingerprint"""
+        StateJournal().record_applied(LIGHT, 100.0, "day", 50.0, FINGERPRINT)
+
+        journal = StateJournal()
+        self.assertEqual(journal.theme, LIGHT)
+        self.assertEqual(journal.record["transition_at"], 50.0)
+        self.assertTrue(journal.holds(LIGHT, FINGERPRINT))
+        self.assertFalse(journal.holds(DARK, FINGERPRINT))
+        self.assertFalse(journal.holds(LIGHT, ((1, 42, 1234), None)))
+        self.assertFalse(journal.holds(LIGHT, None))
+
+    def test_unchanged_record_is_not_rewritten(self):
+        """Test the file is only written when the record changes"""
+        journal = StateJournal()
+        journal.record_applied(LIGHT, 100.0, "day", 50.0, FINGERPRINT)
+
+        with patch("app.state_journal.atomic_write") as mock_write:
+            journal.record_applied(LIGHT, 200.0, "day", 50.0, FINGERPRINT)
+            mock_write.assert_not_called()
+            journal.record_applied(LIGHT, 300.0, "golden_hour", 250.0, FINGERPRINT)
+            mock_write.assert_called_once()
+
+        # Still the same apply, so its time is kept
+        self.assertEqual(journal.record["applied_at"], 100.0)
+
+    def test_corrupt_file_is_ignored(self):
+        """Test an unreadable journal starts empty instead of failing"""
+        for content in ("{not json", json.dumps({"version": 1}), "[]"):
+            self.path.write_text(content)
+            with self.assertLogs("app.state_journal", "WARNING"):
+                self.assertIsNone(StateJournal().record)
+
+        self.path.unlink()
+        self.assertIsNone(StateJournal().record)
+
+    def test_clear(self):
+        """Test clearing forgets the record and removes the file"""
+        journal = StateJournal()
+        journal.record_applied(LIGHT, 100.0, "day", 50.0, FINGERPRINT)
+        journal.clear()
+
+        self.assertIsNone(journal.theme)
+        self.assertFalse(self.path.exists())
+
+
+class TestUpdateThemeJournal(JournalTestCase):
+    """Test cases for update_theme with the state journal"""
+
+    def make_changer(self):
+        """Create a changer in Berlin at midday"""
+        changer = KDEThemeChanger(52.52, 13.405, clock=lambda: NOON)
+        self.addCleanup(changer.theme_manager.apply_pipeline.shutdown)
+        self.addCleanup(changer.theme_manager.close)
+        return changer
+
+    def test_restart_skips_reading_theme(self):
+        """Test a restarted changer trusts the journal while kdeglobals is unchanged"""
+        self.env.set_theme(DARK)
+        self.assertTrue(self.make_changer().update_theme())
+
+        changer = self.make_changer()
+        registry = MetricsRegistry()
+        with patch("app.kde_theme_changer.metrics", registry), patch.object(
+            changer.theme_manager, "get_current_theme"
+        ) as mock_current, patch.object(changer.theme_manager, "set_theme") as mock_set:
+            self.assertTrue(changer.update_theme())
+
+        mock_current.assert_not_called()
+        mock_set.assert_not_called()
+        self.assertIn('state_journal_total{result="hit"} 1', registry.to_prometheus())
+        self.assertEqual(changer.journal.record["phase"], "day")
+        self.assertIsNotNone(changer.journal.record["transition_at"])
+
+    def test_manual_change_is_detected(self):
+        """Test a theme set by hand is noticed and the due theme applied again"""
+        changer = self.make_changer()
+        self.assertTrue(changer.update_theme())
+        self.env.set_theme("org.kde.custom.desktop")
+
+        registry = MetricsRegistry()
+        with patch("app.kde_theme_changer.metrics", registry), self.assertLogs(
+            "app.kde_theme_changer", "INFO"
+        ) as logs:
+            self.assertTrue(changer.update_theme())
+
+        self.assertIn("changed by hand", "\n".join(logs.output))
+        self.assertIn("manual_changes_total 1", registry.to_prometheus())
+        self.assertIn(LIGHT, (self.env.config_home / "kdeglobals").read_text())
+        self.assertTrue(
+            changer.journal.holds(LIGHT, changer.theme_manager.fingerprint())
+        )
+
+    def test_failed_apply_clears_journal(self):
+        """Test the journal is not trusted after an apply failed"""
+        self.env.set_theme(LIGHT)
+        changer = self.make_changer()
+        self.assertTrue(changer.update_theme())
+        self.assertEqual(changer.journal.theme, LIGHT)
+
+        self.env.set_theme(DARK)
+        with patch.object(changer.theme_manager, "set_theme", return_value=False):
+            self.assertFalse(changer.update_theme())
+        self.assertIsNone(changer.journal.record)
+
+
+if __name__ == "__main__":
+    unittest.main()
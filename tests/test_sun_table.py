@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for sun_table module
+"""
+
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from astral import Observer
+from astral.sun import dawn, dusk, sun
+
+from app.phases import PHASES
+from app.sun_table import HEADER, RECORD, TRANSITION_SIZE, SunTimeTable
+
+
+class TestSunTimeTable(unittest.TestCase):
+    """Test cases for SunTimeTable class"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+        self.table = SunTimeTable(51.5074, -0.1278, self.cache_dir, days=30)
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        self.tmp.cleanup()
+
+    def test_matches_astral(self):
+        """Test table lookups agree with astral for the rounded coordinates"""
+        day = date(2024, 3, 10)
+        expected = sun(Observer(51.51, -0.13), date=day)
+
+        sunrise, sunset = self.table.get(day)
+
+        self.assertLess(abs((sunrise - expected["sunrise"]).total_seconds()), 1)
+        self.assertLess(abs((sunset - expected["sunset"]).total_seconds()), 1)
+
+    def test_compact_file(self):
+        """Test the table is stored as a fixed-size binary file"""
+        self.table.get(date(2024, 3, 10))
+
+        transitions = len(self.table._transition_times)
+        # Ten phase transitions a day in London in March
+        self.assertGreater(transitions, 280)
+        self.assertEqual(
+            self.table.path.stat().st_size,
+            HEADER.size + 30 * RECORD.size + transitions * TRANSITION_SIZE,
+        )
+
+    def test_reuses_file_without_recomputing(self):
+        """Test a new table for the same location maps the existing file"""
+        self.table.get(date(2024, 3, 10))
+        table = SunTimeTable(51.5074, -0.1278, self.cache_dir, days=30)
+
+        with patch.object(table, "generate") as generate:
+            table.get(date(2024, 3, 20))
+        generate.assert_not_called()
+
+    def test_regenerates_when_out_of_range(self):
+        """Test the table is regenerated once the date runs past its end"""
+        self.table.get(date(2024, 3, 10))
+        with patch.object(
+            self.table, "generate", wraps=self.table.generate
+        ) as generate:
+            self.table.get(date(2024, 6, 1))
+            self.table.get(date(2024, 6, 2))
+        generate.assert_called_once()
+
+    def test_polar_night(self):
+        """Test days without sunrise raise ValueError"""
+        table = SunTimeTable(78.22, 15.65, self.cache_dir, days=10)
+        with self.assertRaises(ValueError):
+            table.get(date(2024, 12, 21))
+
+    def test_phase_transitions_match_astral(self):
+        """Test twilight transitions agree with astral dawn/dusk"""
+        day = date(2024, 3, 10)
+        observer = Observer(51.51, -0.13)
+        midnight = datetime(2024, 3, 10, tzinfo=timezone.utc).timestamp()
+
+        transitions = self.table.transitions_after(midnight, 10)
+        times = {PHASES[phase]: timestamp for timestamp, phase in transitions}
+
+        self.assertEqual(
+            [PHASES[phase] for _, phase in transitions],
+            list(PHASES[1:]) + ["night"],
+        )
+        self.assertAlmostEqual(
+            times["civil_dawn"], dawn(observer, day, depression=6).timestamp(), delta=1
+        )
+        self.assertAlmostEqual(
+            times["night"], dusk(observer, day, depression=18).timestamp(), delta=1
+        )
+
+    def test_phase_at(self):
+        """Test phase lookups on both sides of a transition"""
+        midnight = datetime(2024, 3, 10, tzinfo=timezone.utc).timestamp()
+        (sunrise, phase), _ = self.table.transitions_after(midnight + 6 * 3600, 2)
+
+        self.assertEqual(PHASES[phase], "morning_golden_hour")
+        self.assertEqual(PHASES[self.table.phase_at(sunrise - 1)], "civil_dawn")
+        self.assertEqual(PHASES[self.table.phase_at(sunrise)], "morning_golden_hour")
+        self.assertEqual(PHASES[self.table.phase_at(midnight)], "night")
+
+    def test_polar_day_has_no_transitions(self):
+        """Test the midnight sun stays in daytime phases"""
+        table = SunTimeTable(78.22, 15.65, self.cache_dir, days=60)
+        noon = datetime(2024, 6, 21, 12, tzinfo=timezone.utc)
+
+        self.assertEqual(PHASES[table.phase_at(noon.timestamp())], "day")
+        transitions = table.transitions_after(noon.timestamp(), 4)
+        # The sun first dips below 6 degrees in August
+        self.assertEqual(len(transitions), 4)
+        for timestamp, phase in transitions:
+            self.assertGreater(timestamp, (noon + timedelta(days=30)).timestamp())
+            self.assertIn(PHASES[phase], ("day", "evening_golden_hour"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@
 Tests for theme_manager module
 """
 
+import os
 import unittest
 from unittest.mock import Mock, patch
 from app.theme_manager import ThemeManager
@@ -14,6 +15,12 @@ class TestThemeManager(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Without a session bus notifications fall back to notify-send
+        env_patch = patch.dict(os.environ)
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        os.environ.pop("DBUS_SESSION_BUS_ADDRESS", None)
+
         self.theme_manager = ThemeManager()
 
     def test_initialization(self):
@@ -41,6 +48,57 @@ class TestThemeManager(unittest.TestCase):
             self.theme_manager.get_target_theme(False), Config.DEFAULT_DARK_THEME
         )
 
+    def test_get_phase_theme_defaults(self):
+        """Test phases without a theme follow sunrise/sunset"""
+        self.assertEqual(
+            self.theme_manager.get_phase_theme("evening_golden_hour"),
+            Config.DEFAULT_LIGHT_THEME,
+        )
+        self.assertEqual(
+            self.theme_manager.get_phase_theme("civil_dusk"), Config.DEFAULT_DARK_THEME
+        )
+
+    def test_get_phase_theme_mapping(self):
+        """Test per-phase themes, light/dark aliases and unknown phases"""
+        with self.assertLogs("app.theme_manager", level="WARNING"):
+            tm = ThemeManager(
+                phase_themes={
+                    "civil_dusk": "light",
+                    "evening_golden_hour": "custom.golden",
+                    "sunset": "custom.sunset",
+                }
+            )
+
+        self.assertEqual(tm.get_phase_theme("civil_dusk"), Config.DEFAULT_LIGHT_THEME)
+        self.assertEqual(tm.get_phase_theme("evening_golden_hour"), "custom.golden")
+        self.assertEqual(tm.get_phase_theme("night"), Config.DEFAULT_DARK_THEME)
+        self.assertNotIn("sunset", tm.phase_themes)
+
+    @patch("app.theme_manager.subprocess.run")
+    def test_get_current_theme_reads_kdeglobals(self, mock_subprocess):
+        """Test the current theme is read in-process without kreadconfig5"""
+        with patch.object(
+            self.theme_manager.config_reader,
+            "read_entry",
+            return_value="org.kde.breezedark.desktop",
+        ):
+            current = self.theme_manager.get_current_theme()
+
+        self.assertEqual(current, "org.kde.breezedark.desktop")
+        mock_subprocess.assert_not_called()
+
+    @patch("app.theme_manager.subprocess.run")
+    def test_get_current_theme_falls_back_to_kreadconfig(self, mock_subprocess):
+        """Test kreadconfig5 is used when kdeglobals has no theme entry"""
+        mock_subprocess.return_value = Mock(stdout="org.kde.breeze.desktop\n")
+        with patch.object(
+            self.theme_manager.config_reader, "read_entry", return_value=None
+        ):
+            current = self.theme_manager.get_current_theme()
+
+        self.assertEqual(current, "org.kde.breeze.desktop")
+        self.assertEqual(mock_subprocess.call_args[0][0][0], "kreadconfig5")
+
     @patch("app.theme_manager.subprocess.run")
     def test_send_startup_notification_daemon(self, mock_subprocess):
         """Test sending startup notification for daemon mode"""
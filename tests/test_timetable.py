@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Tests for timetable module
+"""
+
+import json
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from app.config import Config
+from app.location_manager import LocationManager
+from app.phases import PHASES
+from app.sun_table import SunTimeTable
+from app.timetable import Host, Timetable, generate_timetable, read_hosts
+
+START = date(2024, 3, 1)
+DAYS = 10
+
+
+class TestReadHosts(unittest.TestCase):
+    """Test cases for reading host lists"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        self.tmp.cleanup()
+
+    def test_csv(self):
+        """Test CSV rows with coordinates or a city"""
+        path = self.dir / "hosts.csv"
+        path.write_text(
+            "host,latitude,longitude,city\nws-1,52.52,13.405,\nws-2,,,Vienna\n"
+        )
+
+        hosts = read_hosts(path)
+
+        self.assertEqual([host.name for host in hosts], ["ws-1", "ws-2"])
+        self.assertEqual((hosts[0].latitude, hosts[0].longitude), (52.52, 13.405))
+        self.assertEqual(hosts[1].city, "Vienna")
+        self.assertIsNone(hosts[1].latitude)
+
+    def test_jsonl(self):
+        """Test JSONL objects, skipping blank lines"""
+        path = self.dir / "hosts.jsonl"
+        path.write_text(
+            '{"host": "ws-1", "latitude": 52.52, "longitude": 13.405}\n\n'
+            '{"host": "ws-2", "latitude": -33.87, "longitude": 151.21}\n'
+        )
+
+        hosts = read_hosts(path)
+
+        self.assertEqual([host.name for host in hosts], ["ws-1", "ws-2"])
+        self.assertEqual(hosts[1].latitude, -33.87)
+
+    def test_invalid_input(self):
+        """Test malformed rows are reported with their line"""
+        cases = [
+            "host,latitude,longitude\nws-1,95,13\n",
+            "host,latitude,longitude\nws-1,north,13\n",
+            "host,latitude,longitude\nws-1,,\n",
+            "host,latitude,longitude\nws-1,1,2\nws-1,3,4\n",
+            "host,latitude,longitude\n" + "x" * 65 + ",1,2\n",
+        ]
+        path = self.dir / "hosts.csv"
+        for content in cases:
+            path.write_text(content)
+            with self.assertRaises(ValueError):
+                read_hosts(path)
+
+
+class TestGenerateTimetable(unittest.TestCase):
+    """Test cases for generating and loading fleet timetables"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.hosts = [
+            Host("ws-b", 52.52, 13.405),
+            Host("ws-a", 69.65, 18.96),
+            Host("ws-c", -33.87, 151.21),
+        ]
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        self.tmp.cleanup()
+
+    def generate(self, workers=1):
+        jsonl, binary = self.dir / "fleet.jsonl", self.dir / "fleet.bin"
+        stats = generate_timetable(self.hosts, START, DAYS, jsonl, binary, workers)
+        return stats, jsonl, binary
+
+    def test_jsonl_matches_sun_table(self):
+        """Test the JSONL output lists the same transitions as a sun table"""
+        stats, jsonl, _ = self.generate()
+
+        records = [json.loads(line) for line in jsonl.read_text().splitlines()]
+        self.assertEqual(
+            [record["host"] for record in records], ["ws-b", "ws-a", "ws-c"]
+        )
+        self.assertEqual(stats["location_days"], 3 * DAYS)
+        self.assertGreater(stats["location_days_per_second"], 0)
+
+        table = SunTimeTable(52.52, 13.405, self.dir, days=DAYS)
+        table.generate(START)
+        expected = [
+            [timestamp, PHASES[phase]]
+            for timestamp, phase in zip(
+                table._transition_times, table._transition_phases
+            )
+        ]
+        self.assertEqual(records[0]["transitions"], expected)
+        self.assertEqual(records[0]["start"], START.isoformat())
+
+    def test_binary_lookup(self):
+        """Test hosts are found by name in the binary timetable"""
+        _, _, binary = self.generate()
+
+        timetable = Timetable(binary)
+
+        self.assertEqual(timetable.hosts(), ["ws-a", "ws-b", "ws-c"])
+        self.assertEqual((timetable.start, timetable.days), (START, DAYS))
+        entry = timetable.lookup("ws-c")
+        self.assertEqual((entry.latitude, entry.longitude), (-33.87, 151.21))
+        self.assertIsNone(timetable.lookup("ws-d"))
+        self.assertIsNone(timetable.lookup("ws"))
+
+    def test_process_pool_output_matches(self):
+        """Test the process pool writes the same files as a single process"""
+        _, jsonl, binary = self.generate(workers=1)
+        single = jsonl.read_bytes(), binary.read_bytes()
+
+        _, jsonl, binary = self.generate(workers=2)
+
+        self.assertEqual((jsonl.read_bytes(), binary.read_bytes()), single)
+
+    def test_daemon_uses_timetable_without_computing(self):
+        """Test a location manager answers from a timetable entry"""
+        _, _, binary = self.generate()
+        entry = Timetable(binary).lookup("ws-b")
+        now = datetime(2024, 3, 5, 12, tzinfo=timezone.utc)
+
+        with patch.object(Config, "CACHE_DIR", self.dir / "cache"):
+            manager = LocationManager(entry.latitude, entry.longitude)
+            self.assertTrue(manager.sun_table.use_buffer(entry.table))
+            with patch.object(manager.sun_table, "generate") as generate:
+                self.assertEqual(manager.get_phase(now), "day")
+                self.assertEqual(len(manager.next_transitions(5, now)), 5)
+                manager.get_sun_times(now.date())
+            generate.assert_not_called()
+
+    def test_entry_rejected_for_other_location(self):
+        """Test a sun table only accepts timetable entries for its location"""
+        _, _, binary = self.generate()
+        entry = Timetable(binary).lookup("ws-a")
+
+        table = SunTimeTable(52.52, 13.405, self.dir, days=DAYS)
+
+        self.assertFalse(table.use_buffer(entry.table))
+
+    def test_cities(self):
+        """Test hosts given by city are located, unknown cities are an error"""
+        self.hosts = [Host("ws-b", city="Berlin"), Host("ws-v", city="Vienna")]
+        with patch.object(Config, "CACHE_DIR", self.dir / "cache"):
+            self.generate()
+        self.assertAlmostEqual(self.hosts[0].latitude, 52.52, places=1)
+        self.assertAlmostEqual(self.hosts[1].longitude, 16.37, places=1)
+
+        for path in self.dir.glob("fleet.*"):
+            path.unlink()
+        self.hosts = [Host("ws-x", city="Nowhereville")]
+        with patch.object(Config, "CACHE_DIR", self.dir / "cache"), patch.object(
+            LocationManager, "_geocode_city", return_value=None
+        ), patch.object(LocationManager, "_auto_detect_location") as detect:
+            with self.assertRaisesRegex(ValueError, "ws-x: city 'Nowhereville'"):
+                self.generate()
+        detect.assert_not_called()
+        self.assertFalse((self.dir / "fleet.bin").exists())
+
+    def test_invalid_file(self):
+        """Test files that are not timetables are rejected"""
+        path = self.dir / "fleet.bin"
+        path.write_bytes(b"not a timetable at all")
+
+        with self.assertRaises(ValueError):
+            Timetable(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
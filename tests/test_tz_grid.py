@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Tests for tz_grid module
+"""
+
+import json
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from astral import LocationInfo
+
+from app.config import Config
+from app.location_cache import LocationCache
+from app.location_manager import LocationManager
+from app.tz_grid import (
+    ZONE_AREAS,
+    TimezoneGrid,
+    build_timezone_grid,
+    canonical_zone,
+    nautical_zone,
+    open_timezone_grid,
+    read_boundaries,
+    timezone_at,
+    zone_links,
+)
+
+
+def box(west, south, east, north):
+    """Get a rectangular GeoJSON ring"""
+    return [[west, south], [east, south], [east, north], [west, north], [west, south]]
+
+
+BOUNDARIES = {
+    "type": "FeatureCollection",
+    "features": [
+        # Berlin with a hole, and a legacy name for Los Angeles
+        {
+            "type": "Feature",
+            "properties": {"tzid": "Europe/Berlin"},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [box(5, 47, 15, 55), box(8, 50, 10, 52)],
+            },
+        },
+        {
+            "type": "Feature",
+            "properties": {"tzid": "US/Pacific"},
+            "geometry": {"type": "Polygon", "coordinates": [box(-125, 32, -115, 42)]},
+        },
+        # An island far smaller than a cell, off its centre, in the sea
+        {
+            "type": "Feature",
+            "properties": {"tzid": "Pacific/Honolulu"},
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [[box(-158.0, 21.2, -157.7, 21.6)]],
+            },
+        },
+        {
+            "type": "Feature",
+            "properties": {"tzid": "Etc/GMT+10"},
+            "geometry": {"type": "Polygon", "coordinates": [box(-165, 15, -150, 30)]},
+        },
+        # A border inside a cell
+        {
+            "type": "Feature",
+            "properties": {"tzid": "Asia/Tokyo"},
+            "geometry": {"type": "Polygon", "coordinates": [box(138.8, 35, 140, 36)]},
+        },
+        {
+            "type": "Feature",
+            "properties": {"tzid": "Asia/Seoul"},
+            "geometry": {"type": "Polygon", "coordinates": [box(138.0, 35, 138.8, 36)]},
+        },
+    ],
+}
+
+
+class TestTimezoneGrid(unittest.TestCase):
+    """Test cases for building and reading time zone grids"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Build one coarse grid for all tests"""
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.dir = Path(cls.tmp.name)
+        (cls.dir / "boundaries.json").write_text(json.dumps(BOUNDARIES))
+        cls.runs = build_timezone_grid(
+            read_boundaries(cls.dir / "boundaries.json"),
+            cls.dir / "grid.bin",
+            cells_per_degree=1,
+            cities=[(35.5, 138.9, "Asia/Tokyo"), (46.5, -117.5, "US/Pacific")],
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up test fixtures"""
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.grid = TimezoneGrid(self.dir / "grid.bin")
+        self.addCleanup(self.grid.close)
+
+    def test_nautical_zone(self):
+        """Test POSIX inverts the sign of Etc/GMT offsets"""
+        self.assertEqual(nautical_zone(0.0), "Etc/GMT")
+        self.assertEqual(nautical_zone(-75.0), "Etc/GMT+5")
+        self.assertEqual(nautical_zone(120.0), "Etc/GMT-8")
+        self.assertEqual(nautical_zone(180.0), "Etc/GMT-12")
+
+    def test_polygons_and_open_sea(self):
+        """Test cells get the zone covering them and a nautical one elsewhere"""
+        self.assertEqual(self.grid.timezone_at(52.52, 13.405), "Europe/Berlin")
+        self.assertEqual(self.grid.timezone_at(47.5, 5.5), "Europe/Berlin")
+        self.assertEqual(self.grid.timezone_at(51.5, 9.5), "Etc/GMT-1")
+        self.assertEqual(self.grid.timezone_at(20.0, -160.0), "Etc/GMT+10")
+        self.assertEqual(self.grid.timezone_at(0.2, -150.2), "Etc/GMT+10")
+        self.assertEqual(self.grid.timezone_at(90.0, 179.9), "Etc/GMT-12")
+        self.assertEqual(self.grid.timezone_at(-90.0, -180.0), "Etc/GMT+12")
+
+    def test_small_land_wins_over_sea(self):
+        """Test a cell takes the land zone covering part of it over the sea"""
+        self.assertEqual(self.grid.timezone_at(21.31, -157.86), "Pacific/Honolulu")
+
+    def test_legacy_names_are_canonical(self):
+        """Test legacy zone names are stored as their IANA targets"""
+        if "US/Pacific" not in zone_links():
+            self.skipTest("no tzdata.zi")
+        self.assertEqual(self.grid.timezone_at(34.05, -118.24), "America/Los_Angeles")
+        self.assertNotIn("US/Pacific", self.grid.timezones)
+
+        links = {
+            "US/Pacific": "America/Los_Angeles",
+            "Europe/Bratislava": "Europe/Prague",
+        }
+        self.assertEqual(canonical_zone("US/Pacific", links), "America/Los_Angeles")
+        self.assertEqual(
+            canonical_zone("Europe/Bratislava", links), "Europe/Bratislava"
+        )
+
+    def test_cities_take_their_zone(self):
+        """Test a cell split by a border takes the zone of the city in it"""
+        # Mostly Seoul by area, but the city lies in Tokyo
+        self.assertEqual(self.grid.timezone_at(35.5, 138.2), "Asia/Tokyo")
+        if zone_links():
+            self.assertEqual(self.grid.timezone_at(46.5, -117.5), "America/Los_Angeles")
+
+    def test_bad_boundary_file(self):
+        """Test files that are not time zone boundaries are rejected"""
+        bad = self.dir / "bad.json"
+        bad.write_text(json.dumps({"features": [{"geometry": {"type": "Point"}}]}))
+        with self.assertRaises(ValueError):
+            read_boundaries(bad)
+
+    def test_rows_are_run_length_encoded(self):
+        """Test the file holds runs, far fewer than cells"""
+        self.assertLess(self.runs, 180 * 360 // 10)
+        self.assertLess((self.dir / "grid.bin").stat().st_size, 32 * 1024)
+
+    def test_rows_expanded_on_demand(self):
+        """Test only looked-up rows are expanded, once"""
+        self.grid.timezone_at(52.0, 14.0)
+        self.grid.timezone_at(51.5, -10.0)
+        self.assertEqual(list(self.grid._rows), [38])
+        self.assertEqual(len(self.grid._rows[38]), 360)
+
+    def test_unreadable_grid(self):
+        """Test a missing or corrupt grid falls back to nautical zones"""
+        corrupt = self.dir / "corrupt.bin"
+        corrupt.write_bytes((self.dir / "grid.bin").read_bytes()[:-100])
+        with self.assertLogs("app.tz_grid", "WARNING"):
+            self.assertIsNone(open_timezone_grid(corrupt))
+
+        with patch.object(Config, "TIMEZONE_GRID_FILE", self.dir / "missing.bin"):
+            self.assertEqual(timezone_at(52.52, 13.405), "Etc/GMT-1")
+
+    def test_bundled_grid(self):
+        """Test the bundled grid knows some well-known places"""
+        self.assertEqual(timezone_at(52.52, 13.405), "Europe/Berlin")
+        self.assertEqual(timezone_at(35.68, 139.69), "Asia/Tokyo")
+        self.assertEqual(timezone_at(-33.87, 151.21), "Australia/Sydney")
+        self.assertEqual(timezone_at(21.31, -157.86), "Pacific/Honolulu")
+        self.assertEqual(timezone_at(-30.0, -140.0), "Etc/GMT+9")
+
+    def test_bundled_grid_interior_cities(self):
+        """Test cities far from any gazetteer city get their own zone"""
+        for latitude, longitude, zone in (
+            (30.66, 104.07, "Asia/Shanghai"),  # Chengdu
+            (43.12, 131.89, "Asia/Vladivostok"),
+            (53.2, 50.15, "Europe/Samara"),
+            (54.71, 20.51, "Europe/Kaliningrad"),
+            (39.74, -104.99, "America/Denver"),
+            (34.05, -118.24, "America/Los_Angeles"),
+        ):
+            self.assertEqual(timezone_at(latitude, longitude), zone)
+
+    def test_bundled_grid_border_cities(self):
+        """Test cities near a border with another offset get their own zone"""
+        for latitude, longitude, zone in (
+            (42.24, -8.72, "Europe/Madrid"),  # Vigo
+            (38.88, -6.97, "Europe/Madrid"),  # Badajoz
+            (38.88, -7.16, "Europe/Lisbon"),  # Elvas
+            (31.76, -106.49, "America/Denver"),  # El Paso
+            (31.69, -106.42, "America/Ciudad_Juarez"),
+            (59.38, 28.19, "Europe/Tallinn"),  # Narva
+        ):
+            self.assertEqual(timezone_at(latitude, longitude), zone)
+        for name in open_timezone_grid().timezones:
+            self.assertIn(name.split("/")[0], ZONE_AREAS)
+
+
+class TestLocationTimezone(unittest.TestCase):
+    """Test cases for locations carrying their time zone"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        config_patch = patch.object(Config, "CACHE_DIR", Path(self.tmp.name))
+        config_patch.start()
+        self.addCleanup(config_patch.stop)
+
+    def test_custom_coordinates(self):
+        """Test coordinates get their zone and sun tables are keyed by it"""
+        manager = LocationManager(35.68, 139.69)
+
+        self.assertEqual(manager.location.timezone, "Asia/Tokyo")
+        self.assertEqual(manager.sun_table.timezone_name, "Asia/Tokyo")
+        self.assertIn("Asia-Tokyo", manager.sun_table.path.name)
+
+    def test_today_is_the_local_date(self):
+        """Test sun times default to the date at the location, not in UTC"""
+        # Already June 22 in Tokyo
+        clock = datetime(2026, 6, 21, 20, 0, tzinfo=timezone.utc).timestamp()
+        manager = LocationManager(35.68, 139.69, clock=lambda: clock)
+
+        sunrise, sunset = manager.get_sun_times()
+
+        self.assertEqual(manager.local_time(clock).date(), date(2026, 6, 22))
+        self.assertEqual(sunrise.astimezone(manager.tzinfo).date(), date(2026, 6, 22))
+        self.assertEqual(sunset.astimezone(manager.tzinfo).date(), date(2026, 6, 22))
+        self.assertLess(sunrise, sunset)
+
+    def test_cached_location_gets_timezone(self):
+        """Test a location cached before time zones were resolved gets one"""
+        LocationCache().put(
+            "city:atlantis", LocationInfo("Atlantis", "Sea", "UTC", 35.68, 139.69), 60
+        )
+        with patch.object(Config, "GAZETTEER_FILE", Path(self.tmp.name) / "none"):
+            manager = LocationManager(city="Atlantis")
+
+        self.assertEqual(manager.location.name, "Atlantis")
+        self.assertEqual(manager.location.timezone, "Asia/Tokyo")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for wall_timer module
+"""
+
+import errno
+import select
+import time
+import unittest
+from unittest.mock import patch
+
+from app.wall_timer import CLOCK_CHANGED, EXPIRED, open_wall_timer
+
+
+class TestWallClockTimer(unittest.TestCase):
+    """Test cases for the timerfd wall-clock timer"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.timer = open_wall_timer()
+        if self.timer is None:
+            self.skipTest("timerfd is not available")
+        self.addCleanup(self.timer.close)
+
+    def wait_readable(self, timeout):
+        """Whether the timer fires within timeout seconds"""
+        readable, _, _ = select.select([self.timer], [], [], timeout)
+        return bool(readable)
+
+    def test_fires_at_deadline(self):
+        """Test the timer fires at the absolute wall-clock deadline, not before"""
+        deadline = time.time() + 0.05
+        self.timer.arm(deadline)
+        self.assertIsNone(self.timer.read())
+
+        self.assertTrue(self.wait_readable(2.0))
+        self.assertGreaterEqual(time.time(), deadline)
+        self.assertEqual(self.timer.read(), EXPIRED)
+        self.assertIsNone(self.timer.read())
+
+    def test_past_deadline_fires_at_once(self):
+        """Test a deadline already passed, e.g. slept through, fires right away"""
+        self.timer.arm(time.time() - 3600)
+        self.assertTrue(self.wait_readable(0.5))
+        self.assertEqual(self.timer.read(), EXPIRED)
+
+    def test_disarm_drops_expiry(self):
+        """Test disarming forgets an expiry that was not read"""
+        self.timer.arm(time.time() - 1)
+        self.assertTrue(self.wait_readable(0.5))
+        self.timer.disarm()
+        self.assertFalse(self.wait_readable(0.05))
+
+    def test_clock_change_is_reported(self):
+        """Test the cancellation on a clock change is told apart from expiry"""
+        error = OSError(errno.ECANCELED, "Operation canceled")
+        with patch("app.wall_timer.os.read", side_effect=error):
+            self.assertEqual(self.timer.read(), CLOCK_CHANGED)
+
+
+if __name__ == "__main__":
+    unittest.main()